@@ -15,14 +15,21 @@ st.set_page_config(
 import os
 from dotenv import load_dotenv
 import ds_prefiller
+import export
 import grist_connector
+import jobs
 import re
+import uuid
 from datetime import datetime
 import pandas as pd
+from modeles import ResultatLien
 
 # Charger les variables d'environnement
 load_dotenv()
 
+# Démarrer les workers de génération de liens en arrière-plan (une fois par processus)
+jobs.demarrer_workers()
+
 # CSS pour le style conforme au design système de l'État
 def load_css():
     st.markdown("""
@@ -252,12 +259,13 @@ def is_valid_name(name):
     import re
     return bool(re.match(r'^[a-zA-ZÀ-ÿ\s\-]+$', name))
 
-def format_display_value(value, is_date=False):
+def format_display_value(value, is_date=False, html=True):
     """
     Formate une valeur pour l'affichage.
+    Avec html=False, renvoie du texte brut (tableaux natifs, exports).
     """
     if not value or value == "None" or value == "null":
-        return '<span class="empty-field">Non renseigné</span>'
+        return '<span class="empty-field">Non renseigné</span>' if html else "Non renseigné"
     
     if is_date:
         from datetime import datetime
@@ -304,40 +312,183 @@ def verifier_champs_obligatoires():
     
     return champs_manquants
 
-# Générer les URL de pré-remplissage pour chaque apprenant
-def generer_liens_pre_remplissage(apprenants):
+# Lancer la génération des URL de pré-remplissage en arrière-plan
+def lancer_generation_liens(apprenants, libelle):
     """
-    Génère des liens de pré-remplissage pour une liste d'apprenants.
+    Crée un traitement de génération de liens pour une liste d'apprenants.
+    Les liens sont générés par les workers de jobs ; la session ne conserve
+    que l'identifiant du traitement (aussi placé dans l'URL de la page).
     
     Args:
         apprenants (list): Liste des dictionnaires de données des apprenants
+        libelle (str): Description du traitement
+    """
+    job_id = jobs.creer_job(apprenants, libelle=libelle)
+    st.session_state.jobs_session.append(job_id)
+    st.session_state.job_liens = job_id
+    st.query_params["job"] = job_id
+
+# Colonnes du tableau de résultats (les colonnes _tri_* servent au tri des dates)
+COLONNES_RESULTATS = [
+    "Numéro dossier Moow Pro", "Nom", "Prénom", "Date de départ", "Date de retour",
+    "Pays d'accueil", "Établissement", "Type de mobilité", "Statut", "Lien pré-remplissage"
+]
+COLONNES_TRI_DATES = {"Date de départ": "_tri_depart", "Date de retour": "_tri_retour"}
+
+def ligne_affichage_resultat(r):
+    """
+    Formate une fois pour toutes un ResultatLien en ligne du tableau de résultats.
+    """
+    return (
+        r.dossier_number,
+        r.nom,
+        r.prenom,
+        format_display_value(r.date_depart, is_date=True, html=False),
+        format_display_value(r.date_retour, is_date=True, html=False),
+        r.pays_accueil,
+        r.etablissement,
+        r.type_mobilite,
+        "Lien généré" if r.succes else "Erreur de génération",
+        r.url if r.succes else None,
+        str(r.date_depart or ""),
+        str(r.date_retour or "")
+    )
+
+# Nombre de tableaux de résultats gardés en cache (tous traitements et sessions confondus)
+CACHE_TABLEAUX_MAX = 32
+
+@st.cache_data(max_entries=CACHE_TABLEAUX_MAX, show_spinner=False)
+def tableau_traitement(job_id, termines):
+    """
+    Renvoie le DataFrame des résultats déjà traités (résultats partiels possibles).
+    Le tableau est mis en cache pour le processus, par traitement et nombre
+    d'éléments terminés : les sessions qui suivent le même traitement le
+    partagent et la session ne garde que l'identifiant du traitement.
+    """
+    lignes = [
+        ligne_affichage_resultat(ResultatLien.depuis_apprenant(donnees, success, url))
+        for _, donnees, success, url in jobs.iter_resultats_job(job_id)
+    ]
+    return pd.DataFrame(lignes, columns=COLONNES_RESULTATS + list(COLONNES_TRI_DATES.values()))
+
+# Intervalle (secondes) de rafraîchissement des résultats pendant la génération
+INTERVALLE_SUIVI_JOB = 0.5
+
+def afficher_traitement_liens():
+    """
+    Affiche la progression et les résultats du traitement de la session.
+    Le bloc est exécuté comme fragment ; pendant la génération, il est rafraîchi
+    toutes les INTERVALLE_SUIVI_JOB secondes : le tableau se remplit au fil de
+    l'eau sans réexécuter le reste de la page.
+    """
+    progression_job = jobs.progression(st.session_state.job_liens) if st.session_state.job_liens else None
+    en_cours = bool(progression_job) and progression_job["statut"] != jobs.STATUT_TERMINE
+    st.fragment(_afficher_traitement_liens, run_every=INTERVALLE_SUIVI_JOB if en_cours else None)(en_cours)
+
+def _afficher_traitement_liens(suivi_en_cours):
+    """Contenu du fragment de suivi (voir afficher_traitement_liens)."""
+    progression_job = jobs.progression(st.session_state.job_liens) if st.session_state.job_liens else None
+    if progression_job:
+        _afficher_progression_et_resultats(progression_job, suivi_en_cours)
+    
+    with st.expander("Traitements récents"):
+        # Seuls les traitements lancés (ou repris par leur URL) dans cette session
+        for job in jobs.lister_jobs(10, ids=st.session_state.jobs_session):
+            col_job, col_btn = st.columns([4, 1])
+            with col_job:
+                etat = "terminé" if job["statut"] == jobs.STATUT_TERMINE else "en cours"
+                st.markdown(f"{datetime.fromtimestamp(job['cree_le']).strftime('%d/%m/%Y %H:%M')} - {job['libelle']} ({job['termines']}/{job['total']}, {etat})")
+            with col_btn:
+                if st.button("Afficher", key=f"job_{job['id']}"):
+                    st.session_state.job_liens = job["id"]
+                    st.query_params["job"] = job["id"]
+                    # Réexécuter toute la page pour (dés)activer le rafraîchissement du fragment
+                    st.rerun()
+
+def _afficher_progression_et_resultats(progression_job, suivi_en_cours):
+    """Progression, compteurs, tableau et exports du traitement affiché."""
+    # Une fois le traitement terminé, réexécuter la page pour arrêter le rafraîchissement
+    if suivi_en_cours and progression_job["statut"] == jobs.STATUT_TERMINE:
+        st.rerun()
+    
+    df = tableau_traitement(progression_job["id"], progression_job["termines"])
+    reussis = progression_job["termines"] - progression_job["erreurs"]
+    en_attente = progression_job["total"] - progression_job["termines"]
+    
+    st.progress(
+        progression_job["termines"] / (progression_job["total"] or 1),
+        text=f"{progression_job['libelle']} : {progression_job['termines']}/{progression_job['total']} lien(s) traité(s)"
+    )
+    col_ok, col_err, col_att = st.columns(3)
+    col_ok.metric("Liens générés", reussis)
+    col_err.metric("Erreurs", progression_job["erreurs"])
+    col_att.metric("En attente", en_attente)
+    
+    # Afficher les résultats si disponibles
+    if not df.empty:
+        st.markdown("### Tableau des apprenants avec liens de pré-remplissage")
+        afficher_tableau_pagine(df)
         
-    Returns:
-        list: Liste des dictionnaires avec les données et les liens générés
+        # Exports (fichiers produits au fil de l'eau et réutilisés une fois le traitement terminé)
+        if progression_job["statut"] == jobs.STATUT_TERMINE:
+            afficher_exports(progression_job["id"])
+        
+        # Bouton pour effacer les résultats
+        if st.button("Effacer les résultats", key="clear_results"):
+            st.session_state.job_liens = None
+            if "job" in st.query_params:
+                del st.query_params["job"]
+            st.rerun()
+
+def afficher_exports(job_id):
+    """
+    Affiche les boutons de téléchargement CSV et XLSX d'un traitement terminé.
     """
-    resultats = []
+    colonnes = st.columns(len(export.TYPES_MIME))
+    for col, (format_export, type_mime) in zip(colonnes, export.TYPES_MIME.items()):
+        with col:
+            success_export, chemin = export.exporter_job(job_id, format_export)
+            if not success_export:
+                st.caption(chemin)
+                continue
+            with open(chemin, "rb") as fichier:
+                st.download_button(
+                    f"Télécharger les liens ({format_export.upper()})",
+                    data=fichier,
+                    file_name=f"liens_pre_remplissage.{format_export}",
+                    mime=type_mime,
+                    key=f"export_{format_export}"
+                )
+
+def afficher_tableau_pagine(df):
+    """
+    Affiche le tableau de résultats avec le composant dataframe natif.
+    Le tri et la pagination sont faits côté serveur : seule la page
+    courante est envoyée au navigateur.
+    """
+    col_tri, col_ordre, col_taille, col_page = st.columns([3, 2, 2, 2])
+    with col_tri:
+        colonne_tri = st.selectbox("Trier par", options=COLONNES_RESULTATS[:-1], key="tri_resultats")
+    with col_ordre:
+        decroissant = st.selectbox("Ordre", options=["Croissant", "Décroissant"], key="ordre_resultats") == "Décroissant"
+    with col_taille:
+        taille_page = st.selectbox("Lignes par page", options=[25, 50, 100, 250], key="taille_page_resultats")
+    nombre_pages = max(1, -(-len(df) // taille_page))
+    with col_page:
+        page = st.number_input("Page", min_value=1, max_value=nombre_pages, value=1, step=1, key="page_resultats")
     
-    with st.spinner("Génération des liens en cours..."):
-        for apprenant in apprenants:
-            # Générer l'URL courte pour chaque apprenant
-            success, url = ds_prefiller.generate_short_url(apprenant)
-            
-            # Conserver uniquement les données nécessaires pour le tableau
-            resultat = {
-                "Numéro dossier Moow Pro": apprenant.get("dossier_number", ""),
-                "Nom": apprenant.get("nom", ""),
-                "Prénom": apprenant.get("prenom", ""),
-                "Date de départ": format_display_value(apprenant.get("date_depart"), is_date=True),
-                "Date de retour": format_display_value(apprenant.get("date_retour"), is_date=True),
-                "Pays d'accueil": apprenant.get("pays_accueil", "Non renseigné"),
-                "Établissement": apprenant.get("etablissement", "Non renseigné"),
-                "Type de mobilité": apprenant.get("type_mobilite_val", "Stage"),
-                "Lien pré-remplissage": url if success else "Erreur de génération"
-            }
-            
-            resultats.append(resultat)
+    df_trie = df.sort_values(COLONNES_TRI_DATES.get(colonne_tri, colonne_tri), ascending=not decroissant, kind="stable")
+    debut = (min(page, nombre_pages) - 1) * taille_page
     
-    return resultats
+    st.dataframe(
+        df_trie.iloc[debut:debut + taille_page][COLONNES_RESULTATS],
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "Lien pré-remplissage": st.column_config.LinkColumn(display_text="Ouvrir le lien")
+        }
+    )
+    st.caption(f"{len(df)} apprenant(s) - page {min(page, nombre_pages)}/{nombre_pages}")
 
 # Initialisation des variables de session
 if 'generate_success' not in st.session_state:
@@ -356,8 +507,14 @@ if 'etablissements_filtres' not in st.session_state:
     st.session_state.etablissements_filtres = []
 if 'nom_precedent' not in st.session_state:
     st.session_state.nom_precedent = ""
-if 'resultats_recherche_date' not in st.session_state:
-    st.session_state.resultats_recherche_date = []
+if 'id_session' not in st.session_state:
+    # Identité de la session auprès du limiteur de débit DS (service à tour de rôle)
+    st.session_state.id_session = uuid.uuid4().hex
+if 'job_liens' not in st.session_state:
+    # Reprendre un traitement en cours ou terminé à partir de l'URL de la page
+    st.session_state.job_liens = st.query_params.get("job")
+if 'jobs_session' not in st.session_state:
+    st.session_state.jobs_session = [st.session_state.job_liens] if st.session_state.job_liens else []
 if 'etablissements' not in st.session_state:
     # Charger la liste des établissements au démarrage
     success, result = grist_connector.obtenir_liste_etablissements()
@@ -378,9 +535,12 @@ tab1, tab2 = st.tabs(["Recherche par nom apprenant", "Recherche par date et éta
 #########################################
 # ONGLET 1: RECHERCHE PAR NOM APPRENANT #
 #########################################
-with tab1:
-    st.subheader("Recherche par nom apprenant et établissement")
-
+@st.fragment
+def formulaire_recherche_nom():
+    """
+    Formulaire de recherche de l'onglet 1 (nom, établissement, numéro).
+    Exécuté comme fragment : la saisie ne réexécute que ce bloc.
+    """
     # Formulaire de recherche
     col1, col2 = st.columns(2)
     with col1:
@@ -435,6 +595,8 @@ with tab1:
 
     # Bouton de recherche
     if st.button("Rechercher", key="btn_recherche"):
+        # Messages affichés après la réexécution complète de la page
+        messages = []
         # Validation : soit (nom + établissement) soit numéro de dossier
         if numero_dossier_recherche:
             # Recherche par numéro uniquement
@@ -448,42 +610,41 @@ with tab1:
                 if isinstance(result, dict) and result.get("multiple", False):
                     st.session_state.dossiers_multiples = True
                     st.session_state.liste_dossiers = result.get("dossiers", [])
-                    st.markdown(f"""
+                    messages.append(f"""
                     <div class="info-box">
                         <strong>Plusieurs dossiers trouvés ({len(st.session_state.liste_dossiers)})</strong><br/>
                         Veuillez sélectionner un dossier dans la liste ci-dessous.
                     </div>
-                    """, unsafe_allow_html=True)
+                    """)
                 else:
-                    # Mapper les données
-                    dossier_fields = result.get("fields", {})
-                    mapped_data = grist_connector.mapper_donnees_mobilite(dossier_fields)
+                    # Mapper les données du Dossier trouvé
+                    mapped_data = grist_connector.mapper_donnees_mobilite(result)
                     st.session_state.form_data = mapped_data
                     st.session_state.mysql_data_loaded = True
-                    st.markdown("""
+                    messages.append("""
                     <div class="success-message">
                         <span>✓ Données récupérées avec succès!</span>
                     </div>
-                    """, unsafe_allow_html=True)
+                    """)
             else:
-                st.markdown(f"""
+                messages.append(f"""
                 <div class="custom-alert">
                     <strong>Erreur: {result}</strong>
                 </div>
-                """, unsafe_allow_html=True)
+                """)
         
         elif not nom_recherche or not etablissement_recherche:
-            st.markdown("""
+            messages.append("""
             <div class="custom-alert">
                 <strong>Veuillez remplir soit le numéro de dossier, soit (nom + établissement)</strong>
             </div>
-            """, unsafe_allow_html=True)
+            """)
         elif not is_valid_name(nom_recherche):
-            st.markdown("""
+            messages.append("""
             <div class="custom-alert">
                 <strong>Format de nom invalide (utilisez seulement des lettres)</strong>
             </div>
-            """, unsafe_allow_html=True)
+            """)
         else:
             # Réinitialiser l'état des dossiers multiples
             st.session_state.dossiers_multiples = False
@@ -504,54 +665,65 @@ with tab1:
                     st.session_state.liste_dossiers = result.get("dossiers", [])
                     
                     # Afficher un message d'information
-                    st.markdown(f"""
+                    messages.append(f"""
                     <div class="info-box">
                         <strong>Plusieurs dossiers trouvés ({len(st.session_state.liste_dossiers)})</strong><br/>
                         Veuillez sélectionner un dossier dans la liste ci-dessous.
                     </div>
-                    """, unsafe_allow_html=True)
+                    """)
                 else:
                     # Stocker les données récupérées
                     st.session_state.form_data = result
                     st.session_state.mysql_data_loaded = True
                     
                     # Afficher un message de succès
-                    st.markdown("""
+                    messages.append("""
                     <div class="success-message">
                         <span>Données récupérées avec succès!</span>
                     </div>
-                    """, unsafe_allow_html=True)
+                    """)
                     
                     # Afficher les données trouvées
-                    st.markdown("""
+                    messages.append("""
                     <div class="info-box">
                         <strong>Données récupérées (Grist)</strong><br/>
                         Les champs du formulaire vont être remplis automatiquement.
                     </div>
-                    """, unsafe_allow_html=True)
+                    """)
             else:
-                st.markdown(f"""
+                messages.append(f"""
                 <div class="custom-alert">
                     <strong>Erreur lors de la recherche: {result}</strong>
                 </div>
-                """, unsafe_allow_html=True)
+                """)
+        
+        # Réexécuter toute la page pour mettre à jour le panneau du dossier
+        st.session_state.messages_recherche_nom = messages
+        st.rerun()
+    
+    # Afficher (une seule fois) les messages de la dernière recherche
+    for message in st.session_state.pop("messages_recherche_nom", []):
+        st.markdown(message, unsafe_allow_html=True)
 
+@st.fragment
+def panneau_dossier():
+    """
+    Sélection du dossier, récapitulatif et génération du lien (onglet 1).
+    Exécuté comme fragment, indépendamment du formulaire de recherche.
+    """
     # Afficher la liste des dossiers si plusieurs ont été trouvés
     if st.session_state.dossiers_multiples and st.session_state.liste_dossiers:
         st.markdown("### Sélection du dossier")
         
         # Créer une liste de sélection des dossiers
         for i, dossier in enumerate(st.session_state.liste_dossiers):
-            dossier_id = dossier.get("id", "")
-            dossier_numero = dossier.get("numero", "")
-            dossier_nom = dossier.get("nom", "")
-            dossier_prenom = dossier.get("prenom", "")
-            dossier_etablissement = dossier.get("etablissement", "")
+            # Chaque élément est un DossierResume (sans les champs bruts)
+            dossier_numero = dossier.numero or ""
+            dossier_nom = dossier.nom or ""
+            dossier_prenom = dossier.prenom or ""
+            dossier_etablissement = dossier.etablissement or ""
             
-            # La date est dans dossier["fields"], pas directement dans dossier
-            fields = dossier.get("fields", {})
-            date_depart_brute = fields.get("date_depart")
-            date_depart_iso = grist_connector.transformer_date(date_depart_brute)
+            date_depart_iso = grist_connector.transformer_date(dossier.date_depart)
             dossier_date_depart = format_display_value(date_depart_iso, is_date=True)
             
             # Créer un conteneur pour chaque dossier
@@ -572,11 +744,14 @@ with tab1:
                 
                 with col2:
                     if st.button(f"Sélectionner", key=f"select_dossier_{i}"):
-                        # Récupérer les données du dossier sélectionné
-                        selected_fields = dossier.get("fields", {})
+                        # Résoudre le dossier complet depuis le cache partagé
+                        success_sel, dossier_selectionne = grist_connector.obtenir_dossier_par_id(dossier.id)
+                        if not success_sel:
+                            st.error(f"Erreur: {dossier_selectionne}")
+                            st.stop()
                         
                         # Mapper les données pour l'API
-                        mapped_data = grist_connector.mapper_donnees_mobilite(selected_fields)
+                        mapped_data = grist_connector.mapper_donnees_mobilite(dossier_selectionne)
                         
                         # Stocker les données et mettre à jour l'interface
                         st.session_state.form_data = mapped_data
@@ -584,7 +759,7 @@ with tab1:
                         st.session_state.dossiers_multiples = False
                         st.session_state.liste_dossiers = []
                         
-                        st.rerun()
+                        st.rerun(scope="fragment")
 
 # Si des données ont été chargées, afficher un récapitulatif
     if st.session_state.mysql_data_loaded:
@@ -687,13 +862,16 @@ with tab1:
             
             # Appeler le module de pré-remplissage avec génération d'URL courte
             with st.spinner("Génération du lien en cours..."):
-                success, result = ds_prefiller.generate_short_url(form_data)
+                # Demande explicite : toujours créer un nouveau dossier
+                success, result = ds_prefiller.generate_short_url(
+                    form_data, reutiliser=False, session=st.session_state.id_session
+                )
             
             # Enregistrer le résultat dans les variables de session
             if success:
                 st.session_state.generate_success = True
                 st.session_state.dossier_url = result
-                st.rerun()
+                st.rerun(scope="fragment")
             else:
                 st.error(f" Erreur: {result}")
 
@@ -724,14 +902,22 @@ with tab1:
         if st.button("Générer un nouveau lien", key="new_link"):
             st.session_state.generate_success = False
             st.session_state.dossier_url = ""
-            st.rerun()
+            st.rerun(scope="fragment")
+
+with tab1:
+    st.subheader("Recherche par nom apprenant et établissement")
+    formulaire_recherche_nom()
+    panneau_dossier()
 
 #################################################
 # ONGLET 2: RECHERCHE PAR DATE ET ÉTABLISSEMENT #
 #################################################
-with tab2:
-    st.subheader("Recherche par date de départ et établissement")
-    
+@st.fragment
+def formulaire_recherche_date():
+    """
+    Formulaire de recherche de l'onglet 2 (date de départ, établissement).
+    Exécuté comme fragment : la saisie ne réexécute que ce bloc.
+    """
     # Formulaire de recherche
     col1, col2 = st.columns(2)
     
@@ -813,15 +999,19 @@ with tab2:
                 )
             
             if success:
-                # Générer les liens de pré-remplissage pour chaque apprenant
-                st.session_state.resultats_recherche_date = generer_liens_pre_remplissage(result)
+                # Lancer la génération des liens en arrière-plan
+                lancer_generation_liens(
+                    result,
+                    f"{etablissement_date} - départ le {date_depart.strftime('%d/%m/%Y')}"
+                )
                 
-                # Afficher un message de succès
-                st.markdown(f"""
+                # Réexécuter toute la page pour démarrer le suivi du traitement
+                st.session_state.messages_recherche_date = [f"""
                 <div class="success-message">
-                    <span>{len(result)} apprenant(s) trouvé(s) et {len(st.session_state.resultats_recherche_date)} lien(s) généré(s)</span>
+                    <span>{len(result)} apprenant(s) trouvé(s), génération des liens lancée</span>
                 </div>
-                """, unsafe_allow_html=True)
+                """]
+                st.rerun()
             else:
                 st.markdown(f"""
                 <div class="custom-alert">
@@ -829,45 +1019,17 @@ with tab2:
                 </div>
                 """, unsafe_allow_html=True)
     
-    # Afficher les résultats si disponibles
-    if st.session_state.resultats_recherche_date:
-        st.markdown("### Tableau des apprenants avec liens de pré-remplissage")
-        
-        # Création du DataFrame pour affichage
-        df = pd.DataFrame(st.session_state.resultats_recherche_date)
-        
-        # Vérifier que toutes les colonnes existent avant de réorganiser
-        colonnes_ordre = []
-        # Vérifier et ajouter chaque colonne si elle existe
-        if "Numéro dossier Moow Pro" in df.columns:
-            colonnes_ordre.append("Numéro dossier Moow Pro")
-        colonnes_ordre.extend([
-            "Nom", "Prénom", "Date de départ", "Date de retour", 
-            "Pays d'accueil", "Établissement", "Type de mobilité", 
-            "Lien pré-remplissage"
-        ])
-        
-        # Filtrer les colonnes qui existent réellement dans le DataFrame
-        colonnes_disponibles = [col for col in colonnes_ordre if col in df.columns]
-        df = df[colonnes_disponibles]
-        
-        # Convertir les liens en liens cliquables
-        def make_clickable(val):
-            if val and isinstance(val, str) and val.startswith("http"):
-                return f'<a href="{val}" target="_blank">Ouvrir le lien</a>'
-            return val
-        
-        # Appliquer la fonction aux liens
-        df_display = df.copy()
-        df_display["Lien pré-remplissage"] = df_display["Lien pré-remplissage"].apply(make_clickable)
-        
-        # Afficher le tableau avec les liens cliquables
-        st.write(df_display.to_html(escape=False), unsafe_allow_html=True)
-        
-        # Bouton pour effacer les résultats
-        if st.button("Effacer les résultats", key="clear_results"):
-            st.session_state.resultats_recherche_date = []
-            st.rerun()
+    # Afficher (une seule fois) les messages de la dernière recherche
+    for message in st.session_state.pop("messages_recherche_date", []):
+        st.markdown(message, unsafe_allow_html=True)
+
+with tab2:
+    st.subheader("Recherche par date de départ et établissement")
+    formulaire_recherche_date()
+    
+    # Suivre le traitement en cours (ou reprendre un traitement précédent) ;
+    # pendant la génération, seul ce bloc est réexécuté à intervalle régulier
+    afficher_traitement_liens()
 
 # Pied de page avec copyright
 st.markdown("""
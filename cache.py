@@ -0,0 +1,197 @@
+"""
+Cache applicatif partagé par les connecteurs et ds_prefiller.
+Deux implémentations de la même interface (get, set, supprimer, invalider) :
+- CacheMemoire : LRU en mémoire, propre au processus (par défaut) ;
+- CacheSQLite : fichier SQLite partagé par tous les processus de la machine,
+  pour que plusieurs réplicas Streamlit partagent une même vue chaude.
+Les entrées sont rangées par espace ("dossiers", "etablissements", "liens"...)
+et peuvent expirer (TTL) ; invalider un espace le vide pour tous les processus.
+"""
+
+import os
+import time
+import zlib
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memoire")   # "memoire" ou "sqlite"
+CACHE_FICHIER = os.getenv("CACHE_FICHIER", os.path.join(".cache", "cache.db"))
+CACHE_TAILLE_MAX = int(os.getenv("CACHE_TAILLE_MAX", "10000"))
+
+# Les valeurs sérialisées plus grandes que ce seuil (octets) sont compressées
+SEUIL_COMPRESSION = 1024
+# Dans CacheSQLite, la date d'accès d'une entrée lue n'est réécrite que si
+# elle date de plus de ce délai (secondes) : LRU approché, sans une écriture par lecture
+INTERVALLE_ACCES = 60
+
+
+class CacheMemoire:
+    """
+    Cache LRU en mémoire, protégé par un verrou.
+
+    Args:
+        taille_max (int): Nombre maximal d'entrées, tous espaces confondus
+    """
+
+    def __init__(self, taille_max=CACHE_TAILLE_MAX):
+        self.taille_max = taille_max
+        self._entrees = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, espace, cle, defaut=None):
+        with self._lock:
+            entree = self._entrees.get((espace, cle))
+            if entree is None:
+                return defaut
+            expire, valeur = entree
+            if expire is not None and expire < time.time():
+                del self._entrees[(espace, cle)]
+                return defaut
+            self._entrees.move_to_end((espace, cle))
+            return valeur
+
+    def set(self, espace, cle, valeur, ttl=None):
+        expire = time.time() + ttl if ttl else None
+        with self._lock:
+            self._entrees[(espace, cle)] = (expire, valeur)
+            self._entrees.move_to_end((espace, cle))
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+
+    def supprimer(self, espace, cle):
+        with self._lock:
+            self._entrees.pop((espace, cle), None)
+
+    def invalider(self, espace):
+        with self._lock:
+            for cle in [c for c in self._entrees if c[0] == espace]:
+                del self._entrees[cle]
+
+
+class CacheSQLite:
+    """
+    Cache partagé entre processus dans un fichier SQLite (mode WAL).
+    Les valeurs sont sérialisées avec pickle (binaire, compressé au-delà de
+    SEUIL_COMPRESSION). Une invalidation supprime les entrées dans le fichier :
+    elle est vue immédiatement par tous les processus.
+
+    Args:
+        chemin (str): Fichier SQLite
+        taille_max (int): Nombre maximal d'entrées (les moins récemment lues
+            ou écrites sont évincées, à INTERVALLE_ACCES près)
+    """
+
+    def __init__(self, chemin=CACHE_FICHIER, taille_max=CACHE_TAILLE_MAX):
+        self.chemin = chemin
+        self.taille_max = taille_max
+        self._local = threading.local()
+        self._ecritures = 0
+        dossier = os.path.dirname(chemin)
+        if dossier:
+            os.makedirs(dossier, exist_ok=True)
+        conn = self._connexion()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (espace TEXT, cle TEXT, valeur BLOB, expire REAL, maj REAL, "
+            "PRIMARY KEY (espace, cle))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_maj ON cache (maj)")
+
+    def _connexion(self):
+        # Une connexion par thread, réutilisée d'un appel à l'autre
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.chemin, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _serialiser(valeur):
+        donnees = pickle.dumps(valeur, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(donnees) > SEUIL_COMPRESSION:
+            return b"z" + zlib.compress(donnees)
+        return b"p" + donnees
+
+    @staticmethod
+    def _deserialiser(donnees):
+        if donnees[:1] == b"z":
+            return pickle.loads(zlib.decompress(donnees[1:]))
+        return pickle.loads(donnees[1:])
+
+    def get(self, espace, cle, defaut=None):
+        try:
+            conn = self._connexion()
+            ligne = conn.execute(
+                "SELECT valeur, expire, maj FROM cache WHERE espace = ? AND cle = ?", (espace, str(cle))
+            ).fetchone()
+            maintenant = time.time()
+            if ligne is None or (ligne[1] is not None and ligne[1] < maintenant):
+                return defaut
+            if ligne[2] is None or maintenant - ligne[2] > INTERVALLE_ACCES:
+                conn.execute("UPDATE cache SET maj = ? WHERE espace = ? AND cle = ?", (maintenant, espace, str(cle)))
+            return self._deserialiser(ligne[0])
+        except (sqlite3.Error, pickle.UnpicklingError, zlib.error, EOFError) as e:
+            print(f"Erreur de lecture du cache partagé ({espace}): {e}")
+            return defaut
+
+    def set(self, espace, cle, valeur, ttl=None):
+        maintenant = time.time()
+        try:
+            conn = self._connexion()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (espace, cle, valeur, expire, maj) VALUES (?, ?, ?, ?, ?)",
+                (espace, str(cle), self._serialiser(valeur), maintenant + ttl if ttl else None, maintenant)
+            )
+            self._ecritures += 1
+            if self._ecritures % 100 == 0:
+                self._evincer(conn, maintenant)
+        except (sqlite3.Error, pickle.PicklingError) as e:
+            print(f"Erreur d'écriture du cache partagé ({espace}): {e}")
+
+    def _evincer(self, conn, maintenant):
+        """Supprime les entrées expirées puis les moins récemment utilisées au-delà de taille_max."""
+        conn.execute("DELETE FROM cache WHERE expire IS NOT NULL AND expire < ?", (maintenant,))
+        conn.execute(
+            "DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY maj DESC LIMIT -1 OFFSET ?)",
+            (self.taille_max,)
+        )
+
+    def supprimer(self, espace, cle):
+        try:
+            self._connexion().execute("DELETE FROM cache WHERE espace = ? AND cle = ?", (espace, str(cle)))
+        except sqlite3.Error as e:
+            print(f"Erreur de suppression dans le cache partagé ({espace}): {e}")
+
+    def invalider(self, espace):
+        try:
+            self._connexion().execute("DELETE FROM cache WHERE espace = ?", (espace,))
+        except sqlite3.Error as e:
+            print(f"Erreur d'invalidation du cache partagé ({espace}): {e}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def obtenir_cache():
+    """
+    Renvoie le cache du processus, selon CACHE_BACKEND.
+
+    Returns:
+        CacheMemoire ou CacheSQLite: Cache configuré par l'environnement
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            if CACHE_BACKEND == "sqlite":
+                _cache = CacheSQLite(CACHE_FICHIER)
+            else:
+                _cache = CacheMemoire()
+        return _cache
@@ -0,0 +1,146 @@
+"""
+Fusion des appels vers les sources de données.
+- GroupeAppels (single-flight) : quand plusieurs sessions lancent la même
+  requête vers Grist ou MySQL alors qu'elle est déjà en cours, elles attendent
+  et partagent le résultat de l'appel en cours au lieu d'en lancer un nouveau.
+  Rien n'est conservé une fois l'appel terminé : la fusion ne rend jamais de
+  résultat périmé.
+- RegroupeurLots (micro-lots) : les recherches par clé proches dans le temps
+  sont résolues par un seul appel multi-valeurs.
+"""
+
+import threading
+
+
+class _Appel:
+    __slots__ = ("termine", "resultat", "erreur")
+
+    def __init__(self):
+        self.termine = threading.Event()
+        self.resultat = None
+        self.erreur = None
+
+
+class GroupeAppels:
+    """
+    Groupe d'appels fusionnés par clé.
+    Le résultat est partagé tel quel entre les appelants : il ne doit pas être modifié.
+    """
+
+    def __init__(self):
+        self._en_cours = {}
+        self._lock = threading.Lock()
+
+    def executer(self, cle, fonction, *args, **kwargs):
+        """
+        Exécute fonction(*args, **kwargs), ou attend l'appel de même clé déjà en cours.
+
+        Args:
+            cle: Clé hashable identifiant la requête (endpoint et paramètres normalisés)
+            fonction (callable): Appel à effectuer
+
+        Returns:
+            Le résultat de l'appel (l'exception de l'appel est relevée chez chaque appelant)
+        """
+        with self._lock:
+            appel = self._en_cours.get(cle)
+            meneur = appel is None
+            if meneur:
+                appel = _Appel()
+                self._en_cours[cle] = appel
+
+        if not meneur:
+            appel.termine.wait()
+            if appel.erreur is not None:
+                raise appel.erreur
+            return appel.resultat
+
+        try:
+            appel.resultat = fonction(*args, **kwargs)
+            return appel.resultat
+        except Exception as e:
+            appel.erreur = e
+            raise
+        finally:
+            with self._lock:
+                del self._en_cours[cle]
+            appel.termine.set()
+
+
+class _Lot:
+    __slots__ = ("cles", "plein", "termine", "resultats", "erreur")
+
+    def __init__(self):
+        self.cles = []
+        self.plein = threading.Event()
+        self.termine = threading.Event()
+        self.resultats = {}
+        self.erreur = None
+
+
+class RegroupeurLots:
+    """
+    Regroupe les recherches par clé arrivant à quelques millisecondes d'intervalle
+    en un seul appel multi-valeurs, puis redistribue les résultats.
+
+    Args:
+        fonction_lot (callable): Reçoit une liste de clés, renvoie {cle: resultat}
+        delai (float): Attente maximale (secondes) pour compléter un lot
+        taille_max (int): Nombre maximal de clés par appel
+    """
+
+    def __init__(self, fonction_lot, delai=0.005, taille_max=100):
+        self.fonction_lot = fonction_lot
+        self.delai = delai
+        self.taille_max = taille_max
+        self._lot = None
+        self._lock = threading.Lock()
+
+    def obtenir(self, cle, defaut=None):
+        """
+        Résultat d'une clé, obtenu avec celles des autres appelants du même lot.
+        Le premier appelant d'un lot attend `delai` (ou que le lot soit plein)
+        puis exécute l'appel ; les suivants attendent son résultat.
+        """
+        with self._lock:
+            lot = self._lot
+            meneur = lot is None
+            if meneur:
+                lot = self._lot = _Lot()
+            if cle not in lot.cles:
+                lot.cles.append(cle)
+            if len(lot.cles) >= self.taille_max:
+                self._lot = None
+                lot.plein.set()
+
+        if meneur:
+            lot.plein.wait(self.delai)
+            with self._lock:
+                if self._lot is lot:
+                    self._lot = None
+            try:
+                lot.resultats = self.fonction_lot(list(lot.cles))
+            except Exception as e:
+                lot.erreur = e
+            finally:
+                lot.termine.set()
+        else:
+            lot.termine.wait()
+
+        if lot.erreur is not None:
+            raise lot.erreur
+        return lot.resultats.get(cle, defaut)
+
+    def obtenir_plusieurs(self, cles):
+        """
+        Résultats d'une liste de clés (opération de masse), par appels de
+        taille_max clés au plus, sans attente de regroupement.
+
+        Returns:
+            dict: {cle: resultat} pour les clés trouvées
+        """
+        cles = list(dict.fromkeys(cles))
+        resultats = {}
+        for debut in range(0, len(cles), self.taille_max):
+            resultats.update(self.fonction_lot(cles[debut:debut + self.taille_max]))
+        return resultats
@@ -0,0 +1,215 @@
+"""
+Moteur de mapping déclaratif pour Démarches Simplifiées.
+Le contenu du pré-remplissage est décrit par une spécification
+(un Champ par champ_ DS : champ source, transformation, constante ou défaut),
+compilée une seule fois au démarrage en une fonction de mapping rapide.
+"""
+
+from datetime import datetime
+
+# Marqueur pour distinguer "pas de constante" d'une constante None
+_AUCUNE = object()
+
+
+def transformer_date(date_val):
+    """
+    Transforme une date au format ISO8601.
+    Reprend exactement la logique du script original.
+    """
+    if not date_val or date_val == "None" or date_val == "null":
+        return None
+
+    try:
+        # Essayer différents formats de dates possibles
+        try:
+            return datetime.strptime(str(date_val), "%Y-%m-%d").strftime("%Y-%m-%d")
+        except ValueError:
+            try:
+                return datetime.strptime(str(date_val), "%d/%m/%Y").strftime("%Y-%m-%d")
+            except ValueError:
+                try:
+                    # Format ISO avec heure
+                    return datetime.strptime(str(date_val), "%Y-%m-%dT%H:%M:%S").strftime("%Y-%m-%d")
+                except ValueError:
+                    print(f"Format de date non reconnu: {date_val}")
+                    return str(date_val)  # Retourner la valeur telle quelle si format inconnu
+    except Exception as e:
+        print(f"Erreur lors de la conversion de la date '{date_val}': {e}")
+        return None
+
+
+def normaliser_civilite(civilite):
+    """Normalise la civilité : "M" -> "M.", "Mme" reste "Mme"."""
+    return "M." if civilite == "M" else civilite
+
+
+def est_apprenti(statut_participant):
+    """Renvoie "true" si le participant est apprenti, "false" sinon (champ booléen DS)."""
+    return "true" if statut_participant and str(statut_participant).lower() == "apprenti" else "false"
+
+
+def statut_apprenant(statut_participant):
+    """Statut DS déduit du statut du participant."""
+    return "Apprenti" if est_apprenti(statut_participant) == "true" else "Étudiant"
+
+
+def mobilite_hybride(format_mobilite):
+    """Renvoie "true" si la mobilité est hybride, "false" sinon (champ booléen DS)."""
+    return "true" if format_mobilite == "Mobilité hybride" else "false"
+
+
+def valeur_mobilite_apprenant(mobilite_apprenant):
+    """
+    Les deux valeurs possibles sont "Mobilité d'apprentissage de courte durée"
+    et "Concours de compétence".
+    """
+    if mobilite_apprenant == "Concours de compétence":
+        return "Concours de compétence"
+    # Valeur par défaut ou si mobilité de stage
+    return "Mobilité d'apprentissage de courte durée"
+
+
+# Transformations utilisables par nom dans une spécification
+TRANSFORMATIONS = {
+    "date": transformer_date,
+    "civilite": normaliser_civilite,
+    "est_apprenti": est_apprenti,
+    "statut_apprenant": statut_apprenant,
+    "mobilite_hybride": mobilite_hybride,
+    "valeur_mobilite_apprenant": valeur_mobilite_apprenant,
+}
+
+
+class Champ:
+    """
+    Description déclarative d'un champ DS.
+
+    Args:
+        champ_id (str): Identifiant DS (ex: "champ_Q2hhbXAtNzg1Mjcx")
+        source (str): Clé lue dans les données de l'apprenant
+        transformation (str): Nom d'une transformation de TRANSFORMATIONS (optionnel)
+        constante: Valeur fixe (exclusive avec source)
+        defaut: Valeur utilisée si la clé source est absente des données
+        libelle (str): Libellé lisible, pour les messages et la documentation
+    """
+    __slots__ = ("champ_id", "source", "transformation", "constante", "defaut", "libelle")
+
+    def __init__(self, champ_id, source=None, transformation=None, constante=_AUCUNE,
+                 defaut=None, libelle=""):
+        self.champ_id = champ_id
+        self.source = source
+        self.transformation = transformation
+        self.constante = constante
+        self.defaut = defaut
+        self.libelle = libelle
+
+    @property
+    def est_constant(self):
+        return self.constante is not _AUCUNE
+
+    def __repr__(self):
+        return f"Champ({self.champ_id!r}, libelle={self.libelle!r})"
+
+
+# Spécification ERASMIP (démarche 70018), dans l'ordre du script original
+SPEC_ERASMIP = (
+    Champ("champ_Q2hhbXAtMzM0ODUwMg", constante="Occitanie", libelle="Région"),
+    Champ("champ_Q2hhbXAtMTAzMjQ0Ng", source="civilite", transformation="civilite", defaut="", libelle="Civilité"),
+    Champ("champ_Q2hhbXAtNzg1Mjcx", source="nom", defaut="", libelle="Nom"),
+    Champ("champ_Q2hhbXAtNzg1Mjcy", source="prenom", defaut="", libelle="Prénom"),
+    Champ("champ_Q2hhbXAtNjI2NjMx", source="date_naissance", transformation="date", libelle="Date de naissance"),
+    Champ("champ_Q2hhbXAtMjc4NDc3MQ", source="mobilite_apprenant", transformation="valeur_mobilite_apprenant", defaut="", libelle="Mobilité apprenant"),
+    Champ("champ_Q2hhbXAtMzAwMjA2MA", source="statut_participant", transformation="est_apprenti", defaut="", libelle="Est apprenti"),
+    Champ("champ_Q2hhbXAtMTAzMjQ0NQ", source="statut_participant", transformation="statut_apprenant", defaut="", libelle="Statut"),
+    Champ("champ_Q2hhbXAtNDcwODc3MA", constante="true", libelle="Projet Erasmus+"),
+    Champ("champ_Q2hhbXAtNDcwODc3MQ", constante="true", libelle="Consortium Erasmus+"),
+    Champ("champ_Q2hhbXAtMjE0MTIxNg", source="format_mobilite", transformation="mobilite_hybride", defaut="", libelle="Mobilité hybride"),
+    Champ("champ_Q2hhbXAtNzEyMjc0", constante="Stage", libelle="Type de mobilité"),
+    Champ("champ_Q2hhbXAtNjI2Njg2", source="date_depart", transformation="date", libelle="Date de départ"),
+    Champ("champ_Q2hhbXAtNjI2Njg4", source="date_retour", transformation="date", libelle="Date de retour"),
+    Champ("champ_Q2hhbXAtNDczNTI1MA", constante="Pays membre de l'Union Européenne", libelle="Zone destination"),
+    Champ("champ_Q2hhbXAtNDczNTAyNg", source="pays_accueil", defaut="", libelle="Pays d'accueil"),
+)
+
+
+class MappingCompile:
+    """
+    Fonction de mapping issue de compiler_spec.
+    Appelée sur un apprenant, renvoie le dictionnaire {champ_id: valeur}
+    sans les valeurs None ; lot() applique le mapping à une liste.
+    """
+    __slots__ = ("champs", "_etapes")
+
+    def __init__(self, champs, etapes):
+        self.champs = champs
+        self._etapes = etapes
+
+    def __call__(self, donnees):
+        get = donnees.get
+        resultat = {}
+        for champ_id, source, fonction, valeur in self._etapes:
+            if source is not None:
+                valeur = get(source, valeur)
+                if fonction is not None:
+                    valeur = fonction(valeur)
+            if valeur is not None:
+                resultat[champ_id] = valeur
+        return resultat
+
+    def lot(self, liste_donnees):
+        """Applique le mapping à une liste d'apprenants."""
+        return [self(donnees) for donnees in liste_donnees]
+
+
+def compiler_spec(spec, sources_connues=None):
+    """
+    Valide une spécification et la compile en MappingCompile.
+    Toute erreur de spécification est levée ici, au démarrage,
+    plutôt qu'au moment de la génération d'un lien.
+
+    Args:
+        spec (sequence): Liste de Champ
+        sources_connues (iterable, optional): Clés sources autorisées
+
+    Returns:
+        MappingCompile: Fonction de mapping compilée
+
+    Raises:
+        ValueError: Si la spécification est invalide
+    """
+    erreurs = []
+    vus = set()
+    sources_connues = set(sources_connues) if sources_connues is not None else None
+    etapes = []
+
+    for champ in spec:
+        cid = champ.champ_id
+        if not isinstance(cid, str) or not cid.startswith("champ_"):
+            erreurs.append(f"{cid!r}: identifiant de champ invalide")
+        if cid in vus:
+            erreurs.append(f"{cid}: champ défini plusieurs fois")
+        vus.add(cid)
+
+        if champ.est_constant:
+            if champ.source is not None or champ.transformation is not None:
+                erreurs.append(f"{cid}: une constante ne peut pas avoir de source ni de transformation")
+            etapes.append((cid, None, None, champ.constante))
+            continue
+
+        if not champ.source:
+            erreurs.append(f"{cid}: ni source ni constante")
+            continue
+        if sources_connues is not None and champ.source not in sources_connues:
+            erreurs.append(f"{cid}: source inconnue {champ.source!r}")
+
+        fonction = None
+        if champ.transformation is not None:
+            fonction = TRANSFORMATIONS.get(champ.transformation)
+            if fonction is None:
+                erreurs.append(f"{cid}: transformation inconnue {champ.transformation!r}")
+        etapes.append((cid, champ.source, fonction, champ.defaut))
+
+    if erreurs:
+        raise ValueError("Spécification de mapping DS invalide:\n" + "\n".join(erreurs))
+
+    return MappingCompile(tuple(spec), tuple(etapes))
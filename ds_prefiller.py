@@ -8,8 +8,16 @@ import requests
 import os
 from dotenv import load_dotenv
 import json
+import hashlib
+import urllib.parse
 from datetime import datetime
 
+import ds_schema
+from cache import obtenir_cache
+from rate_limiter import obtenir_limiteur_ds
+from ds_mapping import SPEC_ERASMIP, compiler_spec
+from modeles import Dossier
+
 # Charger les variables d'environnement
 load_dotenv()
 
@@ -17,113 +25,125 @@ load_dotenv()
 DEMARCHE_ID = os.getenv("DEMARCHE_ID", "70018")  # ID de démarche ERASMIP
 API_TOKEN = os.getenv("API_TOKEN")  # Token API
 
-def transformer_date(date_val):
+# Mode de pré-remplissage par défaut :
+# - "api" : création du dossier par POST sur l'API publique (comportement historique)
+# - "url" : lien GET vers la page de démarrage de la démarche, construit localement
+MODE_PREFILL = os.getenv("DS_MODE_PREFILL", "api")
+DEMARCHE_PATH = os.getenv("DEMARCHE_PATH")  # Chemin de la démarche (https://www.demarches-simplifiees.fr/commencer/<chemin>)
+DS_URL_COMMENCER = "https://www.demarches-simplifiees.fr/commencer"
+# Longueur maximale d'un lien GET (limite prudente des navigateurs et serveurs)
+URL_LONGUEUR_MAX = int(os.getenv("DS_URL_LONGUEUR_MAX", "2000"))
+# Validation locale des données contre le schéma (mis en cache) de la démarche
+VALIDATION_LOCALE = os.getenv("DS_VALIDATION_LOCALE", "1") == "1"
+# Nombre maximal d'envois d'une même requête en cas de réponse 429
+MAX_TENTATIVES_429 = int(os.getenv("DS_MAX_TENTATIVES_429", "3"))
+
+# Mapping ERASMIP compilé (et validé) une seule fois, au chargement du module
+MAPPING_ERASMIP = compiler_spec(SPEC_ERASMIP, sources_connues=Dossier.CHAMPS)
+CHAMPS_ERASMIP = tuple(champ.champ_id for champ in SPEC_ERASMIP)
+
+# Durée (secondes) pendant laquelle un lien API déjà généré pour des données
+# identiques est réutilisé plutôt que de créer un nouveau dossier (0 : désactivé,
+# par défaut : le dossier réutilisé a pu être commencé ou déposé entre-temps)
+CACHE_TTL_LIENS = int(os.getenv("CACHE_TTL_LIENS", "0"))
+ESPACE_LIENS = "ds_liens"
+
+def valider_donnees_mappees(donnees):
     """
-    Transforme une date au format ISO8601.
-    Reprend exactement la logique du script original.
+    Valide localement des données mappées contre le schéma de la démarche.
+    Si le schéma est indisponible, les données sont acceptées (validation par DS).
+    Les champs obligatoires du mapping vides ou manquants sont signalés.
+    
+    Args:
+        donnees (dict): Données {champ_id: valeur}
+        
+    Returns:
+        tuple: (success, result) où result est None ou un message d'erreur
+    """
+    if not VALIDATION_LOCALE:
+        return True, None
+    schema = ds_schema.obtenir_schema(DEMARCHE_ID, API_TOKEN)
+    if schema is None:
+        return True, None
+    erreurs = schema.valider(donnees, verifier_obligatoires=True, champs_attendus=CHAMPS_ERASMIP)
+    if erreurs:
+        return False, "Données invalides: " + "; ".join(erreurs)
+    return True, None
+
+def generate_prefilled_query_url(data_dict):
     """
-    if not date_val or date_val == "None" or date_val == "null":
-        return None
+    Génère localement un lien GET de pré-remplissage (paramètres champ_* dans l'URL
+    de démarrage de la démarche), sans appel réseau ni création de dossier.
+    
+    Args:
+        data_dict (dict): Données mappées (mapper_donnees_mobilite du connecteur)
         
-    try:
-        # Essayer différents formats de dates possibles
-        try:
-            return datetime.strptime(str(date_val), "%Y-%m-%d").strftime("%Y-%m-%d")
-        except ValueError:
-            try:
-                return datetime.strptime(str(date_val), "%d/%m/%Y").strftime("%Y-%m-%d")
-            except ValueError:
-                try:
-                    # Format ISO avec heure
-                    return datetime.strptime(str(date_val), "%Y-%m-%dT%H:%M:%S").strftime("%Y-%m-%d")
-                except ValueError:
-                    print(f"Format de date non reconnu: {date_val}")
-                    return str(date_val)  # Retourner la valeur telle quelle si format inconnu
-    except Exception as e:
-        print(f"Erreur lors de la conversion de la date '{date_val}': {e}")
-        return None
+    Returns:
+        tuple: (success, result) où result est l'URL ou un message d'erreur
+    """
+    if not DEMARCHE_PATH:
+        return False, "Chemin de la démarche (DEMARCHE_PATH) non configuré. Vérifiez votre fichier .env"
+    if isinstance(data_dict, Dossier):
+        return False, "Dossier brut : appliquer d'abord mapper_donnees_mobilite du connecteur"
+    
+    donnees = MAPPING_ERASMIP(data_dict)
+    valide, erreur = valider_donnees_mappees(donnees)
+    if not valide:
+        return False, erreur
+    query = urllib.parse.urlencode(donnees, quote_via=urllib.parse.quote)
+    url = f"{DS_URL_COMMENCER}/{urllib.parse.quote(DEMARCHE_PATH)}?{query}"
+    
+    if len(url) > URL_LONGUEUR_MAX:
+        return False, f"Lien de pré-remplissage trop long ({len(url)} caractères, maximum {URL_LONGUEUR_MAX})"
+    
+    return True, url
 
-def generate_prefilled_url(data_dict):
+def generate_prefilled_url(data_dict, mode=None, reutiliser=True, session=None):
     """
     Génère une URL vers un dossier pré-rempli sur Démarches Simplifiées pour ERASMIP.
-    Suit exactement la structure du script original.
+    Les champs envoyés sont définis par ds_mapping.SPEC_ERASMIP.
     
     Args:
-        data_dict (dict): Dictionnaire des données du formulaire
+        data_dict (dict): Données mappées (mapper_donnees_mobilite du connecteur)
+        mode (str, optional): "api" ou "url" (par défaut MODE_PREFILL)
+        reutiliser (bool): Réutiliser le lien déjà créé pour les mêmes données
+            (si CACHE_TTL_LIENS est activé) ; False force la création d'un dossier
+        session (optional): Identité de l'appelant (traitement ou session
+            Streamlit), servie à tour de rôle par le limiteur de débit
         
     Returns:
         tuple: (success, result) où result est l'URL ou un message d'erreur
     """
+    if isinstance(data_dict, Dossier):
+        # Les dates brutes d'un Dossier dépendent de la source (horodatages Grist)
+        return False, "Dossier brut : appliquer d'abord mapper_donnees_mobilite du connecteur"
+    mode = mode or MODE_PREFILL
+    if mode == "url":
+        return generate_prefilled_query_url(data_dict)
+    if mode != "api":
+        return False, f"Mode de pré-remplissage inconnu: {mode}"
+    
     # Vérifier la présence du token API
     if not API_TOKEN:
         return False, "Token API non trouvé. Vérifiez votre fichier .env"
     
-    # Extraire les données et appliquer les transformations
-    civilite = data_dict.get("civilite", "")
-    # Normaliser la civilité : "M" -> "M.", "Mme" reste "Mme"
-    if civilite == "M":
-        civilite = "M."
-    nom = data_dict.get("nom", "")
-    prenom = data_dict.get("prenom", "")
-    date_naissance = transformer_date(data_dict.get("date_naissance"))
-    format_mobilite = data_dict.get("format_mobilite", "")
-    mobilite_apprenant = data_dict.get("mobilite_apprenant", "")
-    date_depart = transformer_date(data_dict.get("date_depart"))
-    date_retour = transformer_date(data_dict.get("date_retour"))
-    pays_accueil = data_dict.get("pays_accueil", "")
-    statut_participant = data_dict.get("statut_participant", "")
-    
-    # Log pour débogage
-    print(f"Date de naissance après transformation: {date_naissance}")
-    print(f"Date de départ après transformation: {date_depart}")
-    print(f"Date de retour après transformation: {date_retour}")
-    print(f"Mobilité apprenant: {mobilite_apprenant}")
-    
-    # Définir le statut de la mobilité hybride (convertir en true/false pour les champs booléens)
-    mobilite_hybride = "true" if format_mobilite == "Mobilité hybride" else "false"
-    
-    # Logique simplifiée pour le type de mobilité
-    # Pour ce champ, on utilise toujours "Stage" comme valeur par défaut,
-    # quelle que soit la valeur de mobilite_apprenant
-    type_mobilite_val = "Stage"
-    
-    # Logique pour valeur_mobilite_apprenant
-    # Les deux valeurs possibles sont "Mobilité d'apprentissage de courte durée" et "Concours de compétence"
-    if mobilite_apprenant == "Concours de compétence":
-        valeur_mobilite_apprenant = "Concours de compétence"
-    else:
-        # Valeur par défaut ou si mobilité de stage
-        valeur_mobilite_apprenant = "Mobilité d'apprentissage de courte durée"
-    
-    # Déterminer si l'apprenant est apprenti (même logique que script original)
-    est_apprenti = "true" if statut_participant and statut_participant.lower() == "apprenti" else "false"
-    
-    # Déterminer le statut en fonction de est_apprenti
-    statut_apprenant = "Apprenti" if est_apprenti == "true" else "Étudiant"
-    
-    # Construction du dictionnaire de données EXACT comme dans le script original
-    # Reproduire exactement la structure pour être sûr que ça fonctionne
-    donnees_mappees = {
-        "champ_Q2hhbXAtMzM0ODUwMg": "Occitanie",  # Valeur fixe "Occitanie" au lieu de civilité
-        "champ_Q2hhbXAtMTAzMjQ0Ng": civilite,  # Civilité
-        "champ_Q2hhbXAtNzg1Mjcx": nom,       # Nom
-        "champ_Q2hhbXAtNzg1Mjcy": prenom,    # Prénom
-        "champ_Q2hhbXAtNjI2NjMx": date_naissance,  # Date naissance
-        "champ_Q2hhbXAtMjc4NDc3MQ": valeur_mobilite_apprenant,  # Mobilité apprenant
-        "champ_Q2hhbXAtMzAwMjA2MA": est_apprenti,  # Est apprenti (true/false)
-        "champ_Q2hhbXAtMTAzMjQ0NQ": statut_apprenant,  # Statut basé sur est_apprenti
-        "champ_Q2hhbXAtNDcwODc3MA": "true",  # Champ booléen - doit être "true" au lieu de "Oui"
-        "champ_Q2hhbXAtNDcwODc3MQ": "true",  # Champ booléen - doit être "true" au lieu de "Oui"
-        "champ_Q2hhbXAtMjE0MTIxNg": mobilite_hybride,  # Mobilité hybride (true/false)
-        "champ_Q2hhbXAtNzEyMjc0": type_mobilite_val,  # Type de mobilité (toujours "Stage")
-        "champ_Q2hhbXAtNjI2Njg2": date_depart,  # Date de départ
-        "champ_Q2hhbXAtNjI2Njg4": date_retour,  # Date de retour
-        "champ_Q2hhbXAtNDczNTI1MA": "Pays membre de l'Union Européenne",  # Valeur fixe
-        "champ_Q2hhbXAtNDczNTAyNg": pays_accueil  # Pays d'accueil
-    }
+    # Appliquer le mapping déclaratif (SPEC_ERASMIP), sans les champs None
+    donnees_filtrees = MAPPING_ERASMIP(data_dict)
+    
+    # Rejeter localement les données invalides, sans consommer de quota API
+    valide, erreur = valider_donnees_mappees(donnees_filtrees)
+    if not valide:
+        print(erreur)
+        return False, erreur
     
-    # Filtrer les champs None pour éviter des problèmes d'API
-    donnees_filtrees = {k: v for k, v in donnees_mappees.items() if v is not None}
+    # Réutiliser le lien d'un dossier déjà créé avec les mêmes données
+    cle_cache = hashlib.sha256(
+        f"{DEMARCHE_ID}:{json.dumps(donnees_filtrees, sort_keys=True, default=str)}".encode("utf-8")
+    ).hexdigest()
+    if CACHE_TTL_LIENS and reutiliser:
+        url_connue = obtenir_cache().get(ESPACE_LIENS, cle_cache)
+        if url_connue:
+            return True, url_connue
     
     # Afficher le résultat du mapping pour le débogage
     print("\nDonnées mappées pour l'API:")
@@ -137,34 +157,46 @@ def generate_prefilled_url(data_dict):
     }
     
     try:
-        # Envoyer la requête à l'API
-        print(f"Envoi de la requête à l'API: {api_url}")
-        response = requests.post(api_url, headers=headers, json=donnees_filtrees)
+        # Envoyer la requête à l'API, au débit autorisé par le limiteur partagé
+        limiteur = obtenir_limiteur_ds()
+        for tentative in range(MAX_TENTATIVES_429):
+            limiteur.acquerir(session=session)
+            print(f"Envoi de la requête à l'API: {api_url}")
+            response = requests.post(api_url, headers=headers, json=donnees_filtrees)
+            limiteur.signaler_reponse(response.status_code, response.headers.get("Retry-After"))
+            if response.status_code != 429:
+                break
         
         print(f"Code de réponse: {response.status_code}")
         print(f"Réponse complète: {response.text}")
         
         if response.status_code == 201:
             response_data = response.json()
-            return True, response_data.get("dossier_url", "")
+            dossier_url = response_data.get("dossier_url", "")
+            if CACHE_TTL_LIENS and dossier_url:
+                obtenir_cache().set(ESPACE_LIENS, cle_cache, dossier_url, ttl=CACHE_TTL_LIENS)
+            return True, dossier_url
         else:
             return False, f"Erreur API DS: {response.text}"
     except Exception as e:
         return False, f"Exception: {str(e)}"
 
-def generate_short_url(data_dict):
+def generate_short_url(data_dict, mode=None, reutiliser=True, session=None):
     """
     Génère une URL courte et explicite pour un dossier pré-rempli.
     Inclut le nom de l'apprenant dans l'URL pour une meilleure lisibilité.
     
     Args:
-        data_dict (dict): Dictionnaire des données du formulaire
+        data_dict (dict): Données mappées (mapper_donnees_mobilite du connecteur)
+        mode (str, optional): "api" ou "url" (par défaut MODE_PREFILL)
+        reutiliser (bool): Voir generate_prefilled_url
+        session (optional): Voir generate_prefilled_url
         
     Returns:
         tuple: (success, result) où result est l'URL courte ou un message d'erreur
     """
     # D'abord, générer l'URL standard
-    success, url = generate_prefilled_url(data_dict)
+    success, url = generate_prefilled_url(data_dict, mode=mode, reutiliser=reutiliser, session=session)
     
     if not success:
         return False, url  # Renvoyer l'erreur
@@ -231,4 +263,3 @@ if __name__ == "__main__":
         print(f"Test réussi ! URL générée : {result}")
     else:
         print(f"Échec du test : {result}")
-
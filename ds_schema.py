@@ -0,0 +1,317 @@
+"""
+Schéma des champs d'une démarche Démarches Simplifiées.
+Ce module charge les descripteurs de champs (type, options, obligatoire)
+de la révision active via l'API GraphQL, les met en cache sur disque
+et valide localement les données de pré-remplissage avant tout envoi.
+"""
+
+import os
+import json
+import time
+import threading
+from datetime import datetime
+
+import requests
+from dotenv import load_dotenv
+
+from coalescence import GroupeAppels
+from rate_limiter import obtenir_limiteur_ds
+
+# Charger les variables d'environnement
+load_dotenv()
+
+DS_GRAPHQL_URL = "https://www.demarches-simplifiees.fr/api/v2/graphql"
+DS_CACHE_DIR = os.getenv("DS_CACHE_DIR", ".cache")
+# Délai (secondes) avant de revérifier la révision active de la démarche
+DS_SCHEMA_TTL = int(os.getenv("DS_SCHEMA_TTL", "3600"))
+# Délai (secondes) sans nouvel appel à l'API après un échec de chargement
+DS_SCHEMA_DELAI_ECHEC = int(os.getenv("DS_SCHEMA_DELAI_ECHEC", "60"))
+
+REQUETE_SCHEMA = """
+query getDemarche($demarcheNumber: Int!) {
+  demarche(number: $demarcheNumber) {
+    number
+    activeRevision {
+      id
+      champDescriptors {
+        __typename
+        id
+        label
+        required
+        ... on DropDownListChampDescriptor { options otherOption }
+        ... on MultipleDropDownListChampDescriptor { options }
+        ... on LinkedDropDownListChampDescriptor { options }
+      }
+    }
+  }
+}
+"""
+
+REQUETE_REVISION = """
+query getRevision($demarcheNumber: Int!) {
+  demarche(number: $demarcheNumber) { activeRevision { id } }
+}
+"""
+
+VALEURS_BOOLEENNES = ("true", "false")
+VALEURS_CIVILITE = ("M.", "Mme")
+
+# Schémas chargés en mémoire, par numéro de démarche
+_schemas = {}
+_schemas_lock = threading.Lock()
+# Date du dernier échec de chargement, par numéro de démarche
+_echecs = {}
+# Chargements en cours, partagés entre les appelants d'une même démarche
+_chargements = GroupeAppels()
+
+
+class DescripteurChamp:
+    """Description d'un champ de la révision active (clé champ_<id> du pré-remplissage)."""
+    __slots__ = ("champ_id", "type", "label", "required", "options", "autre_option")
+
+    def __init__(self, champ_id, type, label="", required=False, options=None, autre_option=False):
+        self.champ_id = champ_id
+        self.type = type
+        self.label = label
+        self.required = required
+        self.options = frozenset(options) if options else None
+        self.autre_option = autre_option
+
+    def valider(self, valeur):
+        """
+        Vérifie une valeur de pré-remplissage.
+
+        Returns:
+            str: Message d'erreur, ou None si la valeur est acceptée
+        """
+        if valeur is None or valeur == "":
+            return None
+
+        if self.type in ("CheckboxChampDescriptor", "YesNoChampDescriptor"):
+            if valeur not in VALEURS_BOOLEENNES:
+                return f"valeur booléenne attendue (true/false), reçu {valeur!r}"
+        elif self.type == "DateChampDescriptor":
+            try:
+                datetime.strptime(str(valeur), "%Y-%m-%d")
+            except ValueError:
+                return f"date AAAA-MM-JJ attendue, reçu {valeur!r}"
+        elif self.type == "DatetimeChampDescriptor":
+            try:
+                datetime.fromisoformat(str(valeur))
+            except ValueError:
+                return f"date et heure ISO 8601 attendues, reçu {valeur!r}"
+        elif self.type == "CiviliteChampDescriptor":
+            if valeur not in VALEURS_CIVILITE:
+                return f"civilité attendue (M. ou Mme), reçu {valeur!r}"
+        elif self.type == "IntegerNumberChampDescriptor":
+            try:
+                int(str(valeur))
+            except ValueError:
+                return f"nombre entier attendu, reçu {valeur!r}"
+        elif self.type == "DecimalNumberChampDescriptor":
+            try:
+                float(str(valeur))
+            except ValueError:
+                return f"nombre décimal attendu, reçu {valeur!r}"
+
+        if self.options is not None and not self.autre_option:
+            valeurs = valeur if isinstance(valeur, (list, tuple)) else [valeur]
+            invalides = [v for v in valeurs if v not in self.options]
+            if invalides:
+                return f"option non autorisée {invalides[0]!r}"
+        return None
+
+    def en_dict(self):
+        return {
+            "champ_id": self.champ_id,
+            "type": self.type,
+            "label": self.label,
+            "required": self.required,
+            "options": sorted(self.options) if self.options is not None else None,
+            "autre_option": self.autre_option,
+        }
+
+
+class SchemaDemarche:
+    """
+    Descripteurs de champs d'une révision de démarche.
+    Peut être construit depuis la réponse GraphQL ou depuis un dictionnaire
+    (cache disque, ou schéma local de substitution).
+    """
+
+    def __init__(self, demarche_id, revision_id, descripteurs, date_verification=None):
+        self.demarche_id = str(demarche_id)
+        self.revision_id = revision_id
+        self.descripteurs = {d.champ_id: d for d in descripteurs}
+        self.date_verification = date_verification or time.time()
+
+    @classmethod
+    def depuis_graphql(cls, demarche_id, data):
+        revision = data["demarche"]["activeRevision"]
+        descripteurs = [
+            DescripteurChamp(
+                f"champ_{c['id']}",
+                c.get("__typename"),
+                label=c.get("label", ""),
+                required=bool(c.get("required")),
+                options=c.get("options"),
+                autre_option=bool(c.get("otherOption"))
+            )
+            for c in revision.get("champDescriptors", [])
+        ]
+        return cls(demarche_id, revision.get("id"), descripteurs)
+
+    @classmethod
+    def depuis_dict(cls, d):
+        descripteurs = [DescripteurChamp(**c) for c in d.get("champs", [])]
+        return cls(d["demarche_id"], d.get("revision_id"), descripteurs, d.get("date_verification"))
+
+    def en_dict(self):
+        return {
+            "demarche_id": self.demarche_id,
+            "revision_id": self.revision_id,
+            "date_verification": self.date_verification,
+            "champs": [d.en_dict() for d in self.descripteurs.values()],
+        }
+
+    def valider(self, donnees, verifier_obligatoires=False, champs_attendus=()):
+        """
+        Valide des données de pré-remplissage {champ_id: valeur}.
+
+        Args:
+            donnees (dict): Données mappées pour DS
+            verifier_obligatoires (bool): Signaler les champs obligatoires vides
+                ou manquants
+            champs_attendus (iterable): Champs que les données doivent remplir
+                (ceux du mapping) ; un champ obligatoire absent est signalé
+
+        Returns:
+            list: Messages d'erreur (liste vide si les données sont valides)
+        """
+        erreurs = []
+        for champ_id, valeur in donnees.items():
+            descripteur = self.descripteurs.get(champ_id)
+            if descripteur is None:
+                erreurs.append(f"{champ_id}: champ absent de la révision {self.revision_id}")
+                continue
+            erreur = descripteur.valider(valeur)
+            if erreur:
+                erreurs.append(f"{descripteur.label or champ_id}: {erreur}")
+            elif verifier_obligatoires and descripteur.required and valeur in (None, ""):
+                erreurs.append(f"{descripteur.label or champ_id}: champ obligatoire vide")
+        if verifier_obligatoires:
+            for champ_id in champs_attendus:
+                descripteur = self.descripteurs.get(champ_id)
+                if descripteur is not None and descripteur.required and champ_id not in donnees:
+                    erreurs.append(f"{descripteur.label or champ_id}: champ obligatoire manquant")
+        return erreurs
+
+
+def _chemin_cache(demarche_id):
+    return os.path.join(DS_CACHE_DIR, f"schema_demarche_{demarche_id}.json")
+
+
+def _lire_cache_disque(demarche_id):
+    try:
+        with open(_chemin_cache(demarche_id), encoding="utf-8") as f:
+            return SchemaDemarche.depuis_dict(json.load(f))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _ecrire_cache_disque(schema):
+    try:
+        os.makedirs(DS_CACHE_DIR, exist_ok=True)
+        chemin = _chemin_cache(schema.demarche_id)
+        temporaire = f"{chemin}.{os.getpid()}.tmp"
+        with open(temporaire, "w", encoding="utf-8") as f:
+            json.dump(schema.en_dict(), f, ensure_ascii=False)
+        os.replace(temporaire, chemin)
+    except OSError as e:
+        print(f"Impossible d'écrire le cache du schéma DS: {e}")
+
+
+def _requete_graphql(token, requete, demarche_id):
+    limiteur = obtenir_limiteur_ds()
+    limiteur.acquerir()
+    response = requests.post(
+        DS_GRAPHQL_URL,
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+        json={"query": requete, "variables": {"demarcheNumber": int(demarche_id)}},
+        timeout=30
+    )
+    limiteur.signaler_reponse(response.status_code, response.headers.get("Retry-After"))
+    response.raise_for_status()
+    contenu = response.json()
+    if contenu.get("errors"):
+        raise ValueError(f"Erreur GraphQL DS: {contenu['errors']}")
+    return contenu["data"]
+
+
+def obtenir_schema(demarche_id, token, forcer=False):
+    """
+    Renvoie le schéma de la démarche : mémoire, puis cache disque, puis API.
+    Passé DS_SCHEMA_TTL, seule la révision active est revérifiée ;
+    le schéma complet n'est rechargé que si elle a changé. L'appel à l'API
+    se fait hors du verrou, une seule fois pour les appelants simultanés ;
+    après un échec, l'API n'est pas rappelée pendant DS_SCHEMA_DELAI_ECHEC.
+
+    Args:
+        demarche_id: Numéro de la démarche
+        token (str): Token API DS (nécessaire seulement si un appel est requis)
+        forcer (bool): Recharger le schéma complet depuis l'API
+
+    Returns:
+        SchemaDemarche: Schéma, ou None s'il est indisponible
+    """
+    demarche_id = str(demarche_id)
+    with _schemas_lock:
+        schema = None if forcer else (_schemas.get(demarche_id) or _lire_cache_disque(demarche_id))
+
+        if schema is not None and time.time() - schema.date_verification < DS_SCHEMA_TTL:
+            _schemas[demarche_id] = schema
+            return schema
+
+        if not token:
+            # Pas de vérification possible : utiliser le schéma connu s'il existe
+            return schema
+
+        echec = _echecs.get(demarche_id)
+        if not forcer and echec is not None and time.time() - echec < DS_SCHEMA_DELAI_ECHEC:
+            return schema
+
+    return _chargements.executer((demarche_id, forcer), _charger_schema, demarche_id, token, schema)
+
+
+def _charger_schema(demarche_id, token, schema):
+    """Vérifie la révision active et recharge le schéma si besoin (appels à l'API)."""
+    try:
+        if schema is not None:
+            data = _requete_graphql(token, REQUETE_REVISION, demarche_id)
+            if data["demarche"]["activeRevision"]["id"] == schema.revision_id:
+                schema.date_verification = time.time()
+                _ecrire_cache_disque(schema)
+                with _schemas_lock:
+                    _schemas[demarche_id] = schema
+                    _echecs.pop(demarche_id, None)
+                return schema
+            print(f"Nouvelle révision de la démarche {demarche_id}, rechargement du schéma")
+
+        data = _requete_graphql(token, REQUETE_SCHEMA, demarche_id)
+        schema = SchemaDemarche.depuis_graphql(demarche_id, data)
+        _ecrire_cache_disque(schema)
+        with _schemas_lock:
+            _schemas[demarche_id] = schema
+            _echecs.pop(demarche_id, None)
+        return schema
+    except Exception as e:
+        print(f"Impossible de charger le schéma de la démarche {demarche_id}: {e}")
+        with _schemas_lock:
+            _echecs[demarche_id] = time.time()
+        return schema
+
+
+def definir_schema(schema):
+    """Installe un schéma en mémoire (ex: schéma local de substitution)."""
+    with _schemas_lock:
+        _schemas[schema.demarche_id] = schema
@@ -0,0 +1,169 @@
+"""
+Export des liens de pré-remplissage générés (CSV ou XLSX).
+Les lignes sont lues une à une depuis la file de traitements et écrites
+au fil de l'eau dans un fichier sur disque, sans DataFrame intermédiaire.
+Les fichiers produits sont réutilisés tant que le traitement n'a pas changé ;
+un seul fichier par traitement et par format est conservé, et il est supprimé
+avec le traitement (jobs.purger_jobs).
+"""
+
+import os
+import csv
+import glob
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+import jobs
+from modeles import ResultatLien
+
+# Charger les variables d'environnement
+load_dotenv()
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(".cache", "exports"))
+
+COLONNES_EXPORT = [
+    "Numéro dossier Moow Pro", "Nom", "Prénom", "Date de départ", "Date de retour",
+    "Pays d'accueil", "Établissement", "Type de mobilité", "Statut", "Lien pré-remplissage"
+]
+
+# Limites Excel pour les liens hypertextes
+XLSX_LIENS_MAX = 65530
+XLSX_URL_LONGUEUR_MAX = 2079
+
+TYPES_MIME = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def _date_fr(valeur):
+    """Convertit une date ISO (AAAA-MM-JJ) au format JJ/MM/AAAA."""
+    if not valeur:
+        return ""
+    try:
+        return datetime.strptime(str(valeur)[:10], "%Y-%m-%d").strftime("%d/%m/%Y")
+    except ValueError:
+        return str(valeur)
+
+
+def lignes_export(job_id):
+    """
+    Parcourt les résultats d'un traitement sous forme de lignes d'export.
+
+    Yields:
+        tuple: Valeurs dans l'ordre de COLONNES_EXPORT
+    """
+    for _, donnees, success, url in jobs.iter_resultats_job(job_id):
+        r = ResultatLien.depuis_apprenant(donnees, success, url)
+        yield (
+            r.dossier_number,
+            r.nom,
+            r.prenom,
+            _date_fr(r.date_depart),
+            _date_fr(r.date_retour),
+            r.pays_accueil,
+            r.etablissement,
+            r.type_mobilite,
+            "Lien généré" if r.succes else "Erreur de génération",
+            r.url or ""
+        )
+
+
+def ecrire_csv(lignes, chemin):
+    """
+    Écrit les lignes dans un fichier CSV (séparateur ";", UTF-8 avec BOM pour Excel).
+    """
+    with open(chemin, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(COLONNES_EXPORT)
+        for ligne in lignes:
+            writer.writerow(ligne)
+
+
+def ecrire_xlsx(lignes, chemin):
+    """
+    Écrit les lignes dans un classeur XLSX avec des liens cliquables.
+    Utilise le mode constant_memory de xlsxwriter : chaque ligne est écrite
+    sur disque dès qu'elle est complète.
+    """
+    import xlsxwriter
+
+    classeur = xlsxwriter.Workbook(chemin, {"constant_memory": True})
+    try:
+        feuille = classeur.add_worksheet("Liens")
+        entete = classeur.add_format({"bold": True, "bg_color": "#f5f5f5"})
+        feuille.write_row(0, 0, COLONNES_EXPORT, entete)
+        colonne_lien = len(COLONNES_EXPORT) - 1
+        nombre_liens = 0
+
+        for numero, ligne in enumerate(lignes, start=1):
+            feuille.write_row(numero, 0, ligne[:colonne_lien])
+            url = ligne[colonne_lien]
+            if url and nombre_liens < XLSX_LIENS_MAX and len(url) <= XLSX_URL_LONGUEUR_MAX:
+                feuille.write_url(numero, colonne_lien, url, string="Ouvrir le lien")
+                nombre_liens += 1
+            else:
+                feuille.write_string(numero, colonne_lien, url)
+    finally:
+        classeur.close()
+
+
+def _supprimer_fichier(chemin):
+    try:
+        os.remove(chemin)
+    except OSError:
+        pass
+
+
+def supprimer_exports(job_ids):
+    """Supprime les fichiers d'export des traitements donnés."""
+    for job_id in job_ids:
+        for chemin in glob.glob(os.path.join(EXPORT_DIR, f"{job_id}_*")):
+            _supprimer_fichier(chemin)
+
+
+def exporter_job(job_id, format_export="csv"):
+    """
+    Produit (ou réutilise) le fichier d'export d'un traitement.
+    Le nom du fichier inclut le nombre d'éléments terminés : un export
+    partiel est refait dès que de nouveaux liens ont été générés.
+
+    Args:
+        job_id (str): Identifiant du traitement
+        format_export (str): "csv" ou "xlsx"
+
+    Returns:
+        tuple: (success, result) où result est le chemin du fichier ou un message d'erreur
+    """
+    if format_export not in TYPES_MIME:
+        return False, f"Format d'export inconnu: {format_export}"
+
+    progression = jobs.progression(job_id)
+    if not progression:
+        return False, "Traitement introuvable."
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    chemin = os.path.join(EXPORT_DIR, f"{job_id}_{progression['termines']}.{format_export}")
+    if os.path.exists(chemin):
+        return True, chemin
+
+    temporaire = f"{chemin}.{os.getpid()}.tmp"
+    try:
+        if format_export == "csv":
+            ecrire_csv(lignes_export(job_id), temporaire)
+        else:
+            ecrire_xlsx(lignes_export(job_id), temporaire)
+        os.replace(temporaire, chemin)
+        # Remplacer l'export partiel précédent de ce traitement
+        for ancien in glob.glob(os.path.join(EXPORT_DIR, f"{job_id}_*.{format_export}")):
+            if ancien != chemin:
+                _supprimer_fichier(ancien)
+        return True, chemin
+    except ImportError:
+        return False, "Export XLSX indisponible (module xlsxwriter non installé)."
+    except Exception as e:
+        print(f"Exception lors de l'export du traitement {job_id}: {str(e)}")
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+        return False, f"Exception: {str(e)}"
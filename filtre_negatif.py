@@ -0,0 +1,112 @@
+"""
+Filtres de recherche négative (filtres de Bloom) pour les numéros de dossier
+et les noms. Construits avec les données (instantané Grist, relecture MySQL),
+ils permettent de répondre immédiatement « introuvable » à une recherche dont
+la clé est absente à coup sûr (faute de frappe), sans interroger la source.
+Un filtre ne donne jamais de faux négatif : s'il répond « peut-être »,
+la recherche est faite normalement.
+"""
+
+import math
+import time
+import hashlib
+import unicodedata
+
+# Lettres que NFKD ne décompose pas, mais que les collations insensibles aux
+# accents de MySQL (UCA) égalent à leur lettre de base ou à leur expansion
+# ("Cœur" = "Coeur")
+EQUIVALENCES = str.maketrans({
+    "œ": "oe", "æ": "ae", "ø": "o", "đ": "d", "ð": "d", "ł": "l",
+    "ħ": "h", "ŧ": "t", "ı": "i", "ŋ": "n", "þ": "th",
+})
+
+
+def normaliser_nom(nom):
+    """
+    Forme normalisée d'un nom : sans accents, ligatures, casse ni espaces
+    superflus. Elle est volontairement plus large que l'égalité de Grist ou
+    de MySQL (collation insensible à la casse et aux accents), pour ne jamais
+    exclure un nom que la source aurait trouvé.
+    """
+    if nom is None:
+        return ""
+    decompose = unicodedata.normalize("NFKD", str(nom))
+    sans_accents = "".join(c for c in decompose if not unicodedata.combining(c))
+    return " ".join(sans_accents.casefold().translate(EQUIVALENCES).split())
+
+
+def normaliser_numero(numero):
+    """Forme normalisée d'un numéro de dossier (12345.0, " 012345" et "12345" sont équivalents)."""
+    if numero is None:
+        return ""
+    if isinstance(numero, float) and numero.is_integer():
+        numero = int(numero)
+    texte = str(numero).strip()
+    return str(int(texte)) if texte.isdigit() else texte.casefold()
+
+
+class FiltreBloom:
+    """
+    Filtre de Bloom sur des chaînes.
+
+    Args:
+        capacite (int): Nombre d'éléments prévus
+        taux_faux_positifs (float): Taux de faux positifs visé
+    """
+    __slots__ = ("taille", "nb_hachages", "bits")
+
+    def __init__(self, capacite, taux_faux_positifs=0.01):
+        capacite = max(1, capacite)
+        self.taille = max(64, int(-capacite * math.log(taux_faux_positifs) / (math.log(2) ** 2)))
+        self.nb_hachages = max(1, round(self.taille / capacite * math.log(2)))
+        self.bits = bytearray((self.taille + 7) // 8)
+
+    def _positions(self, cle):
+        empreinte = hashlib.blake2b(cle.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(empreinte[:8], "little")
+        h2 = int.from_bytes(empreinte[8:], "little") | 1
+        return [(h1 + i * h2) % self.taille for i in range(self.nb_hachages)]
+
+    def ajouter(self, cle):
+        for position in self._positions(cle):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, cle):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(cle))
+
+
+class FiltresNegatifs:
+    """
+    Filtres des numéros de dossier et des noms connus à un instant donné.
+
+    Args:
+        numeros (iterable): Numéros de dossier de la table
+        noms (iterable): Noms de la table
+        taux_faux_positifs (float): Taux de faux positifs visé
+        version: Version de la source au moment de la lecture (optionnel)
+    """
+
+    def __init__(self, numeros, noms, taux_faux_positifs=0.01, version=None):
+        numeros = {normaliser_numero(n) for n in numeros if n not in (None, "")}
+        noms = {normaliser_nom(n) for n in noms if n}
+        self.numeros = FiltreBloom(len(numeros), taux_faux_positifs)
+        for numero in numeros:
+            self.numeros.ajouter(numero)
+        self.noms = FiltreBloom(len(noms), taux_faux_positifs)
+        for nom in noms:
+            self.noms.ajouter(nom)
+        self.date_construction = time.time()
+        self.version = version
+
+    def numero_absent(self, numero):
+        """True si le numéro est absent à coup sûr de la table."""
+        return normaliser_numero(numero) not in self.numeros
+
+    def nom_absent(self, nom):
+        """
+        True si le nom est absent à coup sûr de la table. Un nom qui garde des
+        lettres non ASCII après normalisation n'est jamais déclaré absent : la
+        collation de la source peut l'égaler à une autre écriture.
+        """
+        cle = normaliser_nom(nom)
+        return cle.isascii() and cle not in self.noms
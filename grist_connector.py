@@ -11,6 +11,15 @@ from dotenv import load_dotenv
 from datetime import datetime
 import json
 import urllib.parse
+import time
+import threading
+
+import ds_mapping
+import grist_snapshot
+from cache import obtenir_cache
+from coalescence import GroupeAppels, RegroupeurLots
+from filtre_negatif import FiltresNegatifs
+from modeles import Dossier, DossierResume
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -38,6 +47,38 @@ COL_STATUT_PARTICIPANT = "statut_des_participants_de_la_mobilite"
 COL_DATE_DEPOT = "ref_dossiers_date_depot"
 COL_EPLEFPA = "votre_etablissement"
 
+# Colonnes sources des attributs de modeles.Dossier (dans l'ordre de Dossier.CHAMPS)
+COLONNES_DOSSIER = (
+    COL_ID, COL_DOSSIER_NUMBER, COL_CIVILITE, COL_NOM, COL_PRENOM, COL_DATE_NAISSANCE,
+    COL_FORMAT_MOBILITE, COL_MOBILITE_APPRENANT, COL_DATE_DEPART, COL_DATE_RETOUR,
+    COL_PAYS_ACCUEIL, COL_STATUT_PARTICIPANT, COL_EPLEFPA, COL_DATE_DEPOT
+)
+
+# Dossiers complets conservés dans le cache partagé (voir cache.py), indexés
+# par ID Grist. Les sessions ne conservent que des résumés (DossierResume) et
+# résolvent l'enregistrement complet à la sélection via obtenir_dossier_par_id.
+CACHE_TTL_DOSSIERS = int(os.getenv("CACHE_TTL_DOSSIERS", "3600"))
+CACHE_TTL_ETABLISSEMENTS = int(os.getenv("CACHE_TTL_ETABLISSEMENTS", "300"))
+ESPACE_DOSSIERS = "grist_dossiers"
+ESPACE_ETABLISSEMENTS = "grist_etablissements"
+
+# Instantané colonnaire de la table (voir grist_snapshot) : délai (secondes)
+# avant de revérifier en arrière-plan la version du document Grist
+GRIST_SNAPSHOT_TTL = int(os.getenv("GRIST_SNAPSHOT_TTL", "60"))
+_instantane = None
+_instantane_lock = threading.Lock()
+_verification_en_cours = False
+# Filtres de recherche négative, construits depuis l'instantané (voir filtre_negatif)
+_filtres = None
+_filtres_lock = threading.Lock()
+
+# Lectures Grist identiques en cours, partagées entre les sessions
+_appels_grist = GroupeAppels()
+
+# Recherches par numéro de dossier regroupées en un seul filtre multi-valeurs
+GRIST_LOT_DELAI_MS = float(os.getenv("GRIST_LOT_DELAI_MS", "5"))
+GRIST_LOT_TAILLE = int(os.getenv("GRIST_LOT_TAILLE", "100"))
+
 class GristClient:
     def __init__(self, api_key, doc_id, table_id, server="https://grist.numerique.gouv.fr"):
         """
@@ -53,12 +94,38 @@ class GristClient:
         self.doc_id = doc_id
         self.table_id = table_id
         self.server = server.rstrip('/')
-        self.base_url = f"{self.server}/api/docs/{self.doc_id}/tables/{self.table_id}/records"
+        self.doc_url = f"{self.server}/api/docs/{self.doc_id}"
+        self.base_url = f"{self.doc_url}/tables/{self.table_id}/records"
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
 
+    @staticmethod
+    def _parametres_filtre(filter_dict):
+        params = {}
+        if filter_dict:
+            # Grist utilise un format JSON pour le paramètre 'filter'
+            # Exemple: ?filter={"nom": ["Dupont"]}
+            # Note: Grist attend une liste de valeurs pour chaque colonne dans le filtre ;
+            # une liste passée en valeur filtre sur plusieurs valeurs à la fois
+            grist_filter = {k: list(v) if isinstance(v, (list, tuple, set)) else [v] for k, v in filter_dict.items()}
+            params["filter"] = json.dumps(grist_filter, sort_keys=True, default=str)
+        return params
+
+    def _get_json(self, url, params=None):
+        """
+        GET sur l'API Grist. Les requêtes identiques (même URL, mêmes filtres)
+        lancées pendant qu'une autre est en cours partagent sa réponse.
+        """
+        def telecharger():
+            response = requests.get(url, headers=self.headers, params=params, timeout=60)
+            response.raise_for_status()
+            return response.json()
+        
+        cle = (self.api_key, url, tuple(sorted((params or {}).items())))
+        return _appels_grist.executer(cle, telecharger)
+
     def get_records(self, filter_dict=None):
         """
         Récupère les enregistrements de la table Grist, avec filtrage optionnel.
@@ -70,20 +137,7 @@ class GristClient:
             list: Liste des enregistrements
         """
         try:
-            url = self.base_url
-            params = {}
-            
-            if filter_dict:
-                # Grist utilise un format JSON pour le paramètre 'filter'
-                # Exemple: ?filter={"nom": ["Dupont"]}
-                # Note: Grist attend une liste de valeurs pour chaque colonne dans le filtre
-                grist_filter = {k: [v] for k, v in filter_dict.items()}
-                params["filter"] = json.dumps(grist_filter)
-            
-            response = requests.get(url, headers=self.headers, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = self._get_json(self.base_url, self._parametres_filtre(filter_dict))
             return data.get("records", [])
             
         except requests.exceptions.RequestException as e:
@@ -92,6 +146,118 @@ class GristClient:
                 print(f"Détails: {e.response.text}")
             return None
 
+    def get_columns(self, filter_dict=None, colonnes=None):
+        """
+        Récupère les enregistrements au format colonnaire : chaque colonne est
+        une liste de valeurs, sans dictionnaire par ligne. La table est lue
+        page par page (iter_records) et seules les colonnes demandées sont
+        transférées ; les lectures identiques simultanées sont partagées.
+        
+        Args:
+            filter_dict: Dictionnaire de filtres {colonne: valeur ou liste de valeurs}
+            colonnes: Colonnes à lire (toutes par défaut, "id" toujours incluse)
+            
+        Returns:
+            dict: {colonne: [valeurs]}, ou None en cas d'erreur
+        """
+        def lire():
+            data = {COL_ID: []}
+            if colonnes is not None:
+                data.update((c, []) for c in colonnes)
+            for nombre, record in enumerate(self.iter_records(filter_dict, colonnes=colonnes)):
+                data[COL_ID].append(record["id"])
+                for colonne, valeur in record["fields"].items():
+                    # Colonne absente des lignes précédentes (lecture de toutes les colonnes)
+                    data.setdefault(colonne, [None] * nombre).append(valeur)
+            return data
+        
+        try:
+            cle = (self.api_key, self.doc_url, self.table_id, "colonnes",
+                   json.dumps(filter_dict or {}, sort_keys=True, default=str),
+                   tuple(colonnes) if colonnes is not None else None)
+            return _appels_grist.executer(cle, lire)
+            
+        except requests.exceptions.RequestException as e:
+            print(f"Erreur lors de la requête Grist: {e}")
+            if hasattr(e, 'response') and e.response:
+                print(f"Détails: {e.response.text}")
+            return None
+
+    def iter_records(self, filter_dict=None, taille_page=500, colonnes=None):
+        """
+        Parcourt les enregistrements page par page, par ID croissant.
+        La pagination se fait par clé sur l'ID (endpoint /sql de Grist,
+        "id > dernier ID lu ... LIMIT taille_page") : chaque page est rendue
+        dès sa réception, le parcours peut s'arrêter tôt et la mémoire
+        reste bornée à une page.
+        
+        Args:
+            filter_dict: Dictionnaire de filtres {colonne: valeur ou liste de valeurs}
+            taille_page: Nombre d'enregistrements par requête
+            colonnes: Colonnes à lire (toutes par défaut)
+            
+        Yields:
+            dict: Enregistrement {"id": ..., "fields": {...}}, comme get_records
+            
+        Raises:
+            requests.exceptions.RequestException: En cas d'erreur Grist (le
+                parcours ne s'arrête pas silencieusement sur une page manquante)
+        """
+        selection = ", ".join(['"id"'] + [f'"{c}"' for c in colonnes if c != COL_ID]) if colonnes else "*"
+        conditions = ['"id" > ?']
+        valeurs_filtre = []
+        for colonne, valeur in (filter_dict or {}).items():
+            if isinstance(valeur, (list, tuple, set)):
+                valeur = list(valeur)
+                conditions.append(f'"{colonne}" IN ({", ".join("?" * len(valeur))})')
+                valeurs_filtre.extend(valeur)
+            else:
+                conditions.append(f'"{colonne}" = ?')
+                valeurs_filtre.append(valeur)
+        sql = (f'SELECT {selection} FROM "{self.table_id}" '
+               f'WHERE {" AND ".join(conditions)} ORDER BY "id" LIMIT ?')
+        
+        dernier_id = 0
+        while True:
+            try:
+                response = requests.post(
+                    f"{self.doc_url}/sql",
+                    headers=self.headers,
+                    json={"sql": sql, "args": [dernier_id] + valeurs_filtre + [taille_page]},
+                    timeout=60
+                )
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                print(f"Erreur lors de la requête Grist (page après l'ID {dernier_id}): {e}")
+                raise
+            
+            lignes = response.json().get("records", [])
+            for ligne in lignes:
+                fields = ligne.get("fields", {})
+                dernier_id = fields.pop(COL_ID)
+                # Colonnes internes de Grist, absentes de l'endpoint /records
+                fields.pop("manualSort", None)
+                for cle in [c for c in fields if c.startswith("gristHelper_")]:
+                    del fields[cle]
+                yield {"id": dernier_id, "fields": fields}
+            
+            if len(lignes) < taille_page:
+                return
+
+    def get_version(self):
+        """
+        Récupère la version courante du document (dernière action Grist).
+        
+        Returns:
+            str: Version "numéro:hash", ou None si elle n'a pas pu être lue
+        """
+        try:
+            etats = self._get_json(f"{self.doc_url}/states").get("states", [])
+            return f"{etats[0]['n']}:{etats[0]['h']}" if etats else None
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            print(f"Impossible de lire la version du document Grist: {e}")
+            return None
+
 # Fonctions d'interface pour notre application
 def get_grist_client():
     """
@@ -107,6 +273,226 @@ def get_grist_client():
         GRIST_SERVER
     )
 
+def dossier_depuis_record(record):
+    """Construit un modeles.Dossier à partir d'un enregistrement Grist."""
+    return Dossier.depuis_grist(record, COLONNES_DOSSIER)
+
+def _memoriser_dossier(dossier):
+    """Ajoute un dossier complet au cache partagé."""
+    if dossier.id is None:
+        return
+    obtenir_cache().set(ESPACE_DOSSIERS, dossier.id, dossier, ttl=CACHE_TTL_DOSSIERS)
+
+def _resumer_record(record):
+    """
+    Construit le résumé compact d'un enregistrement Grist et mémorise
+    le dossier complet dans le cache partagé.
+    """
+    dossier = dossier_depuis_record(record)
+    _memoriser_dossier(dossier)
+    return DossierResume.depuis_dossier(dossier)
+
+def obtenir_dossier_par_id(record_id):
+    """
+    Résout le dossier complet à partir de son ID Grist.
+    Utilise le cache partagé, puis Grist si le dossier en a été évincé.
+    
+    Args:
+        record_id: ID interne Grist
+        
+    Returns:
+        tuple: (success, result) où result est un Dossier ou un message d'erreur
+    """
+    dossier = obtenir_cache().get(ESPACE_DOSSIERS, record_id)
+    
+    if dossier is None:
+        try:
+            records = get_grist_client().get_records({COL_ID: record_id})
+        except Exception as e:
+            print(f"Exception lors de la récupération du dossier {record_id}: {str(e)}")
+            return False, f"Exception: {str(e)}"
+        if not records:
+            return False, "Dossier introuvable."
+        dossier = dossier_depuis_record(records[0])
+        _memoriser_dossier(dossier)
+    
+    return True, dossier
+
+def _chemin_instantane():
+    return os.path.join(grist_snapshot.SNAPSHOT_DIR, f"grist_{GRIST_DOC_ID}_{GRIST_TABLE_ID}.arrow")
+
+def rafraichir_instantane(client=None):
+    """
+    Recharge toute la table depuis Grist et réécrit l'instantané sur disque.
+    La version est lue avant les données : une modification concurrente
+    rend l'instantané périmé plutôt que de passer inaperçue.
+    
+    Returns:
+        InstantaneGrist: Nouvel instantané, ou None en cas d'échec
+    """
+    global _instantane
+    client = client or get_grist_client()
+    ancienne_version = _instantane.version if _instantane is not None else None
+    version = client.get_version()
+    donnees = client.get_columns(colonnes=COLONNES_DOSSIER)
+    if donnees is None:
+        return None
+    
+    chemin = _chemin_instantane()
+    instantane = None
+    if grist_snapshot.ecrire(chemin, donnees, version):
+        instantane = grist_snapshot.charger(chemin)
+    if instantane is None:
+        # Écriture impossible : garder la table téléchargée en mémoire
+        instantane = grist_snapshot.en_memoire(donnees, version)
+    if instantane is not None:
+        with _instantane_lock:
+            _instantane = instantane
+    if ancienne_version is not None and version != ancienne_version:
+        # Le document a changé : invalider les données dérivées pour tous les processus
+        cache_partage = obtenir_cache()
+        cache_partage.invalider(ESPACE_DOSSIERS)
+        cache_partage.invalider(ESPACE_ETABLISSEMENTS)
+    print(f"Instantané Grist chargé ({len(donnees.get(COL_ID, []))} enregistrements, version {version})")
+    return instantane
+
+def _verifier_instantane(instantane):
+    """Vérifie la version d'un instantané (thread de fond) et le rafraîchit s'il est périmé."""
+    global _verification_en_cours
+    try:
+        client = get_grist_client()
+        version = client.get_version()
+        if version is not None and version == instantane.version:
+            try:
+                os.utime(_chemin_instantane())
+            except OSError:
+                pass  # Instantané gardé en mémoire seulement
+            instantane.date_verification = time.time()
+        else:
+            rafraichir_instantane(client)
+    except Exception as e:
+        print(f"Exception lors de la vérification de l'instantané Grist: {str(e)}")
+    finally:
+        with _instantane_lock:
+            _verification_en_cours = False
+
+def obtenir_instantane():
+    """
+    Renvoie l'instantané colonnaire de la table.
+    Le fichier est projeté en mémoire s'il existe (ou s'il a été réécrit par
+    un autre processus), sinon construit depuis Grist. Un instantané dont la
+    version n'a pas été vérifiée depuis GRIST_SNAPSHOT_TTL reste servi pendant
+    qu'un thread de fond le vérifie et le rafraîchit si nécessaire.
+    
+    Returns:
+        InstantaneGrist: Instantané, ou None si pyarrow est absent ou Grist indisponible
+    """
+    global _instantane, _verification_en_cours
+    if not grist_snapshot.disponible():
+        return None
+    
+    chemin = _chemin_instantane()
+    with _instantane_lock:
+        instantane = _instantane
+        try:
+            date_fichier = os.path.getmtime(chemin)
+        except OSError:
+            date_fichier = None
+        if date_fichier is not None and (instantane is None or date_fichier > instantane.date_verification):
+            instantane = grist_snapshot.charger(chemin) or instantane
+            _instantane = instantane
+    
+    if instantane is None:
+        return rafraichir_instantane()
+    
+    with _instantane_lock:
+        lancer = not _verification_en_cours and time.time() - instantane.date_verification > GRIST_SNAPSHOT_TTL
+        if lancer:
+            _verification_en_cours = True
+    if lancer:
+        threading.Thread(target=_verifier_instantane, args=(instantane,), daemon=True).start()
+    return instantane
+
+def _filtres_negatifs():
+    """
+    Filtres des numéros et noms connus, construits une fois par instantané.
+    Aucun téléchargement n'est déclenché ici ; le filtre n'est utilisé que si
+    l'instantané a été vérifié depuis moins de GRIST_SNAPSHOT_TTL.
+    
+    Returns:
+        FiltresNegatifs: Filtres, ou None s'il faut interroger Grist
+    """
+    global _filtres
+    if _instantane is None:
+        return None
+    instantane = obtenir_instantane()
+    if instantane is None or time.time() - instantane.date_verification > GRIST_SNAPSHOT_TTL:
+        return None
+    with _filtres_lock:
+        if _filtres is None or _filtres[0] is not instantane:
+            _filtres = (instantane, FiltresNegatifs(instantane.colonne(COL_DOSSIER_NUMBER), instantane.colonne(COL_NOM)))
+        return _filtres[1]
+
+def _cle_numero(numero):
+    """Forme normalisée d'un numéro de dossier (texte ; 12345.0 et 12345 sont équivalents)."""
+    if isinstance(numero, float) and numero.is_integer():
+        numero = int(numero)
+    return str(numero).strip()
+
+def _records_par_numeros(numeros):
+    """
+    Récupère en un seul appel les enregistrements de plusieurs numéros de dossier.
+    
+    Args:
+        numeros (list): Numéros normalisés (_cle_numero)
+        
+    Returns:
+        dict: {numéro: [enregistrements]} pour les numéros trouvés
+    """
+    records = get_grist_client().get_records({COL_DOSSIER_NUMBER: numeros}) or []
+    par_numero = {}
+    for record in records:
+        cle = _cle_numero(record.get("fields", {}).get(COL_DOSSIER_NUMBER))
+        par_numero.setdefault(cle, []).append(record)
+    return par_numero
+
+_lots_numeros = RegroupeurLots(_records_par_numeros, delai=GRIST_LOT_DELAI_MS / 1000, taille_max=GRIST_LOT_TAILLE)
+
+def records_par_numero(numero_dossier):
+    """
+    Enregistrements Grist d'un numéro de dossier. Les recherches simultanées
+    de plusieurs sessions sont regroupées en un seul appel Grist ; un numéro
+    absent à coup sûr (filtre négatif) est résolu sans appel.
+    """
+    filtres = _filtres_negatifs()
+    if filtres is not None and filtres.numero_absent(numero_dossier):
+        print(f"Numéro {numero_dossier} absent (filtre négatif)")
+        return []
+    return _lots_numeros.obtenir(_cle_numero(numero_dossier), [])
+
+def rechercher_dossiers_par_numeros(numeros):
+    """
+    Résout une liste de numéros de dossier en un appel Grist par lot
+    de GRIST_LOT_TAILLE numéros (import de masse).
+    
+    Args:
+        numeros (list): Numéros de dossier
+        
+    Returns:
+        dict: {numéro: Dossier, {"multiple": True, "dossiers": [...]} ou None}
+    """
+    trouves = _lots_numeros.obtenir_plusieurs([_cle_numero(n) for n in numeros])
+    resultats = {}
+    for numero in numeros:
+        records = trouves.get(_cle_numero(numero))
+        if not records:
+            resultats[numero] = None
+        elif len(records) > 1:
+            resultats[numero] = {"multiple": True, "dossiers": [_resumer_record(r) for r in records]}
+        else:
+            resultats[numero] = dossier_depuis_record(records[0])
+    return resultats
+
 # Fonctions de transformation des données ERASMIP
 def transformer_date(date_val):
     """Transforme une date au format ISO8601"""
@@ -161,20 +547,13 @@ def rechercher_dossier_par_nom_et_numero(nom, numero_dossier):
     """
     try:
         print(f"Recherche de dossier avec nom: {nom} et numéro: {numero_dossier}")
-        client = get_grist_client()
-        
-        # Filtre pour Grist
-        filters = {
-            COL_NOM: nom,
-            COL_DOSSIER_NUMBER: numero_dossier
-        }
         
-        records = client.get_records(filters)
+        # Enregistrements du numéro (recherche regroupée), puis filtre sur le nom :
+        # le même appel sert au retour précis si le nom ne correspond pas
+        records_num = records_par_numero(numero_dossier)
+        records = [r for r in records_num if r.get("fields", {}).get(COL_NOM) == nom]
         
         if not records:
-            # Essayer de filtrer seulement par numéro de dossier pour donner un feedback précis
-            records_num = client.get_records({COL_DOSSIER_NUMBER: numero_dossier})
-            
             if records_num:
                 print(f"Trouvé dossier par numéro, mais le nom ne correspond pas.")
                 return False, "Le numéro de dossier existe, mais le nom ne correspond pas."
@@ -183,17 +562,9 @@ def rechercher_dossier_par_nom_et_numero(nom, numero_dossier):
                 return False, "Aucun dossier trouvé avec ce numéro."
         
         # Prendre le premier dossier correspondant
-        record = records[0]
-        dossier = record.get("fields", {})
-        dossier[COL_ID] = record.get("id") # Ajouter l'ID Grist
-        
-        # Formater le résultat
-        result = {
-            "id": dossier.get(COL_ID),
-            "fields": dossier
-        }
+        result = dossier_depuis_record(records[0])
         
-        print(f"Dossier trouvé avec ID: {result['id']}")
+        print(f"Dossier trouvé avec ID: {result.id}")
         return True, result
     
     except Exception as e:
@@ -207,6 +578,10 @@ def obtenir_etablissements_par_nom(nom):
     Récupère la liste des établissements associés à un nom d'apprenant donné.
     """
     try:
+        filtres = _filtres_negatifs()
+        if filtres is not None and filtres.nom_absent(nom):
+            return False, "Aucun établissement trouvé pour ce nom d'apprenant."
+        
         client = get_grist_client()
         
         # Filtre par nom
@@ -236,23 +611,33 @@ def obtenir_liste_etablissements():
     Récupère la liste complète des établissements disponibles.
     """
     try:
+        cache_partage = obtenir_cache()
+        etablissements = cache_partage.get(ESPACE_ETABLISSEMENTS, "liste")
+        if etablissements is not None:
+            return True, etablissements
+        
+        instantane = obtenir_instantane()
+        if instantane is not None:
+            etablissements = instantane.valeurs_distinctes(COL_EPLEFPA)
+            if not etablissements:
+                return False, "Aucun établissement trouvé dans la base de données."
+            etablissements = sorted(etablissements)
+            cache_partage.set(ESPACE_ETABLISSEMENTS, "liste", etablissements, ttl=CACHE_TTL_ETABLISSEMENTS)
+            return True, etablissements
+        
         client = get_grist_client()
         
-        # Récupérer tous les enregistrements (sans filtre)
-        records = client.get_records()
+        # Récupérer la colonne des établissements de toute la table (format colonnaire)
+        donnees = client.get_columns(colonnes=[COL_EPLEFPA])
         
-        if not records:
+        if not donnees or not donnees.get(COL_EPLEFPA):
             return False, "Aucun établissement trouvé dans la base de données."
         
         # Extraire la liste des établissements uniques
-        etablissements = set()
-        for record in records:
-            fields = record.get("fields", {})
-            etab = fields.get(COL_EPLEFPA)
-            if etab:
-                etablissements.add(etab)
+        etablissements = sorted({etab for etab in donnees[COL_EPLEFPA] if etab})
+        cache_partage.set(ESPACE_ETABLISSEMENTS, "liste", etablissements, ttl=CACHE_TTL_ETABLISSEMENTS)
         
-        return True, sorted(list(etablissements))
+        return True, etablissements
     
     except Exception as e:
         print(f"Exception lors de la récupération des établissements: {str(e)}")
@@ -264,6 +649,11 @@ def rechercher_dossier_par_nom_et_etablissement(nom, etablissement, numero_dossi
     """
     try:
         print(f"Recherche de dossier avec nom: {nom}, établissement: {etablissement}, numéro: {numero_dossier or 'Non fourni'}")
+        
+        filtres = _filtres_negatifs()
+        if filtres is not None and (filtres.nom_absent(nom) or (numero_dossier and filtres.numero_absent(numero_dossier))):
+            return False, "Aucun dossier trouvé avec ces critères."
+        
         client = get_grist_client()
         
         # Construire le filtre
@@ -282,34 +672,13 @@ def rechercher_dossier_par_nom_et_etablissement(nom, etablissement, numero_dossi
         
         # Si plusieurs résultats
         if len(records) > 1:
-            dossiers = []
-            for record in records:
-                fields = record.get("fields", {})
-                dossier_info = {
-                    "id": record.get("id"),
-                    "numero": fields.get(COL_DOSSIER_NUMBER),
-                    "nom": fields.get(COL_NOM),
-                    "prenom": fields.get(COL_PRENOM),
-                    "etablissement": fields.get(COL_EPLEFPA),
-                    "date_depot": fields.get(COL_DATE_DEPOT),
-                    "fields": fields
-                }
-                dossiers.append(dossier_info)
+            dossiers = [_resumer_record(record) for record in records]
             
             print(f"Plusieurs dossiers trouvés ({len(dossiers)}) pour ces critères.")
             return True, {"multiple": True, "dossiers": dossiers}
         
         # Dossier unique
-        record = records[0]
-        dossier = record.get("fields", {})
-        dossier[COL_ID] = record.get("id")
-        
-        result = {
-            "id": dossier.get(COL_ID),
-            "fields": dossier
-        }
-        
-        return True, result
+        return True, dossier_depuis_record(records[0])
     
     except Exception as e:
         print(f"Exception lors de la recherche du dossier: {str(e)}")
@@ -328,32 +697,38 @@ def rechercher_apprenants_par_date_et_etablissement(date_depart, etablissement=N
             return False, "Format de date non valide"
         
         print(f"Recherche d'apprenants avec date de départ: {date_depart_iso}" + (f" et établissement: {etablissement}" if etablissement else ""))
-        client = get_grist_client()
         
         # Construire les filtres
         filters = {}
         if etablissement:
             filters[COL_EPLEFPA] = etablissement
         
-        records = client.get_records(filters) if filters else client.get_records()
+        instantane = obtenir_instantane()
+        if instantane is not None:
+            # Seule la colonne des dates est lue pour toutes les lignes ;
+            # les dossiers ne sont construits que pour les lignes retenues
+            indices = instantane.indices(filters)
+            if not indices:
+                return False, "Aucun apprenant trouvé." if not etablissement else "Aucun apprenant trouvé pour cet établissement."
+            dates = instantane.colonne(COL_DATE_DEPART, indices)
+            retenus = [i for i, d in zip(indices, dates) if transformer_date(d) == date_depart_iso]
+            dossiers = instantane.dossiers(COLONNES_DOSSIER, retenus)
+        else:
+            # Parcours page par page : seules les lignes retenues sont conservées,
+            # la date étant vérifiée avant de construire le dossier
+            dossiers = [
+                dossier_depuis_record(record)
+                for record in get_grist_client().iter_records(filters, colonnes=COLONNES_DOSSIER)
+                if transformer_date(record["fields"].get(COL_DATE_DEPART)) == date_depart_iso
+            ]
         
-        if not records:
-            return False, "Aucun apprenant trouvé." if not etablissement else "Aucun apprenant trouvé pour cet établissement."
-            
         apprenants = []
-        for record in records:
-            fields = record.get("fields", {})
-            
-            # Vérifier la date
-            record_date = fields.get(COL_DATE_DEPART)
-            record_date_iso = transformer_date(record_date)
-            
-            if record_date_iso == date_depart_iso:
-                # Mapper les données
-                mapped_data = mapper_donnees_mobilite(fields)
-                mapped_data["id"] = record.get("id")
-                mapped_data["dossier_number"] = fields.get(COL_DOSSIER_NUMBER)
-                apprenants.append(mapped_data)
+        for dossier in dossiers:
+            # Mapper les données
+            mapped_data = mapper_donnees_mobilite(dossier)
+            mapped_data["id"] = dossier.id
+            mapped_data["dossier_number"] = dossier.dossier_number
+            apprenants.append(mapped_data)
         
         if not apprenants:
              return False, "Aucun apprenant trouvé pour cette date" + (" et cet établissement." if etablissement else ".")
@@ -365,22 +740,25 @@ def rechercher_apprenants_par_date_et_etablissement(date_depart, etablissement=N
         print(f"Exception lors de la recherche des apprenants: {str(e)}")
         return False, f"Exception: {str(e)}"
 
-def mapper_donnees_mobilite(dossier_fields):
+def mapper_donnees_mobilite(dossier):
     """
     Mappe les données d'un apprenant pour l'API selon le script ERASMIP.
+    
+    Args:
+        dossier (Dossier): Dossier apprenant
     """
     # Extraction des données brutes
-    civilite = dossier_fields.get(COL_CIVILITE, "")
-    nom = dossier_fields.get(COL_NOM, "")
-    prenom = dossier_fields.get(COL_PRENOM, "")
-    date_naissance = transformer_date(dossier_fields.get(COL_DATE_NAISSANCE))
-    format_mobilite = dossier_fields.get(COL_FORMAT_MOBILITE, "")
-    mobilite_apprenant = dossier_fields.get(COL_MOBILITE_APPRENANT, "")
-    date_depart = transformer_date(dossier_fields.get(COL_DATE_DEPART))
-    date_retour = transformer_date(dossier_fields.get(COL_DATE_RETOUR))
-    pays_accueil = dossier_fields.get(COL_PAYS_ACCUEIL, "")
-    statut_participant = dossier_fields.get(COL_STATUT_PARTICIPANT, "")
-    etablissement = dossier_fields.get(COL_EPLEFPA, "")
+    civilite = dossier.civilite
+    nom = dossier.nom
+    prenom = dossier.prenom
+    date_naissance = transformer_date(dossier.date_naissance)
+    format_mobilite = dossier.format_mobilite
+    mobilite_apprenant = dossier.mobilite_apprenant
+    date_depart = transformer_date(dossier.date_depart)
+    date_retour = transformer_date(dossier.date_retour)
+    pays_accueil = dossier.pays_accueil
+    statut_participant = dossier.statut_participant
+    etablissement = dossier.etablissement
     
     # Définir le statut de la mobilité hybride
     mobilite_hybride = "Oui" if format_mobilite == "Mobilité hybride" else "Non"
@@ -402,7 +780,7 @@ def mapper_donnees_mobilite(dossier_fields):
         valeur_mobilite_apprenant = 'Mobilité d\'apprentissage de courte durée'
     
     # Déterminer si l'apprenant est apprenti
-    est_apprenti = "true" if statut_participant and str(statut_participant).lower() == "apprenti" else "false"
+    est_apprenti = ds_mapping.est_apprenti(statut_participant)
     
     # Construction du dictionnaire de résultats
     data_mappee = {
@@ -436,42 +814,18 @@ def rechercher_dossier_par_numero(numero_dossier):
     """
     try:
         print(f"Recherche de dossier avec numéro: {numero_dossier}")
-        client = get_grist_client()
-        
-        filters = {COL_DOSSIER_NUMBER: numero_dossier}
-        records = client.get_records(filters)
+        records = records_par_numero(numero_dossier)
         
         if not records:
             return False, "Aucun dossier trouvé avec ce numéro."
         
         if len(records) > 1:
             # Plusieurs dossiers avec le même numéro (ne devrait pas arriver)
-            dossiers = []
-            for record in records:
-                fields = record.get("fields", {})
-                dossier_info = {
-                    "id": record.get("id"),
-                    "numero": fields.get(COL_DOSSIER_NUMBER),
-                    "nom": fields.get(COL_NOM),
-                    "prenom": fields.get(COL_PRENOM),
-                    "etablissement": fields.get(COL_EPLEFPA),
-                    "date_depart": fields.get(COL_DATE_DEPART),
-                    "fields": fields
-                }
-                dossiers.append(dossier_info)
+            dossiers = [_resumer_record(record) for record in records]
             return True, {"multiple": True, "dossiers": dossiers}
         
         # Dossier unique
-        record = records[0]
-        dossier = record.get("fields", {})
-        dossier[COL_ID] = record.get("id")
-        
-        result = {
-            "id": dossier.get(COL_ID),
-            "fields": dossier
-        }
-        
-        return True, result
+        return True, dossier_depuis_record(records[0])
     
     except Exception as e:
         print(f"Exception lors de la recherche du dossier: {str(e)}")
@@ -494,11 +848,8 @@ def valider_combinaison_nom_etablissement(nom, etablissement, numero_dossier=Non
     if isinstance(result_dossier, dict) and result_dossier.get("multiple", False):
         return True, result_dossier
     
-    # Extraire les champs du dossier
-    dossier_fields = result_dossier.get("fields", {})
-    
     # Ajouter l'établissement aux données mappées
-    mapped_data = mapper_donnees_mobilite(dossier_fields)
+    mapped_data = mapper_donnees_mobilite(result_dossier)
     mapped_data["etablissement"] = etablissement
     
     return True, mapped_data
@@ -0,0 +1,191 @@
+"""
+Instantané colonnaire de la table Grist sur disque (format Arrow IPC).
+Après chaque chargement complet de la table, les colonnes utiles sont écrites
+dans un fichier Arrow ; les processus suivants l'ouvrent par projection mémoire
+(mmap) : le démarrage est quasi instantané et les workers d'une même machine
+partagent les mêmes pages physiques. L'instantané porte la version du document
+Grist, ce qui permet au connecteur de détecter qu'il est périmé.
+"""
+
+import os
+import time
+
+from dotenv import load_dotenv
+
+from modeles import Dossier
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    # pyarrow est optionnel : sans lui, le connecteur interroge Grist directement
+    pa = None
+    pc = None
+
+# Charger les variables d'environnement
+load_dotenv()
+
+SNAPSHOT_DIR = os.getenv("GRIST_SNAPSHOT_DIR", ".cache")
+
+
+def disponible():
+    """Indique si les instantanés peuvent être utilisés (pyarrow installé)."""
+    return pa is not None
+
+
+class InstantaneGrist:
+    """
+    Table Grist projetée en mémoire depuis le fichier Arrow.
+    Les colonnes ne sont converties en objets Python qu'à la demande,
+    et seulement pour les lignes retenues.
+
+    Args:
+        table (pyarrow.Table): Table lue par mmap
+        version (str): Version du document Grist au moment de l'écriture
+        date_verification (float): Date de la dernière vérification de la version
+    """
+
+    def __init__(self, table, version, date_verification):
+        self.table = table
+        self.version = version
+        self.date_verification = date_verification
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def valeurs_distinctes(self, colonne):
+        """Valeurs distinctes non vides d'une colonne (non triées)."""
+        if colonne not in self.table.column_names:
+            return []
+        return [v for v in pc.unique(self.table[colonne]).to_pylist() if v]
+
+    def indices(self, filtres=None):
+        """
+        Positions des lignes dont les colonnes sont égales aux valeurs données.
+
+        Args:
+            filtres (dict, optional): {colonne: valeur}
+
+        Returns:
+            list: Positions des lignes retenues (toutes si pas de filtre)
+        """
+        if not filtres:
+            return list(range(self.table.num_rows))
+        masque = None
+        for colonne, valeur in filtres.items():
+            if colonne not in self.table.column_names:
+                return []
+            try:
+                egal = pc.fill_null(pc.equal(self.table[colonne], valeur), False)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+                # Types incompatibles (ex: colonne texte, valeur entière) : comparaison Python
+                egal = pa.array([v == valeur for v in self.table[colonne].to_pylist()], pa.bool_())
+            masque = egal if masque is None else pc.and_(masque, egal)
+        return [i for i, retenu in enumerate(masque.to_pylist()) if retenu]
+
+    def colonne(self, nom, indices=None):
+        """Valeurs Python d'une colonne, éventuellement restreinte à des positions."""
+        taille = self.table.num_rows if indices is None else len(indices)
+        if nom not in self.table.column_names:
+            return [None] * taille
+        valeurs = self.table[nom]
+        if indices is not None:
+            valeurs = valeurs.take(pa.array(indices, pa.int64()))
+        return valeurs.to_pylist()
+
+    def dossiers(self, colonnes, indices=None):
+        """
+        Construit les Dossier des lignes données.
+
+        Args:
+            colonnes (tuple): Colonnes sources dans l'ordre de Dossier.CHAMPS
+            indices (list, optional): Positions des lignes (toutes par défaut)
+
+        Returns:
+            list: Liste de Dossier
+        """
+        if indices is not None and not indices:
+            return []
+        donnees = {c: self.colonne(c, indices) for c in colonnes}
+        return Dossier.depuis_colonnes(donnees, colonnes)
+
+
+def _tableau(valeurs):
+    """Colonne Arrow typée ; les colonnes aux types mélangés sont stockées en texte."""
+    try:
+        return pa.array(valeurs)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if v is None else str(v) for v in valeurs], pa.string())
+
+
+def _construire_table(donnees, version):
+    table = pa.table({c: _tableau(v) for c, v in donnees.items()})
+    return table.replace_schema_metadata({"version": version or ""})
+
+
+def en_memoire(donnees, version):
+    """
+    Instantané gardé en mémoire, quand il ne peut pas être écrit sur disque
+    (répertoire en lecture seule, disque plein) : il n'est pas partagé entre
+    processus, mais évite de retélécharger la table à chaque appel.
+
+    Returns:
+        InstantaneGrist: Instantané, ou None si pyarrow est absent
+    """
+    if pa is None:
+        return None
+    try:
+        return InstantaneGrist(_construire_table(donnees, version), version, time.time())
+    except pa.ArrowException as e:
+        print(f"Impossible de construire l'instantané Grist: {e}")
+        return None
+
+
+def ecrire(chemin, donnees, version):
+    """
+    Écrit un instantané de façon atomique (fichier temporaire puis renommage) :
+    les processus qui projettent l'ancien fichier continuent de le lire.
+
+    Args:
+        chemin (str): Fichier de l'instantané
+        donnees (dict): {colonne: [valeurs]}, toutes de même longueur
+        version (str): Version du document Grist
+
+    Returns:
+        bool: True si l'instantané a été écrit
+    """
+    if pa is None:
+        return False
+    try:
+        table = _construire_table(donnees, version)
+        dossier = os.path.dirname(chemin)
+        if dossier:
+            os.makedirs(dossier, exist_ok=True)
+        temporaire = f"{chemin}.{os.getpid()}.tmp"
+        with pa.OSFile(temporaire, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(temporaire, chemin)
+        return True
+    except (OSError, pa.ArrowException) as e:
+        print(f"Impossible d'écrire l'instantané Grist: {e}")
+        return False
+
+
+def charger(chemin):
+    """
+    Ouvre un instantané par projection mémoire.
+
+    Returns:
+        InstantaneGrist: Instantané, ou None s'il est absent ou illisible
+    """
+    if pa is None:
+        return None
+    try:
+        date_verification = os.path.getmtime(chemin)
+        table = pa.ipc.open_file(pa.memory_map(chemin, "r")).read_all()
+    except (OSError, pa.ArrowException):
+        return None
+    metadonnees = table.schema.metadata or {}
+    version = metadonnees.get(b"version", b"").decode() or None
+    return InstantaneGrist(table, version, date_verification)
@@ -0,0 +1,363 @@
+"""
+File de traitements en arrière-plan pour la génération de liens en masse.
+Les traitements et leurs éléments sont enregistrés dans SQLite ; un groupe de
+workers (threads) effectue les appels à Démarches Simplifiées et enregistre
+le statut et le résultat de chaque élément. L'interface n'a plus qu'à créer
+le traitement puis à suivre sa progression, même après une déconnexion.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+from dotenv import load_dotenv
+
+import ds_prefiller
+
+# Charger les variables d'environnement
+load_dotenv()
+
+JOBS_DB = os.getenv("JOBS_DB", os.path.join(".cache", "jobs.db"))
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+# Délai (secondes) après lequel un élément "en_cours" est considéré abandonné
+JOBS_BAIL = int(os.getenv("JOBS_BAIL", "300"))
+# Durée de conservation des traitements terminés (secondes)
+JOBS_RETENTION = int(os.getenv("JOBS_RETENTION", str(7 * 24 * 3600)))
+
+STATUT_EN_ATTENTE = "en_attente"
+STATUT_EN_COURS = "en_cours"
+STATUT_TERMINE = "termine"
+STATUT_OK = "ok"
+STATUT_ERREUR = "erreur"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    libelle TEXT,
+    mode TEXT,
+    cree_le REAL,
+    total INTEGER,
+    termines INTEGER DEFAULT 0,
+    erreurs INTEGER DEFAULT 0,
+    servi_le REAL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT,
+    position INTEGER,
+    donnees TEXT,
+    statut TEXT,
+    pris_le REAL,
+    termine_le REAL,
+    resultat TEXT,
+    PRIMARY KEY (job_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_job_items_statut ON job_items (statut, pris_le);
+CREATE INDEX IF NOT EXISTS idx_job_items_job_statut ON job_items (job_id, statut);
+"""
+
+_workers = []
+_workers_lock = threading.Lock()
+_arret = threading.Event()
+_nouveau_travail = threading.Event()
+_schema_pret = False
+
+
+def _connexion():
+    dossier = os.path.dirname(JOBS_DB)
+    if dossier:
+        os.makedirs(dossier, exist_ok=True)
+    conn = sqlite3.connect(JOBS_DB, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def initialiser():
+    """Crée les tables si nécessaire (une fois par processus)."""
+    global _schema_pret
+    if _schema_pret:
+        return
+    conn = _connexion()
+    try:
+        # Base créée avant l'ordonnancement à tour de rôle : ajouter servi_le
+        if conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'jobs'").fetchone():
+            colonnes = [r[1] for r in conn.execute("PRAGMA table_info(jobs)")]
+            if "servi_le" not in colonnes:
+                conn.execute("ALTER TABLE jobs ADD COLUMN servi_le REAL")
+        conn.executescript(SCHEMA)
+    finally:
+        conn.close()
+    _schema_pret = True
+
+
+def creer_job(apprenants, libelle="", mode=None):
+    """
+    Enregistre un traitement de génération de liens.
+
+    Args:
+        apprenants (list): Données mappées des apprenants
+        libelle (str): Description affichée dans la liste des traitements
+        mode (str, optional): Mode de pré-remplissage ("api" ou "url")
+
+    Returns:
+        str: Identifiant du traitement
+    """
+    initialiser()
+    job_id = uuid.uuid4().hex
+    conn = _connexion()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "INSERT INTO jobs (id, libelle, mode, cree_le, total) VALUES (?, ?, ?, ?, ?)",
+            (job_id, libelle, mode, time.time(), len(apprenants))
+        )
+        conn.executemany(
+            "INSERT INTO job_items (job_id, position, donnees, statut) VALUES (?, ?, ?, ?)",
+            [(job_id, i, json.dumps(a, default=str), STATUT_EN_ATTENTE) for i, a in enumerate(apprenants)]
+        )
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    _nouveau_travail.set()
+    return job_id
+
+
+def _prendre_element(conn):
+    """
+    Réserve atomiquement un élément à traiter (ou abandonné depuis JOBS_BAIL).
+    Les traitements sont servis à tour de rôle : celui qui a le moins
+    d'éléments en cours, puis le moins récemment servi, puis le plus ancien,
+    pour qu'un gros traitement ne bloque pas ceux soumis après lui.
+    """
+    maintenant = time.time()
+    bail = maintenant - JOBS_BAIL
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        ligne = None
+        job = conn.execute(
+            """SELECT j.id, j.mode FROM jobs j
+               WHERE j.termines < j.total AND EXISTS (
+                   SELECT 1 FROM job_items i WHERE i.job_id = j.id
+                   AND (i.statut = ? OR (i.statut = ? AND i.pris_le < ?)))
+               ORDER BY (SELECT COUNT(*) FROM job_items c WHERE c.job_id = j.id AND c.statut = ? AND c.pris_le >= ?),
+                        COALESCE(j.servi_le, 0), j.cree_le
+               LIMIT 1""",
+            (STATUT_EN_ATTENTE, STATUT_EN_COURS, bail, STATUT_EN_COURS, bail)
+        ).fetchone()
+        if job:
+            job_id, mode = job
+            element = conn.execute(
+                """SELECT position, donnees FROM job_items
+                   WHERE job_id = ? AND (statut = ? OR (statut = ? AND pris_le < ?))
+                   ORDER BY position LIMIT 1""",
+                (job_id, STATUT_EN_ATTENTE, STATUT_EN_COURS, bail)
+            ).fetchone()
+            ligne = (job_id, element[0], element[1], mode)
+            conn.execute(
+                "UPDATE job_items SET statut = ?, pris_le = ? WHERE job_id = ? AND position = ?",
+                (STATUT_EN_COURS, maintenant, job_id, element[0])
+            )
+            conn.execute("UPDATE jobs SET servi_le = ? WHERE id = ?", (maintenant, job_id))
+        conn.execute("COMMIT")
+        return ligne
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _enregistrer_resultat(conn, job_id, position, success, resultat):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        curseur = conn.execute(
+            "UPDATE job_items SET statut = ?, resultat = ?, termine_le = ? WHERE job_id = ? AND position = ? AND statut = ?",
+            (STATUT_OK if success else STATUT_ERREUR, resultat, time.time(), job_id, position, STATUT_EN_COURS)
+        )
+        if curseur.rowcount:
+            conn.execute(
+                "UPDATE jobs SET termines = termines + 1, erreurs = erreurs + ? WHERE id = ?",
+                (0 if success else 1, job_id)
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _boucle_worker():
+    conn = _connexion()
+    try:
+        while not _arret.is_set():
+            try:
+                element = _prendre_element(conn)
+            except sqlite3.Error as e:
+                print(f"Erreur de la file de traitements: {e}")
+                element = None
+            if element is None:
+                _nouveau_travail.wait(1.0)
+                _nouveau_travail.clear()
+                continue
+
+            job_id, position, donnees, mode = element
+            try:
+                # Le limiteur de débit sert les traitements à tour de rôle
+                success, resultat = ds_prefiller.generate_short_url(json.loads(donnees), mode=mode, session=job_id)
+            except Exception as e:
+                success, resultat = False, f"Exception: {str(e)}"
+            try:
+                _enregistrer_resultat(conn, job_id, position, success, resultat)
+            except sqlite3.Error as e:
+                # L'élément reste "en_cours" et sera repris après JOBS_BAIL
+                print(f"Erreur d'enregistrement du résultat {job_id}/{position}: {e}")
+    finally:
+        conn.close()
+
+
+def demarrer_workers(nombre=None):
+    """
+    Démarre les workers du processus (une seule fois).
+
+    Args:
+        nombre (int, optional): Nombre de workers (par défaut JOBS_WORKERS)
+    """
+    with _workers_lock:
+        if _workers:
+            return
+        initialiser()
+        purger_jobs()
+        for i in range(nombre or JOBS_WORKERS):
+            worker = threading.Thread(target=_boucle_worker, name=f"jobs-worker-{i}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+
+def progression(job_id):
+    """
+    Renvoie l'avancement d'un traitement.
+
+    Returns:
+        dict: {"id", "libelle", "statut", "total", "termines", "erreurs", "cree_le"} ou None
+    """
+    initialiser()
+    conn = _connexion()
+    try:
+        ligne = conn.execute(
+            "SELECT id, libelle, cree_le, total, termines, erreurs FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+    if not ligne:
+        return None
+    job_id, libelle, cree_le, total, termines, erreurs = ligne
+    return {
+        "id": job_id,
+        "libelle": libelle,
+        "cree_le": cree_le,
+        "total": total,
+        "termines": termines,
+        "erreurs": erreurs,
+        "statut": STATUT_TERMINE if termines >= total else STATUT_EN_COURS,
+    }
+
+
+def resultats_job(job_id, depuis=None):
+    """
+    Renvoie les éléments terminés d'un traitement (résultats partiels possibles).
+
+    Args:
+        job_id (str): Identifiant du traitement
+        depuis (float, optional): Ne renvoyer que les éléments terminés à partir
+            de cette date (termine_le du dernier élément déjà lu, inclus)
+
+    Returns:
+        list: Tuples (position, donnees, success, resultat, termine_le) dans l'ordre des positions
+    """
+    initialiser()
+    conn = _connexion()
+    try:
+        lignes = conn.execute(
+            """SELECT position, donnees, statut, resultat, termine_le FROM job_items
+               WHERE job_id = ? AND statut IN (?, ?) AND termine_le >= ? ORDER BY position""",
+            (job_id, STATUT_OK, STATUT_ERREUR, depuis or 0.0)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [
+        (position, json.loads(donnees), statut == STATUT_OK, resultat, termine_le)
+        for position, donnees, statut, resultat, termine_le in lignes
+    ]
+
+
+def iter_resultats_job(job_id, taille_lot=500):
+    """
+    Parcourt les éléments terminés d'un traitement par lots, sans tout charger en mémoire.
+
+    Yields:
+        tuple: (position, donnees, success, resultat) dans l'ordre des positions
+    """
+    initialiser()
+    conn = _connexion()
+    try:
+        curseur = conn.execute(
+            "SELECT position, donnees, statut, resultat FROM job_items WHERE job_id = ? AND statut IN (?, ?) ORDER BY position",
+            (job_id, STATUT_OK, STATUT_ERREUR)
+        )
+        while True:
+            lot = curseur.fetchmany(taille_lot)
+            if not lot:
+                break
+            for position, donnees, statut, resultat in lot:
+                yield position, json.loads(donnees), statut == STATUT_OK, resultat
+    finally:
+        conn.close()
+
+
+def lister_jobs(limite=20, ids=None):
+    """
+    Renvoie l'avancement des traitements les plus récents.
+
+    Args:
+        limite (int): Nombre maximal de traitements
+        ids (iterable, optional): Restreindre à ces traitements (ceux d'une session)
+    """
+    initialiser()
+    if ids is not None:
+        ids = list(ids)
+        if not ids:
+            return []
+    conn = _connexion()
+    try:
+        if ids is None:
+            lignes = conn.execute("SELECT id FROM jobs ORDER BY cree_le DESC LIMIT ?", (limite,))
+        else:
+            lignes = conn.execute(
+                f"SELECT id FROM jobs WHERE id IN ({', '.join('?' * len(ids))}) ORDER BY cree_le DESC LIMIT ?",
+                (*ids, limite)
+            )
+        ids = [r[0] for r in lignes]
+    finally:
+        conn.close()
+    return [p for p in (progression(job_id) for job_id in ids) if p]
+
+
+def purger_jobs():
+    """Supprime les traitements plus anciens que JOBS_RETENTION, et leurs exports."""
+    # Import local : export dépend de jobs
+    from export import supprimer_exports
+
+    conn = _connexion()
+    try:
+        limite = time.time() - JOBS_RETENTION
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ids = [r[0] for r in conn.execute("SELECT id FROM jobs WHERE cree_le < ?", (limite,))]
+            conn.execute("DELETE FROM job_items WHERE job_id IN (SELECT id FROM jobs WHERE cree_le < ?)", (limite,))
+            conn.execute("DELETE FROM jobs WHERE cree_le < ?", (limite,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    supprimer_exports(ids)
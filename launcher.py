@@ -0,0 +1,313 @@
+"""
+Lanceur de production : plusieurs réplicas Streamlit derrière un petit proxy inverse.
+Chaque réplica est un processus `streamlit run app.py` écoutant en local ; le proxy
+écoute sur $PORT et attribue chaque navigateur à un réplica (cookie de session
+persistante), websocket compris, puisque la session Streamlit et ses fichiers
+(/media) vivent dans le processus qui l'a créée. Les réplicas sont surveillés
+(/_stcore/health), relancés s'ils s'arrêtent, et redémarrés un par un sur SIGHUP.
+
+Usage (Procfile) : python launcher.py
+"""
+
+import os
+import sys
+import signal
+import asyncio
+import subprocess
+
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+PORT = int(os.getenv("PORT", "8501"))
+# Chaque réplica est un processus Streamlit complet (pandas, pyarrow...) :
+# en augmenter le nombre selon la mémoire disponible
+NB_REPLICAS = int(os.getenv("REPLICAS", "2"))
+REPLICA_PORT_BASE = int(os.getenv("REPLICA_PORT_BASE", "8600"))
+APP = os.getenv("APP_STREAMLIT", "app.py")
+
+INTERVALLE_SANTE = float(os.getenv("REPLICA_INTERVALLE_SANTE", "5"))
+DELAI_DEMARRAGE = float(os.getenv("REPLICA_DELAI_DEMARRAGE", "60"))
+# Délai laissé aux connexions d'un réplica pour se terminer avant son arrêt
+DELAI_DRAINAGE = float(os.getenv("REPLICA_DELAI_DRAINAGE", "30"))
+ECHECS_MAX = 3
+
+COOKIE_REPLICA = "erasmip_replica"
+TAILLE_TAMPON = 65536
+
+
+class Replica:
+    """Processus Streamlit écoutant sur un port local."""
+
+    def __init__(self, numero, port):
+        self.numero = numero
+        self.port = port
+        self.process = None
+        self.sain = False
+        self.drainage = False
+        self.connexions = 0
+        self.echecs = 0
+
+    @property
+    def vivant(self):
+        return self.process is not None and self.process.poll() is None
+
+    @property
+    def disponible(self):
+        return self.vivant and self.sain and not self.drainage
+
+    def demarrer(self):
+        self.sain = False
+        self.drainage = False
+        self.echecs = 0
+        self.process = subprocess.Popen([
+            sys.executable, "-m", "streamlit", "run", APP,
+            f"--server.port={self.port}",
+            "--server.address=127.0.0.1",
+            "--server.headless=true",
+        ])
+        print(f"Réplica {self.numero} démarré (port {self.port}, pid {self.process.pid})")
+
+    def arreter(self, delai=10):
+        if not self.vivant:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(delai)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+async def _requete_http(port, chemin, delai=5):
+    """Envoie un GET au réplica et renvoie le code HTTP (None si pas de réponse)."""
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), delai)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    try:
+        writer.write(f"GET {chemin} HTTP/1.0\r\nHost: 127.0.0.1:{port}\r\n\r\n".encode("ascii"))
+        await writer.drain()
+        ligne = await asyncio.wait_for(reader.readline(), delai)
+        morceaux = ligne.split()
+        return int(morceaux[1]) if len(morceaux) > 1 and morceaux[1].isdigit() else None
+    except (OSError, asyncio.TimeoutError):
+        return None
+    finally:
+        writer.close()
+
+
+async def _relayer(reader, writer):
+    """Copie un flux vers l'autre jusqu'à sa fermeture (HTTP ou websocket)."""
+    try:
+        while True:
+            donnees = await reader.read(TAILLE_TAMPON)
+            if not donnees:
+                break
+            writer.write(donnees)
+            await writer.drain()
+    except (ConnectionError, OSError):
+        pass
+    finally:
+        writer.close()
+
+
+def _reponse_erreur(code, message):
+    corps = message.encode("utf-8")
+    return (
+        f"HTTP/1.1 {code} {message}\r\nContent-Type: text/plain; charset=utf-8\r\n"
+        f"Content-Length: {len(corps)}\r\nConnection: close\r\n\r\n"
+    ).encode("latin-1") + corps
+
+
+class Superviseur:
+    """
+    Démarre les réplicas, route les connexions et surveille leur santé.
+
+    Args:
+        replicas (list): Réplicas à gérer
+    """
+
+    def __init__(self, replicas):
+        self.replicas = replicas
+        self._suivant = 0
+        self._arret = None
+        self._redemarrage = None
+
+    # --- Routage ---
+
+    def _replica_du_cookie(self, tete):
+        """Réplica attribué par le cookie de la requête, s'il est toujours disponible."""
+        for ligne in tete.split(b"\r\n")[1:]:
+            if not ligne.lower().startswith(b"cookie:"):
+                continue
+            for morceau in ligne[7:].split(b";"):
+                nom, _, valeur = morceau.strip().partition(b"=")
+                if nom == COOKIE_REPLICA.encode() and valeur.isdigit():
+                    numero = int(valeur)
+                    if numero < len(self.replicas) and self.replicas[numero].disponible:
+                        return self.replicas[numero]
+        return None
+
+    def _choisir_replica(self):
+        """Réplica disponible le moins chargé (à tour de rôle en cas d'égalité)."""
+        disponibles = [r for r in self.replicas if r.disponible]
+        if not disponibles:
+            return None
+        self._suivant = (self._suivant + 1) % len(self.replicas)
+        return min(disponibles, key=lambda r: (r.connexions, (r.numero - self._suivant) % len(self.replicas)))
+
+    async def servir_client(self, client_reader, client_writer):
+        try:
+            tete = await client_reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            client_writer.close()
+            return
+
+        replica = self._replica_du_cookie(tete)
+        nouvelle_attribution = replica is None
+        if nouvelle_attribution:
+            replica = self._choisir_replica()
+        if replica is None:
+            client_writer.write(_reponse_erreur(503, "Service Unavailable"))
+            client_writer.close()
+            return
+
+        try:
+            backend_reader, backend_writer = await asyncio.open_connection("127.0.0.1", replica.port)
+        except OSError:
+            replica.sain = False
+            client_writer.write(_reponse_erreur(502, "Bad Gateway"))
+            client_writer.close()
+            return
+
+        replica.connexions += 1
+        try:
+            backend_writer.write(tete)
+            await backend_writer.drain()
+            montant = asyncio.ensure_future(_relayer(client_reader, backend_writer))
+
+            if nouvelle_attribution:
+                # Attacher le navigateur au réplica via la première réponse
+                try:
+                    reponse = await backend_reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    reponse = b""
+                if reponse:
+                    cookie = f"Set-Cookie: {COOKIE_REPLICA}={replica.numero}; Path=/; HttpOnly; SameSite=Lax\r\n"
+                    client_writer.write(reponse[:-2] + cookie.encode("ascii") + b"\r\n")
+                    await client_writer.drain()
+
+            descendant = asyncio.ensure_future(_relayer(backend_reader, client_writer))
+            _, en_attente = await asyncio.wait({montant, descendant}, return_when=asyncio.FIRST_COMPLETED)
+            for tache in en_attente:
+                tache.cancel()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            replica.connexions -= 1
+            backend_writer.close()
+            client_writer.close()
+
+    # --- Santé et cycle de vie ---
+
+    async def attendre_pret(self, replica):
+        """
+        Attend que le réplica réponde à /_stcore/health avant de lui envoyer du trafic.
+        (app.py n'est exécuté qu'à l'ouverture d'une session websocket : le premier
+        visiteur d'un réplica paie toujours le chargement des modules.)
+        """
+        limite = asyncio.get_running_loop().time() + DELAI_DEMARRAGE
+        while asyncio.get_running_loop().time() < limite and replica.vivant:
+            if await _requete_http(replica.port, "/_stcore/health") == 200:
+                replica.sain = True
+                print(f"Réplica {replica.numero} prêt")
+                return True
+            await asyncio.sleep(0.5)
+        print(f"Réplica {replica.numero} non prêt après {DELAI_DEMARRAGE:.0f}s")
+        return False
+
+    async def surveiller(self):
+        """Vérifie périodiquement chaque réplica ; relance ceux qui se sont arrêtés."""
+        while True:
+            await asyncio.sleep(INTERVALLE_SANTE)
+            for replica in self.replicas:
+                if replica.drainage:
+                    continue
+                if not replica.vivant:
+                    print(f"Réplica {replica.numero} arrêté, relance")
+                    replica.demarrer()
+                    asyncio.ensure_future(self.attendre_pret(replica))
+                    continue
+                if await _requete_http(replica.port, "/_stcore/health") == 200:
+                    replica.echecs = 0
+                    if not replica.sain:
+                        print(f"Réplica {replica.numero} de nouveau disponible")
+                    replica.sain = True
+                else:
+                    replica.echecs += 1
+                    if replica.echecs >= ECHECS_MAX and replica.sain:
+                        print(f"Réplica {replica.numero} retiré (health check en échec)")
+                        replica.sain = False
+
+    async def redemarrer_progressivement(self):
+        """
+        Redémarre les réplicas un par un : plus de nouvelles connexions,
+        attente de la fin des connexions en cours (DELAI_DRAINAGE au plus),
+        arrêt, relance et attente du health check avant de passer au suivant.
+        """
+        print("Redémarrage progressif des réplicas")
+        boucle = asyncio.get_running_loop()
+        for replica in self.replicas:
+            replica.drainage = True
+            limite = boucle.time() + DELAI_DRAINAGE
+            while replica.connexions and boucle.time() < limite:
+                await asyncio.sleep(0.5)
+            await boucle.run_in_executor(None, replica.arreter)
+            replica.demarrer()
+            await self.attendre_pret(replica)
+        print("Redémarrage progressif terminé")
+
+    def _demander_redemarrage(self):
+        if self._redemarrage is None or self._redemarrage.done():
+            self._redemarrage = asyncio.ensure_future(self.redemarrer_progressivement())
+
+    async def executer(self):
+        self._arret = asyncio.Event()
+        boucle = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            boucle.add_signal_handler(sig, self._arret.set)
+        if hasattr(signal, "SIGHUP"):
+            boucle.add_signal_handler(signal.SIGHUP, self._demander_redemarrage)
+
+        for replica in self.replicas:
+            replica.demarrer()
+        await asyncio.gather(*(self.attendre_pret(r) for r in self.replicas))
+
+        serveur = await asyncio.start_server(self.servir_client, "0.0.0.0", PORT)
+        surveillance = asyncio.ensure_future(self.surveiller())
+        print(f"Proxy à l'écoute sur le port {PORT} ({len(self.replicas)} réplicas)")
+        try:
+            await self._arret.wait()
+        finally:
+            print("Arrêt du proxy et des réplicas")
+            surveillance.cancel()
+            serveur.close()
+            for replica in self.replicas:
+                replica.drainage = True
+            await asyncio.gather(*(boucle.run_in_executor(None, r.arreter) for r in self.replicas))
+
+
+def main():
+    # Les réplicas partagent le limiteur de débit DS et le cache applicatif
+    os.makedirs(".cache", exist_ok=True)
+    os.environ.setdefault("DS_RATE_LIMIT_FICHIER", os.path.join(".cache", "rate_limit.db"))
+    os.environ.setdefault("CACHE_BACKEND", "sqlite")
+
+    replicas = [Replica(i, REPLICA_PORT_BASE + i) for i in range(max(1, NB_REPLICAS))]
+    asyncio.run(Superviseur(replicas).executer())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Modèles de données compacts pour l'application ERASMIP.
+Ces classes utilisent __slots__ afin que les résultats conservés dans
+les sessions Streamlit restent légers (pas de dictionnaire par instance).
+"""
+
+
+class Dossier:
+    """
+    Dossier apprenant ERASMIP, indépendant de la source (Grist ou MySQL).
+    Chaque connecteur déclare ses colonnes sources dans l'ordre de
+    Dossier.CHAMPS (COLONNES_DOSSIER) et les passe aux constructeurs.
+    """
+    CHAMPS = ("id", "dossier_number", "civilite", "nom", "prenom", "date_naissance",
+              "format_mobilite", "mobilite_apprenant", "date_depart", "date_retour",
+              "pays_accueil", "statut_participant", "etablissement", "date_depot")
+    __slots__ = CHAMPS
+
+    def __init__(self, id=None, dossier_number=None, civilite=None, nom=None, prenom=None,
+                 date_naissance=None, format_mobilite=None, mobilite_apprenant=None,
+                 date_depart=None, date_retour=None, pays_accueil=None,
+                 statut_participant=None, etablissement=None, date_depot=None):
+        self.id = id
+        self.dossier_number = dossier_number
+        self.civilite = civilite
+        self.nom = nom
+        self.prenom = prenom
+        self.date_naissance = date_naissance
+        self.format_mobilite = format_mobilite
+        self.mobilite_apprenant = mobilite_apprenant
+        self.date_depart = date_depart
+        self.date_retour = date_retour
+        self.pays_accueil = pays_accueil
+        self.statut_participant = statut_participant
+        self.etablissement = etablissement
+        self.date_depot = date_depot
+
+    @classmethod
+    def depuis_dict(cls, row, colonnes):
+        """
+        Construit un dossier à partir d'une ligne dictionnaire (curseur MySQL dictionary=True).
+
+        Args:
+            row (dict): Ligne {colonne: valeur}
+            colonnes (tuple): Colonnes sources dans l'ordre de Dossier.CHAMPS
+        """
+        get = row.get
+        return cls(*[get(c) for c in colonnes])
+
+    @classmethod
+    def depuis_grist(cls, record, colonnes):
+        """
+        Construit un dossier à partir d'un enregistrement Grist {"id": ..., "fields": {...}}.
+        La première colonne (ID) est lue sur l'enregistrement, les autres dans "fields".
+        """
+        get = record.get("fields", {}).get
+        return cls(record.get("id"), *[get(c) for c in colonnes[1:]])
+
+    @staticmethod
+    def indices_colonnes(noms_colonnes, colonnes):
+        """
+        Calcule, une fois par résultat, la position de chaque colonne source
+        dans une ligne tuple (None si la colonne est absente).
+
+        Args:
+            noms_colonnes (sequence): Noms des colonnes du résultat (cursor.column_names)
+            colonnes (tuple): Colonnes sources dans l'ordre de Dossier.CHAMPS
+        """
+        positions = {nom: i for i, nom in enumerate(noms_colonnes)}
+        return tuple(positions.get(c) for c in colonnes)
+
+    @classmethod
+    def depuis_tuple(cls, row, indices):
+        """
+        Construit un dossier à partir d'une ligne tuple et des indices
+        calculés par indices_colonnes.
+        """
+        return cls(*[row[i] if i is not None else None for i in indices])
+
+    @classmethod
+    def depuis_colonnes(cls, donnees, colonnes):
+        """
+        Construit la liste des dossiers à partir de données colonnaires
+        {colonne: [valeurs]} (format /data de Grist).
+
+        Args:
+            donnees (dict): Valeurs par colonne, toutes de même longueur
+            colonnes (tuple): Colonnes sources dans l'ordre de Dossier.CHAMPS
+
+        Returns:
+            list: Liste de Dossier
+        """
+        if not donnees:
+            return []
+        taille = len(next(iter(donnees.values())))
+        vide = [None] * taille
+        return [cls(*valeurs) for valeurs in zip(*[donnees.get(c, vide) for c in colonnes])]
+
+    def get(self, cle, defaut=None):
+        """Accès par clé, compatible avec les dictionnaires de données mappées."""
+        return getattr(self, cle, defaut)
+
+    def items(self):
+        """Paires (champ, valeur), dans l'ordre de Dossier.CHAMPS."""
+        return [(champ, getattr(self, champ)) for champ in self.CHAMPS]
+
+    def __repr__(self):
+        return f"Dossier(id={self.id!r}, dossier_number={self.dossier_number!r}, nom={self.nom!r})"
+
+
+class DossierResume:
+    """
+    Résumé d'un dossier candidat affiché dans la liste de sélection.
+    Ne contient pas les champs bruts : l'enregistrement complet est résolu
+    à la sélection à partir de son ID via le cache partagé du connecteur.
+    """
+    __slots__ = ("id", "numero", "nom", "prenom", "etablissement", "date_depart", "date_depot")
+
+    def __init__(self, id, numero=None, nom=None, prenom=None, etablissement=None,
+                 date_depart=None, date_depot=None):
+        self.id = id
+        self.numero = numero
+        self.nom = nom
+        self.prenom = prenom
+        self.etablissement = etablissement
+        self.date_depart = date_depart
+        self.date_depot = date_depot
+
+    @classmethod
+    def depuis_dossier(cls, dossier):
+        """Construit le résumé d'un Dossier."""
+        return cls(dossier.id, dossier.dossier_number, dossier.nom, dossier.prenom,
+                   dossier.etablissement, dossier.date_depart, dossier.date_depot)
+
+    def __repr__(self):
+        return f"DossierResume(id={self.id!r}, numero={self.numero!r}, nom={self.nom!r})"
+
+
+class ResultatLien:
+    """
+    Ligne de résultat de la génération de liens (onglet 2).
+    Les valeurs sont stockées brutes ; le formatage pour l'affichage
+    est fait au moment du rendu.
+    """
+    __slots__ = ("dossier_number", "nom", "prenom", "date_depart", "date_retour",
+                 "pays_accueil", "etablissement", "type_mobilite", "url", "succes")
+
+    def __init__(self, dossier_number, nom, prenom, date_depart, date_retour,
+                 pays_accueil, etablissement, type_mobilite, url, succes):
+        self.dossier_number = dossier_number
+        self.nom = nom
+        self.prenom = prenom
+        self.date_depart = date_depart
+        self.date_retour = date_retour
+        self.pays_accueil = pays_accueil
+        self.etablissement = etablissement
+        self.type_mobilite = type_mobilite
+        self.url = url
+        self.succes = succes
+
+    @classmethod
+    def depuis_apprenant(cls, apprenant, success, url):
+        """
+        Construit un résultat à partir des données mappées d'un apprenant.
+
+        Args:
+            apprenant (dict): Données mappées de l'apprenant
+            success (bool): Succès de la génération du lien
+            url (str): URL générée ou message d'erreur
+
+        Returns:
+            ResultatLien: Ligne de résultat
+        """
+        return cls(
+            apprenant.get("dossier_number", ""),
+            apprenant.get("nom", ""),
+            apprenant.get("prenom", ""),
+            apprenant.get("date_depart"),
+            apprenant.get("date_retour"),
+            apprenant.get("pays_accueil", "Non renseigné"),
+            apprenant.get("etablissement", "Non renseigné"),
+            apprenant.get("type_mobilite_val", "Stage"),
+            url if success else None,
+            success
+        )
+
+    def __repr__(self):
+        return f"ResultatLien(dossier_number={self.dossier_number!r}, succes={self.succes!r})"
@@ -9,7 +9,16 @@ import mysql.connector
 import pandas as pd
 from dotenv import load_dotenv
 from datetime import datetime
+import re
 import json
+import time
+import threading
+
+import ds_mapping
+from cache import CacheMemoire, obtenir_cache
+from coalescence import GroupeAppels
+from filtre_negatif import FiltresNegatifs, normaliser_nom, normaliser_numero
+from modeles import Dossier, DossierResume
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -22,6 +31,42 @@ MYSQL_DATABASE = os.getenv("MYSQL_DATABASE")
 MYSQL_PORT = int(os.getenv("MYSQL_PORT", "3306"))
 MYSQL_TABLE = os.getenv("MYSQL_TABLE", "ENSFEA_ERASMIP")  # Table ERASMIP par défaut
 
+# Durée de conservation de la liste des établissements dans le cache partagé (secondes)
+CACHE_TTL_ETABLISSEMENTS = int(os.getenv("CACHE_TTL_ETABLISSEMENTS", "300"))
+ESPACE_ETABLISSEMENTS = "mysql_etablissements"
+
+# Requêtes MySQL identiques en cours, partagées entre les sessions
+_appels_mysql = GroupeAppels()
+
+# Nombre de clés résolues par requête dans les recherches par lot
+LOT_CLES_MYSQL = int(os.getenv("LOT_CLES_MYSQL", "500"))
+
+# Filtres de recherche négative (voir filtre_negatif) : consultés seulement s'ils
+# ont été construits sur la version actuelle de la table (voir version_table),
+# sinon reconstruits en arrière-plan. Un dossier ajouté peut donc être déclaré
+# introuvable pendant au plus MYSQL_VERSION_INTERVALLE secondes.
+_filtres = None
+_filtres_lock = threading.Lock()
+_filtres_en_construction = False
+
+# Cache des résultats de requêtes (LRU en mémoire), valable pour une version
+# de la table : la version (UPDATE_TIME de information_schema, lu sans cache des
+# statistiques) est relue au plus toutes les MYSQL_VERSION_INTERVALLE secondes,
+# qui est donc le délai maximal avant qu'une écriture soit vue
+MYSQL_CACHE_TAILLE = int(os.getenv("MYSQL_CACHE_TAILLE", "2000"))
+MYSQL_VERSION_INTERVALLE = float(os.getenv("MYSQL_VERSION_INTERVALLE", "5"))
+ESPACE_REQUETES = "mysql_requetes"
+_cache_requetes = CacheMemoire(MYSQL_CACHE_TAILLE)
+_version_table = None
+_date_version = 0
+_version_lock = threading.Lock()
+
+# Connexions ouvertes conservées entre deux appels, avec leurs requêtes préparées
+MYSQL_POOL_TAILLE = int(os.getenv("MYSQL_POOL_TAILLE", "5"))
+REQUETES_PREPAREES_MAX = 32
+_connexions_libres = {}
+_connexions_lock = threading.Lock()
+
 # Définition des noms de colonnes spécifiques
 COL_ID = "dossier_id"
 COL_DOSSIER_NUMBER = "dossier_number"
@@ -38,6 +83,57 @@ COL_STATUT_PARTICIPANT = "statut_participant"
 COL_DATE_DEPOT = "dateDepot"
 COL_EPLEFPA = "etablissement"  # Colonne établissement
 
+# Colonnes sources des attributs de modeles.Dossier (dans l'ordre de Dossier.CHAMPS)
+COLONNES_DOSSIER = (
+    COL_ID, COL_DOSSIER_NUMBER, COL_CIVILITE, COL_NOM, COL_PRENOM, COL_DATE_NAISSANCE,
+    COL_FORMAT_MOBILITE, COL_MOBILITE_APPRENANT, COL_DATE_DEPART, COL_DATE_RETOUR,
+    COL_PAYS_ACCUEIL, COL_STATUT_PARTICIPANT, COL_EPLEFPA, COL_DATE_DEPOT
+)
+# Liste de sélection des requêtes de dossiers : seules les colonnes lues par
+# Dossier (et donc par mapper_donnees_mobilite) sont transférées
+COLONNES_SQL = ", ".join(COLONNES_DOSSIER)
+# Même liste préfixée par l'alias de la table, pour les jointures
+COLONNES_T = ", ".join(f"t.{c}" for c in COLONNES_DOSSIER)
+
+# Tables de synthèse (voir installer_tables_synthese) : une fois installées,
+# MYSQL_SYNTHESE=1 fait lire les listes d'établissements dans ces tables
+MYSQL_SYNTHESE = os.getenv("MYSQL_SYNTHESE", "0") == "1"
+TABLE_SYNTHESE_ETABLISSEMENTS = f"{MYSQL_TABLE}_synth_etablissements"
+TABLE_SYNTHESE_DATES = f"{MYSQL_TABLE}_synth_dates"
+TABLE_SYNTHESE_NOMS = f"{MYSQL_TABLE}_synth_noms"
+# (table, colonnes groupées) ; chaque ligne porte le nombre de dossiers (nb)
+SYNTHESES = (
+    (TABLE_SYNTHESE_ETABLISSEMENTS, (COL_EPLEFPA,)),
+    (TABLE_SYNTHESE_DATES, (COL_DATE_DEPART, COL_EPLEFPA)),
+    (TABLE_SYNTHESE_NOMS, (COL_NOM, COL_EPLEFPA)),
+)
+# Types non utilisables dans une clé primaire complète (les synthèses sont
+# indexées sur la valeur entière de leurs colonnes)
+TYPES_NON_INDEXABLES = ("text", "blob", "json", "geometry")
+
+# Recherche approchée par nom : index FULLTEXT (analyseur ngram) sur COL_NOM,
+# voir installer_index_noms ; nombre maximal de candidats renvoyés
+INDEX_NOMS = "ft_nom_ngram"
+RECHERCHE_NOMS_LIMITE = int(os.getenv("MYSQL_RECHERCHE_NOMS_LIMITE", "20"))
+
+# Attributs du Dossier affichés dans les logs de débogage
+CHAMPS_TRACE = (
+    "civilite", "nom", "prenom", "date_naissance", "format_mobilite",
+    "mobilite_apprenant", "date_depart", "date_retour", "pays_accueil"
+)
+
+
+def _lecture_seule(query):
+    """
+    True pour une lecture sans verrou (SELECT, SHOW) : seules ces requêtes
+    peuvent être fusionnées entre appelants ou servies par le cache.
+    """
+    mots = query.split(None, 1)
+    if not mots or mots[0].upper() not in ("SELECT", "SHOW"):
+        return False
+    requete = " ".join(query.upper().split())
+    return "FOR UPDATE" not in requete and "LOCK IN SHARE MODE" not in requete and "FOR SHARE" not in requete
+
 
 class MySQLClient:
     def __init__(self, host, user, password, database, port=3306):
@@ -60,16 +156,31 @@ class MySQLClient:
         }
         self.connection = None
         self.cursor = None
+        self._preparees = None
+
+    def _cle_pool(self):
+        return tuple(sorted(self.config.items()))
 
     def connect(self):
         """
-        Établit une connexion à la base de données MySQL.
+        Établit une connexion à la base de données MySQL (connexion libre
+        du pool si possible, sinon nouvelle connexion).
         
         Returns:
             bool: True si la connexion est réussie, False sinon
         """
         try:
-            self.connection = mysql.connector.connect(**self.config)
+            with _connexions_lock:
+                libres = _connexions_libres.get(self._cle_pool(), [])
+                connexion = libres.pop() if libres else None
+            while connexion is not None and not connexion[0].is_connected():
+                with _connexions_lock:
+                    connexion = libres.pop() if libres else None
+            if connexion is None:
+                # autocommit : une connexion réutilisée ne lit pas un instantané
+                # de transaction ancien
+                connexion = (mysql.connector.connect(**self.config, autocommit=True), {})
+            self.connection, self._preparees = connexion
             self.cursor = self.connection.cursor(dictionary=True)
             return True
         except mysql.connector.Error as err:
@@ -78,12 +189,32 @@ class MySQLClient:
 
     def disconnect(self):
         """
-        Ferme la connexion à la base de données MySQL.
+        Libère la connexion : elle retourne au pool (requêtes préparées
+        comprises) ou est fermée si le pool est plein.
         """
         if self.cursor:
             self.cursor.close()
+            self.cursor = None
         if self.connection:
-            self.connection.close()
+            connexion = (self.connection, self._preparees)
+            self.connection = None
+            self._preparees = None
+            with _connexions_lock:
+                libres = _connexions_libres.setdefault(self._cle_pool(), [])
+                conserver = len(libres) < MYSQL_POOL_TAILLE
+                if conserver:
+                    libres.append(connexion)
+            if not conserver:
+                self._fermer(connexion)
+
+    @staticmethod
+    def _fermer(connexion):
+        try:
+            for curseur in connexion[1].values():
+                curseur.close()
+            connexion[0].close()
+        except mysql.connector.Error:
+            pass
 
     def execute_query(self, query, params=None):
         """
@@ -94,8 +225,17 @@ class MySQLClient:
             params: Paramètres pour la requête (optionnel)
             
         Returns:
-            list: Liste des résultats ou None en cas d'erreur
+            list: Liste des résultats ou None en cas d'erreur (partagée entre
+                les lectures identiques simultanées : ne pas la modifier)
         """
+        if not _lecture_seule(query):
+            # Une écriture est toujours exécutée, même si une identique est en cours
+            return self._executer(query, params)
+        cle = (self.config["host"], self.config["port"], self.config["database"],
+               " ".join(query.split()), repr(params))
+        return _appels_mysql.executer(cle, self._executer, query, params)
+
+    def _executer(self, query, params=None):
         try:
             if not self.connection or not self.connection.is_connected():
                 if not self.connect():
@@ -107,6 +247,210 @@ class MySQLClient:
             print(f"Erreur lors de l'exécution de la requête: {err}")
             return None
 
+    def version_table(self):
+        """
+        Version actuelle de MYSQL_TABLE (et des tables de synthèse si
+        MYSQL_SYNTHESE=1), relue au plus toutes les MYSQL_VERSION_INTERVALLE secondes. Un changement de version vide
+        le cache des requêtes et les établissements du cache partagé.
+        
+        Returns:
+            tuple: Jeton de version, ou None si elle ne peut pas être établie
+                (le cache n'est alors pas utilisé)
+        """
+        global _version_table, _date_version
+        with _version_lock:
+            if time.time() - _date_version < MYSQL_VERSION_INTERVALLE:
+                return _version_table
+        
+        cle = ("version", self.config["host"], self.config["port"], self.config["database"], MYSQL_TABLE)
+        version = _appels_mysql.executer(cle, self._lire_version)
+        with _version_lock:
+            if version != _version_table:
+                if _version_table is not None:
+                    print("Table MySQL modifiée : cache des requêtes invalidé")
+                    _cache_requetes.invalider(ESPACE_REQUETES)
+                    obtenir_cache().invalider(ESPACE_ETABLISSEMENTS)
+                _version_table = version
+            _date_version = time.time()
+        return version
+
+    def _lire_version(self):
+        version = self._lire_version_table()
+        if version is None or not MYSQL_SYNTHESE:
+            return version
+        
+        # Les listes lues dans les tables de synthèse sont mises en cache sous
+        # cette version : y inclure leurs dates de mise à jour, pour qu'une
+        # reconstruction (rafraichir_tables_synthese, depuis n'importe quel
+        # processus) invalide les caches de tous les processus
+        tables = [table for table, _ in SYNTHESES]
+        query = f"""
+        SELECT TABLE_NAME, UPDATE_TIME, UPDATE_TIME >= NOW() - INTERVAL 1 SECOND
+        FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME IN ({", ".join(["%s"] * len(tables))})
+        """
+        resultat = self._executer_prepare(query, (self.config["database"], *tables))
+        if resultat is None or any(recente for _, _, recente in resultat[1]):
+            return None
+        return version + (("synthese", tuple(sorted((nom, str(date_maj)) for nom, date_maj, _ in resultat[1]))),)
+
+    def _lire_version_table(self):
+        if not self.connection or not self.connection.is_connected():
+            if not self.connect():
+                return None
+        try:
+            # MySQL 8 met en cache les statistiques de information_schema pendant
+            # information_schema_stats_expiry (24 h par défaut) : lire la valeur réelle
+            self.cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+        except mysql.connector.Error:
+            pass  # Serveur sans ce cache (MySQL 5.7, MariaDB)
+        
+        query = """
+        SELECT UPDATE_TIME, UPDATE_TIME >= NOW() - INTERVAL 1 SECOND
+        FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s
+        """
+        resultat = self._executer_prepare(query, (self.config["database"], MYSQL_TABLE))
+        if not resultat or not resultat[1]:
+            return None
+        date_maj, recente = resultat[1][0]
+        if date_maj is not None:
+            # UPDATE_TIME est à la seconde : une modification de la seconde en
+            # cours pourrait être suivie d'une autre sans changer la version
+            return None if recente else ("maj", str(date_maj))
+        
+        # UPDATE_TIME vide : InnoDB ne l'a pas encore renseigné depuis le démarrage
+        # du serveur (aucune écriture). Le nombre de lignes et l'ID maximal (lus
+        # sur l'index primaire) distinguent cet état d'un moteur sans suivi.
+        resultat = self._executer_prepare(f"SELECT COUNT(*), MAX({COL_ID}) FROM {MYSQL_TABLE}")
+        if not resultat or not resultat[1]:
+            return None
+        nombre, id_max = resultat[1][0]
+        return ("sans_maj", nombre, str(id_max))
+
+    def lire_cache(self, cle):
+        """
+        Résultat en cache d'une requête, s'il a été obtenu sur la version actuelle de la table.
+        
+        Args:
+            cle: Clé de la requête (forme normalisée et paramètres)
+            
+        Returns:
+            tuple: (version, resultat) ; resultat vaut None s'il n'est pas en cache
+                (partagé entre les appelants : ne pas le modifier)
+        """
+        version = self.version_table()
+        if version is None:
+            return None, None
+        entree = _cache_requetes.get(ESPACE_REQUETES, cle)
+        if entree is None or entree[0] != version:
+            return version, None
+        return version, entree[1]
+
+    def ecrire_cache(self, cle, version, resultat):
+        """Met en cache le résultat d'une requête obtenu sur la version donnée de la table."""
+        if version is not None and resultat is not None:
+            _cache_requetes.set(ESPACE_REQUETES, cle, (version, resultat))
+
+    def execute_prepared(self, query, params=None):
+        """
+        Exécute une requête de forme fixe en requête préparée côté serveur :
+        elle est analysée une fois par connexion, puis seuls les paramètres
+        sont envoyés (protocole binaire). Les lignes sont des tuples.
+        Le résultat est servi par le cache des requêtes tant que la table
+        n'a pas changé.
+        
+        Args:
+            query: Requête SQL à exécuter (paramètres %s)
+            params: Paramètres pour la requête (optionnel)
+            
+        Returns:
+            tuple: (colonnes, lignes) où colonnes est le tuple des noms de colonnes
+                et lignes une liste de tuples, ou None en cas d'erreur (partagé
+                entre les lectures identiques simultanées : ne pas le modifier)
+        """
+        if not _lecture_seule(query):
+            return self._executer_prepare(query, params)
+        cle = ("preparee", self.config["host"], self.config["port"], self.config["database"],
+               " ".join(query.split()), repr(params))
+        version, resultat = self.lire_cache(cle)
+        if resultat is None:
+            resultat = _appels_mysql.executer(cle, self._executer_prepare, query, params)
+            self.ecrire_cache(cle, version, resultat)
+        return resultat
+
+    def _executer_prepare(self, query, params=None):
+        try:
+            if not self.connection or not self.connection.is_connected():
+                if not self.connect():
+                    return None
+
+            curseur = self._preparees.get(query)
+            if curseur is None:
+                if len(self._preparees) >= REQUETES_PREPAREES_MAX:
+                    self._preparees.pop(next(iter(self._preparees))).close()
+                curseur = self.connection.cursor(prepared=True)
+                self._preparees[query] = curseur
+            curseur.execute(query, params or ())
+            if not curseur.with_rows:
+                return (), []
+            return tuple(curseur.column_names), curseur.fetchall()
+        except mysql.connector.Error as err:
+            print(f"Erreur lors de l'exécution de la requête: {err}")
+            curseur = self._preparees.pop(query, None) if self._preparees is not None else None
+            if curseur is not None:
+                try:
+                    curseur.close()
+                except mysql.connector.Error:
+                    pass
+            return None
+
+    def iter_query(self, query, params=None, taille_lot=1000):
+        """
+        Exécute une requête et parcourt son résultat par lots, sans le charger
+        entièrement : curseur non bufferisé (lignes lues au fil de l'eau depuis
+        le serveur), lignes en tuples et noms de colonnes partagés par le lot.
+        
+        Args:
+            query: Requête SQL à exécuter
+            params: Paramètres pour la requête (optionnel)
+            taille_lot: Nombre de lignes lues par appel à fetchmany
+            
+        Yields:
+            tuple: (colonnes, lignes) où colonnes est le tuple des noms de colonnes
+                et lignes une liste de tuples
+            
+        Raises:
+            mysql.connector.Error: En cas d'erreur (un parcours ne s'arrête pas
+                silencieusement en cours de route)
+        """
+        if not self.connection or not self.connection.is_connected():
+            if not self.connect():
+                raise mysql.connector.Error("Impossible de se connecter à la base de données")
+        
+        curseur = self.connection.cursor(buffered=False)
+        termine = False
+        try:
+            curseur.execute(query, params or ())
+            colonnes = tuple(curseur.column_names)
+            while True:
+                lignes = curseur.fetchmany(taille_lot)
+                if not lignes:
+                    break
+                yield colonnes, lignes
+            termine = True
+        except mysql.connector.Error as err:
+            print(f"Erreur lors de la lecture du résultat: {err}")
+            raise
+        finally:
+            if not termine:
+                # Parcours interrompu : lire et jeter le reste pour libérer la connexion
+                try:
+                    self.connection.consume_results()
+                except mysql.connector.Error:
+                    pass
+            curseur.close()
+
 
 # Fonctions d'interface pour notre application
 def get_mysql_client():
@@ -125,6 +469,97 @@ def get_mysql_client():
     )
 
 
+def dossier_depuis_ligne(row):
+    """Construit un modeles.Dossier à partir d'une ligne MySQL (dictionnaire)."""
+    return Dossier.depuis_dict(row, COLONNES_DOSSIER)
+
+
+def dossiers_depuis_resultat(resultat):
+    """Construit les modeles.Dossier d'un résultat (colonnes, lignes) de execute_prepared."""
+    colonnes, lignes = resultat
+    indices = Dossier.indices_colonnes(colonnes, COLONNES_DOSSIER)
+    return [Dossier.depuis_tuple(row, indices) for row in lignes]
+
+
+def _tracer_dossier(dossier):
+    """Affiche les champs principaux d'un dossier pour le débogage."""
+    print(f"Données brutes trouvées dans MySQL:")
+    for k in CHAMPS_TRACE:
+        v = getattr(dossier, k)
+        print(f"  {k}: {v} (type: {type(v)})")
+
+
+def construire_filtres_negatifs():
+    """
+    Relit les numéros de dossier et les noms de la table et reconstruit
+    les filtres de recherche négative.
+    
+    Returns:
+        FiltresNegatifs: Nouveaux filtres, ou None en cas d'erreur
+    """
+    global _filtres
+    client = get_mysql_client()
+    if not client.connect():
+        return None
+    try:
+        # Version lue avant les données : une écriture concurrente rend les
+        # filtres périmés plutôt que de passer inaperçue
+        version = client.version_table()
+        # Lecture en flux : seules les valeurs normalisées distinctes sont conservées
+        numeros = {normaliser_numero(row[0]) for _, lignes in client.iter_query(f"SELECT {COL_DOSSIER_NUMBER} FROM {MYSQL_TABLE}")
+                   for row in lignes if row[0] not in (None, "")}
+        noms = {normaliser_nom(row[0]) for _, lignes in client.iter_query(f"SELECT DISTINCT {COL_NOM} FROM {MYSQL_TABLE}")
+                for row in lignes if row[0]}
+    except mysql.connector.Error:
+        return None
+    finally:
+        client.disconnect()
+    
+    filtres = FiltresNegatifs(numeros, noms, version=version)
+    with _filtres_lock:
+        _filtres = filtres
+    print(f"Filtres négatifs MySQL construits ({len(numeros)} dossiers)")
+    return filtres
+
+
+def _construire_filtres_arriere_plan():
+    global _filtres_en_construction
+    try:
+        construire_filtres_negatifs()
+    except Exception as e:
+        print(f"Exception lors de la construction des filtres négatifs: {str(e)}")
+    finally:
+        with _filtres_lock:
+            _filtres_en_construction = False
+
+
+def _filtres_negatifs():
+    """
+    Filtres de recherche négative, s'ils correspondent à la version actuelle
+    de la table. Des filtres absents ou périmés sont reconstruits en arrière-plan ;
+    en attendant (ou si la version est inconnue), les recherches interrogent
+    MySQL normalement.
+    
+    Returns:
+        FiltresNegatifs: Filtres à jour, ou None
+    """
+    global _filtres_en_construction
+    client = get_mysql_client()
+    try:
+        version = client.version_table()
+    finally:
+        client.disconnect()
+    
+    with _filtres_lock:
+        filtres = _filtres
+        a_jour = filtres is not None and version is not None and filtres.version == version
+        perimes = filtres is None or filtres.version != version
+        if perimes and not _filtres_en_construction:
+            _filtres_en_construction = True
+            threading.Thread(target=_construire_filtres_arriere_plan, daemon=True).start()
+    return filtres if a_jour else None
+
+
 # Fonctions de transformation des données EFP
 def transformer_date(date_val):
     """Transforme une date au format ISO8601"""
@@ -163,6 +598,12 @@ def rechercher_dossier_par_nom_et_numero(nom, numero_dossier):
     """
     try:
         print(f"Recherche de dossier avec nom: {nom} et numéro: {numero_dossier}")
+        
+        filtres = _filtres_negatifs()
+        if filtres is not None and filtres.numero_absent(numero_dossier):
+            print("Aucun dossier trouvé avec ce numéro (filtre négatif).")
+            return False, "Aucun dossier trouvé avec ce numéro."
+        
         client = get_mysql_client()
         
         if not client.connect():
@@ -170,26 +611,31 @@ def rechercher_dossier_par_nom_et_numero(nom, numero_dossier):
         
         # Recherche par nom et numéro de dossier
         query = f"""
-        SELECT * 
+        SELECT {COLONNES_SQL}
         FROM {MYSQL_TABLE} 
         WHERE {COL_NOM} = %s AND {COL_DOSSIER_NUMBER} = %s
         """
         
-        results = client.execute_query(query, (nom, numero_dossier))
+        # Nom absent à coup sûr : seule la recherche par numéro reste utile
+        results = []
+        if filtres is None or not filtres.nom_absent(nom):
+            resultat = client.execute_prepared(query, (nom, numero_dossier))
+            results = dossiers_depuis_resultat(resultat) if resultat else []
         client.disconnect()
         
         if not results:
             # Si aucun résultat, essayer de filtrer seulement par numéro de dossier
             client.connect()
             query_num = f"""
-            SELECT * 
+            SELECT {COL_ID}
             FROM {MYSQL_TABLE} 
             WHERE {COL_DOSSIER_NUMBER} = %s
+            LIMIT 1
             """
-            results_num = client.execute_query(query_num, (numero_dossier,))
+            results_num = client.execute_prepared(query_num, (numero_dossier,))
             client.disconnect()
             
-            if results_num:
+            if results_num and results_num[1]:
                 print(f"Trouvé dossier par numéro, mais le nom ne correspond pas.")
                 return False, "Le numéro de dossier existe, mais le nom ne correspond pas."
             else:
@@ -197,22 +643,12 @@ def rechercher_dossier_par_nom_et_numero(nom, numero_dossier):
                 return False, "Aucun dossier trouvé avec ce numéro."
         
         # Prendre le premier dossier correspondant
-        dossier = results[0]
+        result = results[0]
         
         # Log des données pour débogage
-        print(f"Données brutes trouvées dans MySQL:")
-        for k, v in dossier.items():
-            if k in [COL_CIVILITE, COL_NOM, COL_PRENOM, COL_DATE_NAISSANCE, COL_FORMAT_MOBILITE, 
-                    COL_MOBILITE_APPRENANT, COL_DATE_DEPART, COL_DATE_RETOUR, COL_PAYS_ACCUEIL]:
-                print(f"  {k}: {v} (type: {type(v)})")
-        
-        # Formater le résultat
-        result = {
-            "id": dossier.get(COL_ID),
-            "fields": dossier
-        }
+        _tracer_dossier(result)
         
-        print(f"Dossier trouvé avec ID: {result['id']}")
+        print(f"Dossier trouvé avec ID: {result.id}")
         return True, result
     
     except Exception as e:
@@ -237,6 +673,11 @@ def rechercher_dossier_par_nom_et_etablissement(nom, etablissement, numero_dossi
     """
     try:
         print(f"Recherche de dossier avec nom: {nom}, établissement: {etablissement}, numéro: {numero_dossier or 'Non fourni'}")
+        
+        filtres = _filtres_negatifs()
+        if filtres is not None and (filtres.nom_absent(nom) or (numero_dossier and filtres.numero_absent(numero_dossier))):
+            return False, "Aucun dossier trouvé avec ces critères."
+        
         client = get_mysql_client()
         
         if not client.connect():
@@ -246,7 +687,7 @@ def rechercher_dossier_par_nom_et_etablissement(nom, etablissement, numero_dossi
         if numero_dossier:
             # Si le numéro de dossier est fourni, l'utiliser avec le nom et l'établissement
             query = f"""
-            SELECT * 
+            SELECT {COLONNES_SQL}
             FROM {MYSQL_TABLE} 
             WHERE {COL_NOM} = %s AND {COL_EPLEFPA} = %s AND {COL_DOSSIER_NUMBER} = %s
             """
@@ -254,52 +695,32 @@ def rechercher_dossier_par_nom_et_etablissement(nom, etablissement, numero_dossi
         else:
             # Sinon, rechercher uniquement par nom et établissement
             query = f"""
-            SELECT * 
+            SELECT {COLONNES_SQL}
             FROM {MYSQL_TABLE} 
             WHERE {COL_NOM} = %s AND {COL_EPLEFPA} = %s
             """
             params = (nom, etablissement)
         
-        results = client.execute_query(query, params)
+        resultat = client.execute_prepared(query, params)
         client.disconnect()
+        results = dossiers_depuis_resultat(resultat) if resultat else []
         
         if not results:
             return False, "Aucun dossier trouvé avec ces critères."
         
         # Si plusieurs résultats, les renvoyer tous pour que l'utilisateur puisse choisir
         if len(results) > 1:
-            dossiers = []
-            for dossier in results:
-                dossier_info = {
-                    "id": dossier.get(COL_ID),
-                    "numero": dossier.get(COL_DOSSIER_NUMBER),
-                    "nom": dossier.get(COL_NOM),
-                    "prenom": dossier.get(COL_PRENOM),
-                    "etablissement": dossier.get(COL_EPLEFPA),
-                    "date_depot": dossier.get(COL_DATE_DEPOT),
-                    "fields": dossier
-                }
-                dossiers.append(dossier_info)
+            dossiers = [DossierResume.depuis_dossier(dossier) for dossier in results]
             
             print(f"Plusieurs dossiers trouvés ({len(dossiers)}) pour ces critères.")
             return True, {"multiple": True, "dossiers": dossiers}
         
         # Sinon, renvoyer le dossier unique
-        dossier = results[0]
-        print(f"Dossier unique trouvé avec ID: {dossier.get(COL_ID)}")
+        result = results[0]
+        print(f"Dossier unique trouvé avec ID: {result.id}")
         
         # Log des données pour débogage
-        print(f"Données brutes trouvées dans MySQL:")
-        for k, v in dossier.items():
-            if k in [COL_CIVILITE, COL_NOM, COL_PRENOM, COL_DATE_NAISSANCE, COL_FORMAT_MOBILITE, 
-                    COL_MOBILITE_APPRENANT, COL_DATE_DEPART, COL_DATE_RETOUR, COL_PAYS_ACCUEIL]:
-                print(f"  {k}: {v} (type: {type(v)})")
-        
-        # Formater le résultat
-        result = {
-            "id": dossier.get(COL_ID),
-            "fields": dossier
-        }
+        _tracer_dossier(result)
         
         return True, result
     
@@ -310,6 +731,456 @@ def rechercher_dossier_par_nom_et_etablissement(nom, etablissement, numero_dossi
         return False, f"Exception: {str(e)}"
 
 
+def _colonnes_source(client, colonnes):
+    """
+    Type, jeu de caractères et collation de colonnes de MYSQL_TABLE
+    (information_schema.COLUMNS ; résultat en cache comme toute lecture préparée).
+    
+    Returns:
+        dict: {colonne: (type, jeu, collation)}, ou None si la lecture échoue
+    """
+    colonnes = sorted(set(colonnes))
+    query = f"""
+    SELECT COLUMN_NAME, COLUMN_TYPE, CHARACTER_SET_NAME, COLLATION_NAME
+    FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND COLUMN_NAME IN ({", ".join(["%s"] * len(colonnes))})
+    """
+    resultat = client.execute_prepared(query, (client.config["database"], MYSQL_TABLE, *colonnes))
+    if resultat is None:
+        return None
+    return {
+        nom: (type_colonne.decode() if isinstance(type_colonne, bytes) else type_colonne, jeu, collation)
+        for nom, type_colonne, jeu, collation in resultat[1]
+    }
+
+
+def _cle_comparable(colonnes_source, colonne, expression):
+    """
+    Expression d'une colonne de table dérivée convertie dans le jeu de
+    caractères et la collation de la colonne de MYSQL_TABLE à laquelle elle
+    est comparée. Une colonne de table dérivée a, comme une colonne de table,
+    une coercibilité implicite : sans conversion, une collation de connexion
+    différente de celle de la colonne provoque "Illegal mix of collations".
+    """
+    _, jeu, collation = (colonnes_source or {}).get(colonne, (None, None, None))
+    if not jeu:
+        return expression
+    return f"CONVERT({expression} USING {jeu}) COLLATE {collation}"
+
+
+def _table_cles(noms, cles):
+    """
+    Table dérivée des clés d'un lot (SELECT ... UNION ALL SELECT ...), avec
+    la position de chaque clé dans la colonne _cle_pos.
+    
+    Args:
+        noms (tuple): Noms des colonnes de clé
+        cles (list): Tuples de valeurs, de même longueur que noms
+        
+    Returns:
+        tuple: (sql, params)
+    """
+    premiere = ", ".join(f"%s AS {nom}" for nom in noms) + ", %s AS _cle_pos"
+    suivante = ", ".join(["%s"] * (len(noms) + 1))
+    sql = " UNION ALL ".join([f"SELECT {premiere}"] + [f"SELECT {suivante}"] * (len(cles) - 1))
+    params = [valeur for pos, cle in enumerate(cles) for valeur in (*cle, pos)]
+    return sql, params
+
+
+def rechercher_dossiers_par_nom_et_numero(paires):
+    """
+    Résout une liste de couples (nom, numéro de dossier) avec une seule
+    connexion et une requête par lot de LOT_CLES_MYSQL couples (jointure
+    sur une table dérivée des clés). Chaque couple reçoit le même résultat
+    que rechercher_dossier_par_nom_et_numero, diagnostics compris.
+    
+    Args:
+        paires (list): Couples (nom, numero_dossier)
+        
+    Returns:
+        dict: {(nom, numero_dossier): (success, result)}
+    """
+    paires = list(dict.fromkeys(paires))
+    if not paires:
+        return {}
+    
+    client = get_mysql_client()
+    if not client.connect():
+        return {paire: (False, "Impossible de se connecter à la base de données") for paire in paires}
+    
+    resultats = {}
+    try:
+        colonnes_source = _colonnes_source(client, (COL_NOM,))
+        for debut in range(0, len(paires), LOT_CLES_MYSQL):
+            lot = paires[debut:debut + LOT_CLES_MYSQL]
+            cles_sql, params = _table_cles(("_cle_nom", "_cle_num"), lot)
+            
+            # Toutes les lignes des numéros demandés, avec la comparaison du nom
+            # faite par MySQL dans la collation de la colonne (comme la recherche
+            # unitaire, où le paramètre prend la collation de la colonne)
+            cle_nom = _cle_comparable(colonnes_source, COL_NOM, "k._cle_nom")
+            query = f"""
+            SELECT {COLONNES_T}, k._cle_pos, (t.{COL_NOM} = {cle_nom}) AS _nom_ok
+            FROM ({cles_sql}) k
+            JOIN {MYSQL_TABLE} t ON t.{COL_DOSSIER_NUMBER} = k._cle_num
+            """
+            rows = client.execute_query(query, params)
+            if rows is None:
+                for paire in lot:
+                    resultats[paire] = (False, "Erreur lors de la requête MySQL")
+                continue
+            
+            numeros_trouves = set()
+            correspondances = {}
+            for row in rows:
+                numeros_trouves.add(row["_cle_pos"])
+                if row["_nom_ok"]:
+                    correspondances.setdefault(row["_cle_pos"], row)
+            
+            for pos, paire in enumerate(lot):
+                if pos in correspondances:
+                    resultats[paire] = (True, dossier_depuis_ligne(correspondances[pos]))
+                elif pos in numeros_trouves:
+                    resultats[paire] = (False, "Le numéro de dossier existe, mais le nom ne correspond pas.")
+                else:
+                    resultats[paire] = (False, "Aucun dossier trouvé avec ce numéro.")
+    finally:
+        client.disconnect()
+    
+    print(f"Recherche par lot: {len(paires)} couple(s) nom/numéro, {sum(1 for r in resultats.values() if r[0])} trouvé(s)")
+    return resultats
+
+
+def rechercher_dossiers_par_nom_et_etablissement(cles):
+    """
+    Résout une liste de clés (nom, établissement) ou (nom, établissement, numéro)
+    avec une seule connexion et une requête par lot de LOT_CLES_MYSQL clés.
+    Chaque clé reçoit le même résultat que rechercher_dossier_par_nom_et_etablissement
+    (dossier unique, liste de dossiers multiples ou message d'erreur).
+    
+    Args:
+        cles (list): Tuples (nom, etablissement) ou (nom, etablissement, numero_dossier)
+        
+    Returns:
+        dict: {cle: (success, result)}
+    """
+    cles = list(dict.fromkeys(cles))
+    if not cles:
+        return {}
+    
+    client = get_mysql_client()
+    if not client.connect():
+        return {cle: (False, "Impossible de se connecter à la base de données") for cle in cles}
+    
+    resultats = {}
+    try:
+        colonnes_source = _colonnes_source(client, (COL_NOM, COL_EPLEFPA))
+        for debut in range(0, len(cles), LOT_CLES_MYSQL):
+            lot = cles[debut:debut + LOT_CLES_MYSQL]
+            # Numéro de dossier facultatif : NULL (ou vide) pour ne pas filtrer dessus
+            valeurs = [(cle[0], cle[1], (cle[2] if len(cle) > 2 else None) or None) for cle in lot]
+            cles_sql, params = _table_cles(("_cle_nom", "_cle_etab", "_cle_num"), valeurs)
+            
+            cle_nom = _cle_comparable(colonnes_source, COL_NOM, "k._cle_nom")
+            cle_etab = _cle_comparable(colonnes_source, COL_EPLEFPA, "k._cle_etab")
+            query = f"""
+            SELECT {COLONNES_T}, k._cle_pos
+            FROM ({cles_sql}) k
+            JOIN {MYSQL_TABLE} t
+              ON t.{COL_NOM} = {cle_nom} AND t.{COL_EPLEFPA} = {cle_etab}
+             AND (k._cle_num IS NULL OR t.{COL_DOSSIER_NUMBER} = k._cle_num)
+            """
+            rows = client.execute_query(query, params)
+            if rows is None:
+                for cle in lot:
+                    resultats[cle] = (False, "Erreur lors de la requête MySQL")
+                continue
+            
+            par_cle = {}
+            for row in rows:
+                par_cle.setdefault(row["_cle_pos"], []).append(row)
+            
+            for pos, cle in enumerate(lot):
+                lignes = par_cle.get(pos)
+                if not lignes:
+                    resultats[cle] = (False, "Aucun dossier trouvé avec ces critères.")
+                elif len(lignes) > 1:
+                    dossiers = [DossierResume.depuis_dossier(dossier_depuis_ligne(row)) for row in lignes]
+                    resultats[cle] = (True, {"multiple": True, "dossiers": dossiers})
+                else:
+                    resultats[cle] = (True, dossier_depuis_ligne(lignes[0]))
+    finally:
+        client.disconnect()
+    
+    print(f"Recherche par lot: {len(cles)} clé(s) nom/établissement, {sum(1 for r in resultats.values() if r[0])} trouvée(s)")
+    return resultats
+
+
+def installer_index_noms():
+    """
+    Crée l'index FULLTEXT à analyseur ngram sur la colonne des noms, utilisé
+    par rechercher_dossiers_par_nom_approche. À lancer une fois (privilège
+    ALTER requis) ; l'index est ensuite tenu à jour par MySQL.
+    
+    Returns:
+        tuple: (success, message)
+    """
+    client = get_mysql_client()
+    if not client.connect():
+        return False, "Impossible de se connecter à la base de données"
+    
+    try:
+        client.cursor.execute(
+            "SELECT 1 FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND INDEX_NAME = %s",
+            (client.config["database"], MYSQL_TABLE, INDEX_NOMS)
+        )
+        if client.cursor.fetchall():
+            return True, "Index de recherche des noms déjà présent."
+        client.cursor.execute(f"ALTER TABLE {MYSQL_TABLE} ADD FULLTEXT INDEX {INDEX_NOMS} ({COL_NOM}) WITH PARSER ngram")
+        return True, "Index de recherche des noms créé."
+    except mysql.connector.Error as err:
+        print(f"Erreur lors de la création de l'index des noms: {err}")
+        return False, f"Erreur lors de la création de l'index des noms: {err}"
+    finally:
+        client.disconnect()
+
+
+def _termes_nom(nom):
+    """Nom normalisé dont les séparateurs (tirets, apostrophes) sont des espaces."""
+    return " ".join(re.sub(r"[\W_]+", " ", normaliser_nom(nom)).split())
+
+
+def rechercher_dossiers_par_nom_approche(nom, etablissement=None, limite=RECHERCHE_NOMS_LIMITE):
+    """
+    Recherche approchée par nom : accents, casse, tirets et espaces n'empêchent
+    pas de trouver le dossier. Une seule requête (index FULLTEXT ngram) renvoie
+    les candidats, les noms identiques après normalisation en tête puis par
+    pertinence ; ce classement est fait avant la limite.
+    
+    Args:
+        nom (str): Nom de famille saisi
+        etablissement (str, optional): Restreindre à un établissement
+        limite (int): Nombre maximal de candidats
+        
+    Returns:
+        tuple: (success, result) où result est la liste des DossierResume
+            classés ou un message d'erreur
+    """
+    try:
+        termes = _termes_nom(nom)
+        if not termes:
+            return False, "Nom de recherche vide."
+        
+        client = get_mysql_client()
+        
+        if not client.connect():
+            return False, "Impossible de se connecter à la base de données"
+        
+        score = f"MATCH({COL_NOM}) AGAINST (%s IN NATURAL LANGUAGE MODE)"
+        # Nom identique aux termes une fois tirets et apostrophes remplacés par
+        # des espaces ; la collation de la colonne ignore casse et accents
+        identique = f"(TRIM(REPLACE(REPLACE({COL_NOM}, '-', ' '), '''', ' ')) = %s)"
+        filtre_etablissement = f"AND {COL_EPLEFPA} = %s" if etablissement else ""
+        query = f"""
+        SELECT {COL_ID}, {COL_DOSSIER_NUMBER}, {COL_NOM}, {COL_PRENOM}, {COL_EPLEFPA},
+               {COL_DATE_DEPART}, {COL_DATE_DEPOT}, {score} AS score
+        FROM {MYSQL_TABLE}
+        WHERE {score} {filtre_etablissement}
+        ORDER BY {identique} DESC, score DESC
+        LIMIT %s
+        """
+        params = (termes, termes) + ((etablissement,) if etablissement else ()) + (termes, int(limite))
+        resultat = client.execute_prepared(query, params)
+        client.disconnect()
+        
+        if resultat is None:
+            return False, "Erreur lors de la recherche approchée (index des noms installé ?)"
+        if not resultat[1]:
+            return False, "Aucun dossier proche de ce nom."
+        
+        # Affinage dans la limite : égalité selon la normalisation complète
+        # (ligatures, espaces multiples), puis score décroissant
+        lignes = sorted(resultat[1], key=lambda row: (_termes_nom(row[2]) != termes, -row[7]))
+        candidats = [DossierResume(*row[:7]) for row in lignes]
+        print(f"Recherche approchée '{nom}': {len(candidats)} candidat(s)")
+        return True, candidats
+    
+    except Exception as e:
+        print(f"Exception lors de la recherche approchée par nom: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False, f"Exception: {str(e)}"
+
+
+def _condition_synthese(colonnes, prefixe=""):
+    """Lignes prises en compte dans une synthèse : colonnes groupées renseignées."""
+    conditions = []
+    for colonne in colonnes:
+        conditions.append(f"{prefixe}{colonne} IS NOT NULL")
+        if colonne != COL_DATE_DEPART:
+            conditions.append(f"{prefixe}{colonne} != ''")
+    return " AND ".join(conditions)
+
+
+def _definitions_synthese(client):
+    """
+    Définitions SQL des colonnes groupées, reprises de MYSQL_TABLE (type,
+    jeu de caractères et collation) pour que toute valeur de la table source
+    puisse être recopiée dans les synthèses et y être comparée à l'identique.
+    
+    Returns:
+        dict: {colonne: définition}
+        
+    Raises:
+        mysql.connector.Error: Si une colonne est absente ou non indexable
+    """
+    colonnes = sorted({c for _, groupe in SYNTHESES for c in groupe})
+    colonnes_source = _colonnes_source(client, colonnes)
+    if colonnes_source is None:
+        raise mysql.connector.Error("Lecture des colonnes de la table impossible")
+    
+    definitions = {}
+    for nom, (type_colonne, jeu, collation) in colonnes_source.items():
+        if any(t in type_colonne.lower() for t in TYPES_NON_INDEXABLES):
+            raise mysql.connector.Error(f"Colonne {nom} de type {type_colonne} non indexable")
+        definition = type_colonne
+        if jeu:
+            definition += f" CHARACTER SET {jeu} COLLATE {collation}"
+        definitions[nom] = definition
+    manquantes = [c for c in colonnes if c not in definitions]
+    if manquantes:
+        raise mysql.connector.Error(f"Colonnes absentes de {MYSQL_TABLE}: {', '.join(manquantes)}")
+    return definitions
+
+
+def _sql_declencheur(moment):
+    """
+    Corps d'un déclencheur de MYSQL_TABLE tenant les synthèses à jour
+    (retrait de l'ancienne ligne, ajout de la nouvelle). Toute erreur sur
+    les synthèses (table supprimée, valeur refusée) est ignorée : l'écriture
+    sur MYSQL_TABLE n'est jamais annulée, la dérive éventuelle est corrigée
+    par rafraichir_tables_synthese.
+    
+    Args:
+        moment (str): "INSERT", "UPDATE" ou "DELETE"
+    """
+    instructions = ["DECLARE CONTINUE HANDLER FOR SQLEXCEPTION BEGIN END;"]
+    for table, colonnes in SYNTHESES:
+        if moment in ("UPDATE", "DELETE"):
+            egalites = " AND ".join(f"{c} = OLD.{c}" for c in colonnes)
+            instructions.append(
+                f"IF {_condition_synthese(colonnes, 'OLD.')} THEN "
+                f"UPDATE {table} SET nb = nb - 1 WHERE {egalites}; "
+                f"DELETE FROM {table} WHERE {egalites} AND nb <= 0; "
+                f"END IF;"
+            )
+        if moment in ("INSERT", "UPDATE"):
+            valeurs = ", ".join(f"NEW.{c}" for c in colonnes)
+            instructions.append(
+                f"IF {_condition_synthese(colonnes, 'NEW.')} THEN "
+                f"INSERT INTO {table} ({', '.join(colonnes)}, nb) VALUES ({valeurs}, 1) "
+                f"ON DUPLICATE KEY UPDATE nb = nb + 1; "
+                f"END IF;"
+            )
+    return (
+        f"CREATE TRIGGER {MYSQL_TABLE}_synth_{moment.lower()} AFTER {moment} ON {MYSQL_TABLE} "
+        f"FOR EACH ROW BEGIN {' '.join(instructions)} END"
+    )
+
+
+def rafraichir_tables_synthese():
+    """
+    Reconstruit entièrement les tables de synthèse depuis MYSQL_TABLE, dans
+    une transaction (les lecteurs voient l'ancienne synthèse jusqu'à la fin).
+    Routine de maintenance à planifier : seule mise à jour sans déclencheurs,
+    et correction de la dérive laissée par un déclencheur en erreur. Avec
+    MYSQL_SYNTHESE=1, la version des requêtes inclut la date de mise à jour
+    des synthèses : les autres processus voient la reconstruction au plus
+    MYSQL_VERSION_INTERVALLE secondes après ; celui-ci vide ses caches aussitôt.
+    
+    Returns:
+        tuple: (success, message)
+    """
+    client = get_mysql_client()
+    if not client.connect():
+        return False, "Impossible de se connecter à la base de données"
+    
+    try:
+        client.connection.start_transaction()
+        for table, colonnes in SYNTHESES:
+            liste = ", ".join(colonnes)
+            client.cursor.execute(f"DELETE FROM {table}")
+            client.cursor.execute(
+                f"INSERT INTO {table} ({liste}, nb) "
+                f"SELECT {liste}, COUNT(*) FROM {MYSQL_TABLE} "
+                f"WHERE {_condition_synthese(colonnes)} GROUP BY {liste}"
+            )
+        client.connection.commit()
+        _cache_requetes.invalider(ESPACE_REQUETES)
+        obtenir_cache().invalider(ESPACE_ETABLISSEMENTS)
+        return True, "Tables de synthèse reconstruites."
+    except mysql.connector.Error as err:
+        print(f"Erreur lors de la reconstruction des tables de synthèse: {err}")
+        try:
+            client.connection.rollback()
+        except mysql.connector.Error:
+            pass
+        return False, f"Erreur lors de la reconstruction des tables de synthèse: {err}"
+    finally:
+        client.disconnect()
+
+
+def installer_tables_synthese(declencheurs=True):
+    """
+    Crée les tables de synthèse de MYSQL_TABLE : établissements distincts,
+    (date de départ, établissement) et (nom, établissement), avec le nombre
+    de dossiers de chaque ligne. Installe si possible des déclencheurs qui
+    les tiennent à jour à chaque écriture, puis les remplit.
+    À lancer une fois (privilèges CREATE et TRIGGER requis), puis activer
+    MYSQL_SYNTHESE=1.
+    
+    Args:
+        declencheurs (bool): Installer les déclencheurs ; sinon (ou s'ils sont
+            refusés), rafraichir_tables_synthese doit être planifiée
+        
+    Returns:
+        tuple: (success, message)
+    """
+    client = get_mysql_client()
+    if not client.connect():
+        return False, "Impossible de se connecter à la base de données"
+    
+    try:
+        types = _definitions_synthese(client)
+        for table, colonnes in SYNTHESES:
+            definitions = ", ".join(f"{c} {types[c]} NOT NULL" for c in colonnes)
+            client.cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ({definitions}, nb INT NOT NULL, "
+                f"PRIMARY KEY ({', '.join(colonnes)}))"
+            )
+    except mysql.connector.Error as err:
+        client.disconnect()
+        print(f"Erreur lors de la création des tables de synthèse: {err}")
+        return False, f"Erreur lors de la création des tables de synthèse: {err}"
+    
+    message_declencheurs = "sans déclencheurs : planifier rafraichir_tables_synthese"
+    if declencheurs:
+        try:
+            for moment in ("INSERT", "UPDATE", "DELETE"):
+                client.cursor.execute(f"DROP TRIGGER IF EXISTS {MYSQL_TABLE}_synth_{moment.lower()}")
+                client.cursor.execute(_sql_declencheur(moment))
+            message_declencheurs = "mises à jour par déclencheurs"
+        except mysql.connector.Error as err:
+            print(f"Impossible d'installer les déclencheurs de synthèse: {err}")
+    client.disconnect()
+    
+    success, message = rafraichir_tables_synthese()
+    if not success:
+        return False, message
+    return True, f"Tables de synthèse installées ({message_declencheurs})."
+
+
 def obtenir_liste_etablissements():
     """
     Récupère la liste des établissements disponibles dans la base de données.
@@ -318,26 +1189,35 @@ def obtenir_liste_etablissements():
         tuple: (success, result) où result est la liste des établissements ou un message d'erreur
     """
     try:
+        cache_partage = obtenir_cache()
+        etablissements = cache_partage.get(ESPACE_ETABLISSEMENTS, "liste")
+        if etablissements is not None:
+            return True, etablissements
+        
         client = get_mysql_client()
         
         if not client.connect():
             return False, "Impossible de se connecter à la base de données"
         
-        query = f"""
-        SELECT DISTINCT {COL_EPLEFPA} 
-        FROM {MYSQL_TABLE} 
-        WHERE {COL_EPLEFPA} IS NOT NULL AND {COL_EPLEFPA} != ''
-        ORDER BY {COL_EPLEFPA}
-        """
+        if MYSQL_SYNTHESE:
+            query = f"SELECT {COL_EPLEFPA} FROM {TABLE_SYNTHESE_ETABLISSEMENTS} ORDER BY {COL_EPLEFPA}"
+        else:
+            query = f"""
+            SELECT DISTINCT {COL_EPLEFPA} 
+            FROM {MYSQL_TABLE} 
+            WHERE {COL_EPLEFPA} IS NOT NULL AND {COL_EPLEFPA} != ''
+            ORDER BY {COL_EPLEFPA}
+            """
         
-        results = client.execute_query(query)
+        resultat = client.execute_prepared(query)
         client.disconnect()
         
-        if not results:
+        if not resultat or not resultat[1]:
             return False, "Aucun établissement trouvé dans la base de données."
         
         # Extraire la liste des établissements
-        etablissements = [r.get(COL_EPLEFPA) for r in results if r.get(COL_EPLEFPA)]
+        etablissements = [row[0] for row in resultat[1] if row[0]]
+        cache_partage.set(ESPACE_ETABLISSEMENTS, "liste", etablissements, ttl=CACHE_TTL_ETABLISSEMENTS)
         
         return True, etablissements
     
@@ -358,27 +1238,39 @@ def obtenir_etablissements_par_nom(nom):
         tuple: (success, result) où result est la liste des établissements ou un message d'erreur
     """
     try:
+        filtres = _filtres_negatifs()
+        if filtres is not None and filtres.nom_absent(nom):
+            return False, "Aucun établissement trouvé pour ce nom d'apprenant."
+        
         client = get_mysql_client()
         
         if not client.connect():
             return False, "Impossible de se connecter à la base de données"
         
         # Recherche des établissements pour ce nom
-        query = f"""
-        SELECT DISTINCT {COL_EPLEFPA} 
-        FROM {MYSQL_TABLE} 
-        WHERE {COL_NOM} = %s AND {COL_EPLEFPA} IS NOT NULL AND {COL_EPLEFPA} != ''
-        ORDER BY {COL_EPLEFPA}
-        """
+        if MYSQL_SYNTHESE:
+            query = f"""
+            SELECT {COL_EPLEFPA}
+            FROM {TABLE_SYNTHESE_NOMS}
+            WHERE {COL_NOM} = %s
+            ORDER BY {COL_EPLEFPA}
+            """
+        else:
+            query = f"""
+            SELECT DISTINCT {COL_EPLEFPA} 
+            FROM {MYSQL_TABLE} 
+            WHERE {COL_NOM} = %s AND {COL_EPLEFPA} IS NOT NULL AND {COL_EPLEFPA} != ''
+            ORDER BY {COL_EPLEFPA}
+            """
         
-        results = client.execute_query(query, (nom,))
+        resultat = client.execute_prepared(query, (nom,))
         client.disconnect()
         
-        if not results or len(results) == 0:
+        if not resultat or not resultat[1]:
             return False, "Aucun établissement trouvé pour ce nom d'apprenant."
         
         # Extraire la liste des établissements
-        etablissements = [r.get(COL_EPLEFPA) for r in results if r.get(COL_EPLEFPA)]
+        etablissements = [row[0] for row in resultat[1] if row[0]]
         
         return True, etablissements
     
@@ -388,9 +1280,119 @@ def obtenir_etablissements_par_nom(nom):
         traceback.print_exc()
         return False, f"Exception: {str(e)}"
 
+def obtenir_etablissements_par_date(date_depart):
+    """
+    Récupère la liste des établissements ayant des départs à une date donnée.
+    
+    Args:
+        date_depart (str): Date de départ dans n'importe quel format supporté
+    
+    Returns:
+        tuple: (success, result) où result est la liste des établissements ou un message d'erreur
+    """
+    try:
+        date_depart_iso = transformer_date(date_depart)
+        if not date_depart_iso:
+            return False, "Format de date non valide"
+        
+        client = get_mysql_client()
+        
+        if not client.connect():
+            return False, "Impossible de se connecter à la base de données"
+        
+        if MYSQL_SYNTHESE:
+            query = f"""
+            SELECT {COL_EPLEFPA}
+            FROM {TABLE_SYNTHESE_DATES}
+            WHERE {COL_DATE_DEPART} = %s
+            ORDER BY {COL_EPLEFPA}
+            """
+        else:
+            query = f"""
+            SELECT DISTINCT {COL_EPLEFPA} 
+            FROM {MYSQL_TABLE} 
+            WHERE {COL_DATE_DEPART} = %s AND {COL_EPLEFPA} IS NOT NULL AND {COL_EPLEFPA} != ''
+            ORDER BY {COL_EPLEFPA}
+            """
+        
+        resultat = client.execute_prepared(query, (date_depart_iso,))
+        client.disconnect()
+        
+        if not resultat or not resultat[1]:
+            return False, "Aucun établissement avec des départs à cette date."
+        
+        return True, [row[0] for row in resultat[1] if row[0]]
+    
+    except Exception as e:
+        print(f"Exception lors de la récupération des établissements par date: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False, f"Exception: {str(e)}"
+
+def _requete_date_etablissement():
+    return f"""
+        SELECT {COLONNES_SQL}
+        FROM {MYSQL_TABLE} 
+        WHERE {COL_DATE_DEPART} = %s AND {COL_EPLEFPA} = %s
+        """
+
+
+def _iter_dossiers(client, query, params, taille_lot=1000):
+    """Dossiers d'une requête, lus par lots en tuples sur un curseur non bufferisé."""
+    indices = None
+    for colonnes, lignes in client.iter_query(query, params, taille_lot):
+        if indices is None:
+            indices = Dossier.indices_colonnes(colonnes, COLONNES_DOSSIER)
+        for row in lignes:
+            yield Dossier.depuis_tuple(row, indices)
+
+
+def _apprenant(dossier):
+    """Données mappées pour l'API, avec l'ID et le numéro de dossier pour référence."""
+    mapped_data = mapper_donnees_mobilite(dossier)
+    mapped_data["id"] = dossier.id
+    mapped_data["dossier_number"] = dossier.dossier_number
+    return mapped_data
+
+
+def iter_apprenants_par_date_et_etablissement(date_depart, etablissement, taille_lot=1000):
+    """
+    Parcourt en flux les apprenants d'une date de départ et d'un établissement,
+    pour les traitements de masse : la mémoire reste bornée à un lot de lignes
+    (ni liste complète, ni cache) et le parcours peut s'arrêter à tout moment.
+    
+    Args:
+        date_depart (str): Date de départ dans n'importe quel format supporté
+        etablissement (str): Nom de l'établissement (EPLEFPA)
+        taille_lot (int): Nombre de lignes lues par appel à fetchmany
+        
+    Yields:
+        dict: Données mappées d'un apprenant (avec id et dossier_number)
+        
+    Raises:
+        ValueError: Si la date n'est pas valide
+        mysql.connector.Error: En cas d'erreur de connexion ou de lecture
+    """
+    date_depart_iso = transformer_date(date_depart)
+    if not date_depart_iso:
+        raise ValueError("Format de date non valide")
+    
+    client = get_mysql_client()
+    if not client.connect():
+        raise mysql.connector.Error("Impossible de se connecter à la base de données")
+    try:
+        for dossier in _iter_dossiers(client, _requete_date_etablissement(), (date_depart_iso, etablissement), taille_lot):
+            yield _apprenant(dossier)
+    finally:
+        client.disconnect()
+
+
 def rechercher_apprenants_par_date_et_etablissement(date_depart, etablissement):
     """
     Recherche les apprenants par date de départ et établissement.
+    Le résultat est une liste complète (gardée en cache tant que la table ne
+    change pas) ; pour un parcours à mémoire bornée, voir
+    iter_apprenants_par_date_et_etablissement.
     
     Args:
         date_depart (str): Date de départ dans n'importe quel format supporté
@@ -412,29 +1414,26 @@ def rechercher_apprenants_par_date_et_etablissement(date_depart, etablissement):
         if not client.connect():
             return False, "Impossible de se connecter à la base de données"
         
-        # Recherche des apprenants pour cette date et cet établissement
-        query = f"""
-        SELECT * 
-        FROM {MYSQL_TABLE} 
-        WHERE {COL_DATE_DEPART} = %s AND {COL_EPLEFPA} = %s
-        """
+        # Recherche des apprenants pour cette date et cet établissement : les
+        # lignes sont lues en tuples (pas de dictionnaire par ligne) et les
+        # dossiers lus sont gardés en cache tant que la table ne change pas
+        query = _requete_date_etablissement()
+        params = (date_depart_iso, etablissement)
+        cle = ("date_etablissement", " ".join(query.split()), repr(params))
+        try:
+            version, dossiers = client.lire_cache(cle)
+            if dossiers is None:
+                dossiers = list(_iter_dossiers(client, query, params))
+                client.ecrire_cache(cle, version, dossiers)
+        finally:
+            client.disconnect()
         
-        results = client.execute_query(query, (date_depart_iso, etablissement))
-        client.disconnect()
+        # Mapper les données pour l'API
+        apprenants = [_apprenant(dossier) for dossier in dossiers]
         
-        if not results:
+        if not apprenants:
             return False, "Aucun apprenant trouvé pour cette date et cet établissement."
         
-        # Préparer la liste des apprenants
-        apprenants = []
-        for dossier in results:
-            # Mapper les données pour l'API
-            mapped_data = mapper_donnees_mobilite(dossier)
-            # Ajouter l'ID et le numéro de dossier pour référence
-            mapped_data["id"] = dossier.get(COL_ID)
-            mapped_data["dossier_number"] = dossier.get(COL_DOSSIER_NUMBER)
-            apprenants.append(mapped_data)
-        
         print(f"Trouvé {len(apprenants)} apprenant(s)")
         return True, apprenants
     
@@ -445,29 +1444,29 @@ def rechercher_apprenants_par_date_et_etablissement(date_depart, etablissement):
         return False, f"Exception: {str(e)}"
 
 
-def mapper_donnees_mobilite(dossier_fields):
+def mapper_donnees_mobilite(dossier):
     """
     Mappe les données d'un apprenant pour l'API selon le script ERASMIP.
     Utilise exactement la même méthode que dans le script paste.txt.
     
     Args:
-        dossier_fields (dict): Champs du dossier extraits de la base de données
+        dossier (Dossier): Dossier extrait de la base de données
         
     Returns:
         dict: Dictionnaire avec les données mappées pour l'API
     """
     # Extraction des données brutes
-    civilite = dossier_fields.get(COL_CIVILITE, "")
-    nom = dossier_fields.get(COL_NOM, "")
-    prenom = dossier_fields.get(COL_PRENOM, "")
-    date_naissance = dossier_fields.get(COL_DATE_NAISSANCE)
-    format_mobilite = dossier_fields.get(COL_FORMAT_MOBILITE, "")
-    mobilite_apprenant = dossier_fields.get(COL_MOBILITE_APPRENANT, "")
-    date_depart = dossier_fields.get(COL_DATE_DEPART)
-    date_retour = dossier_fields.get(COL_DATE_RETOUR)
-    pays_accueil = dossier_fields.get(COL_PAYS_ACCUEIL, "")
-    statut_participant = dossier_fields.get(COL_STATUT_PARTICIPANT, "")
-    etablissement = dossier_fields.get(COL_EPLEFPA, "")
+    civilite = dossier.civilite
+    nom = dossier.nom
+    prenom = dossier.prenom
+    date_naissance = dossier.date_naissance
+    format_mobilite = dossier.format_mobilite
+    mobilite_apprenant = dossier.mobilite_apprenant
+    date_depart = dossier.date_depart
+    date_retour = dossier.date_retour
+    pays_accueil = dossier.pays_accueil
+    statut_participant = dossier.statut_participant
+    etablissement = dossier.etablissement
     
     # Log pour débogage des dates
     print(f"Date de naissance brute: {date_naissance}")
@@ -496,7 +1495,7 @@ def mapper_donnees_mobilite(dossier_fields):
         valeur_mobilite_apprenant = 'Mobilité d\'apprentissage de courte durée'
     
     # Déterminer si l'apprenant est apprenti
-    est_apprenti = "true" if statut_participant and statut_participant.lower() == "apprenti" else "false"
+    est_apprenti = ds_mapping.est_apprenti(statut_participant)
     
     # Construction du dictionnaire de résultats
     data_mappee = {
@@ -555,11 +1554,8 @@ def valider_combinaison_nom_etablissement(nom, etablissement, numero_dossier=Non
     if isinstance(result_dossier, dict) and result_dossier.get("multiple", False):
         return True, result_dossier  # Renvoyer la liste des dossiers
     
-    # Extraire les champs du dossier
-    dossier_fields = result_dossier.get("fields", {})
-    
     # Mapper les données pour ERASMIP
-    mapped_data = mapper_donnees_mobilite(dossier_fields)
+    mapped_data = mapper_donnees_mobilite(result_dossier)
     
     # Log complet des données mappées
     print(f"Données mappées complètes: {json.dumps(mapped_data, default=str)}")
@@ -586,11 +1582,8 @@ def valider_combinaison_nom_et_numero(nom, numero_dossier):
     if not success_dossier:
         return False, result_dossier
     
-    # Extraire les champs du dossier
-    dossier_fields = result_dossier.get("fields", {})
-    
     # Mapper les données pour ERASMIP
-    mapped_data = mapper_donnees_mobilite(dossier_fields)
+    mapped_data = mapper_donnees_mobilite(result_dossier)
     
     # Log complet des données mappées
     print(f"Données mappées complètes: {json.dumps(mapped_data, default=str)}")
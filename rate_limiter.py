@@ -0,0 +1,205 @@
+"""
+Limiteur de débit (seau à jetons) pour l'API Démarches Simplifiées.
+Un seul limiteur est partagé par toutes les sessions du processus ; il peut
+aussi être partagé entre processus via un fichier SQLite (DS_RATE_LIMIT_FICHIER).
+Les sessions en attente sont servies à tour de rôle, et le débit est réduit
+automatiquement quand l'API répond 429 (avec respect de Retry-After).
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+DS_RATE_DEBIT = float(os.getenv("DS_RATE_DEBIT", "3"))       # requêtes par seconde
+DS_RATE_RAFALE = int(os.getenv("DS_RATE_RAFALE", "10"))      # jetons disponibles en rafale
+DS_RATE_LIMIT_FICHIER = os.getenv("DS_RATE_LIMIT_FICHIER")   # partage inter-processus (optionnel)
+
+# Pause appliquée après un 429 sans en-tête Retry-After (secondes)
+PAUSE_DEFAUT_429 = 5.0
+
+
+class _EtatLocal:
+    """État du seau conservé en mémoire (un seul processus)."""
+
+    def __init__(self, etat_initial):
+        self._etat = etat_initial
+
+    def transaction(self, fonction):
+        self._etat, resultat = fonction(self._etat)
+        return resultat
+
+
+class _EtatSQLite:
+    """État du seau conservé dans SQLite, partagé entre processus."""
+
+    def __init__(self, chemin, nom, etat_initial):
+        self.chemin = chemin
+        self.nom = nom
+        with self._connexion() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS seau (nom TEXT PRIMARY KEY, jetons REAL, maj REAL, pause REAL, debit REAL)"
+            )
+            conn.execute("INSERT OR IGNORE INTO seau VALUES (?, ?, ?, ?, ?)", (nom,) + etat_initial)
+
+    def _connexion(self):
+        return sqlite3.connect(self.chemin, timeout=30, isolation_level=None)
+
+    def transaction(self, fonction):
+        conn = self._connexion()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            etat = conn.execute(
+                "SELECT jetons, maj, pause, debit FROM seau WHERE nom = ?", (self.nom,)
+            ).fetchone()
+            nouvel_etat, resultat = fonction(etat)
+            if nouvel_etat != etat:
+                conn.execute(
+                    "UPDATE seau SET jetons = ?, maj = ?, pause = ?, debit = ? WHERE nom = ?",
+                    nouvel_etat + (self.nom,)
+                )
+            conn.execute("COMMIT")
+            return resultat
+        finally:
+            conn.close()
+
+
+class LimiteurDebit:
+    """
+    Seau à jetons avec partage équitable entre sessions et ralentissement adaptatif.
+
+    Args:
+        debit (float): Débit nominal en jetons par seconde
+        rafale (int): Capacité du seau
+        fichier_partage (str, optional): Fichier SQLite pour partager le seau entre processus
+        nom (str): Nom du seau dans le fichier partagé
+        debit_min (float): Débit plancher après ralentissements successifs
+    """
+
+    def __init__(self, debit, rafale, fichier_partage=None, nom="ds", debit_min=0.2):
+        self.debit_max = debit
+        self.debit_min = min(debit_min, debit)
+        self.rafale = rafale
+        # État : (jetons, date de mise à jour, pause jusqu'à, débit courant)
+        etat_initial = (float(rafale), time.time(), 0.0, float(debit))
+        if fichier_partage:
+            self._etat = _EtatSQLite(fichier_partage, nom, etat_initial)
+        else:
+            self._etat = _EtatLocal(etat_initial)
+        self._cond = threading.Condition()
+        # Files d'attente par session, servies à tour de rôle
+        self._files = OrderedDict()
+
+    def _prendre_jeton(self, etat):
+        jetons, maj, pause, debit = etat
+        maintenant = time.time()
+        if maintenant < pause:
+            return etat, pause - maintenant
+        jetons = min(self.rafale, jetons + (maintenant - max(maj, pause)) * debit)
+        if jetons >= 1:
+            return (jetons - 1, maintenant, pause, debit), 0.0
+        return (jetons, maintenant, pause, debit), (1 - jetons) / debit
+
+    def _est_mon_tour(self, session, ticket):
+        premiere = next(iter(self._files))
+        return premiere == session and self._files[session][0] is ticket
+
+    def acquerir(self, session=None, timeout=None):
+        """
+        Attend un jeton. Quand plusieurs sessions attendent, elles sont servies
+        à tour de rôle (une requête par session et par tour).
+
+        Args:
+            session: Identifiant de la session (par défaut, le thread courant)
+            timeout (float, optional): Attente maximale en secondes
+
+        Returns:
+            bool: True si un jeton a été obtenu, False si le délai est dépassé
+        """
+        session = session if session is not None else threading.get_ident()
+        limite = time.monotonic() + timeout if timeout is not None else None
+        ticket = object()
+
+        with self._cond:
+            self._files.setdefault(session, deque()).append(ticket)
+            try:
+                while True:
+                    attente = None
+                    if self._est_mon_tour(session, ticket):
+                        attente = self._etat.transaction(self._prendre_jeton)
+                        if attente == 0:
+                            return True
+                    if limite is not None:
+                        restant = limite - time.monotonic()
+                        if restant <= 0:
+                            return False
+                        attente = restant if attente is None else min(attente, restant)
+                    self._cond.wait(attente)
+            finally:
+                file = self._files[session]
+                file.remove(ticket)
+                if file:
+                    # Passer la main à la session suivante
+                    self._files.move_to_end(session)
+                else:
+                    del self._files[session]
+                self._cond.notify_all()
+
+    def signaler_reponse(self, status_code, retry_after=None):
+        """
+        Ajuste le débit selon la réponse de l'API : division par deux et pause
+        sur un 429, puis remontée progressive vers le débit nominal.
+
+        Args:
+            status_code (int): Code HTTP de la réponse
+            retry_after (str, optional): Valeur de l'en-tête Retry-After (secondes)
+        """
+        if status_code == 429:
+            try:
+                pause = float(retry_after)
+            except (TypeError, ValueError):
+                pause = PAUSE_DEFAUT_429
+
+            def ralentir(etat):
+                jetons, maj, fin_pause, debit = etat
+                fin_pause = max(fin_pause, time.time() + pause)
+                return (0.0, maj, fin_pause, max(self.debit_min, debit / 2)), None
+
+            print(f"Limite de débit DS atteinte, pause de {pause:.1f}s")
+            self._etat.transaction(ralentir)
+        elif status_code < 400:
+            def accelerer(etat):
+                jetons, maj, fin_pause, debit = etat
+                if debit >= self.debit_max:
+                    return etat, None
+                return (jetons, maj, fin_pause, min(self.debit_max, debit + self.debit_max * 0.1)), None
+
+            self._etat.transaction(accelerer)
+        else:
+            return
+        with self._cond:
+            self._cond.notify_all()
+
+
+_limiteur_ds = None
+_limiteur_ds_lock = threading.Lock()
+
+
+def obtenir_limiteur_ds():
+    """
+    Renvoie le limiteur partagé par tous les appels à l'API DS du processus.
+
+    Returns:
+        LimiteurDebit: Limiteur configuré par l'environnement
+    """
+    global _limiteur_ds
+    with _limiteur_ds_lock:
+        if _limiteur_ds is None:
+            _limiteur_ds = LimiteurDebit(DS_RATE_DEBIT, DS_RATE_RAFALE, DS_RATE_LIMIT_FICHIER)
+        return _limiteur_ds
@@ -0,0 +1,119 @@
+"""
+Validation locale des données de pré-remplissage contre un schéma de
+substitution installé avec ds_schema.definir_schema (aucun appel à DS).
+"""
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ds_prefiller
+import ds_schema
+from ds_mapping import SPEC_ERASMIP
+from ds_schema import DescripteurChamp, SchemaDemarche
+
+# Types des champs ERASMIP dont la valeur est contrôlée (les autres sont du texte libre)
+TYPES = {
+    "Civilité": "CiviliteChampDescriptor",
+    "Date de naissance": "DateChampDescriptor",
+    "Date de départ": "DateChampDescriptor",
+    "Date de retour": "DateChampDescriptor",
+    "Est apprenti": "CheckboxChampDescriptor",
+    "Mobilité hybride": "YesNoChampDescriptor",
+}
+OPTIONS = {
+    "Mobilité apprenant": ["Mobilité d'apprentissage de courte durée", "Concours de compétence"],
+}
+OBLIGATOIRES = {"Nom", "Prénom", "Date de naissance"}
+
+
+def schema_local():
+    descripteurs = [
+        DescripteurChamp(
+            champ.champ_id,
+            TYPES.get(champ.libelle, "TextChampDescriptor"),
+            label=champ.libelle,
+            required=champ.libelle in OBLIGATOIRES,
+            options=OPTIONS.get(champ.libelle),
+        )
+        for champ in SPEC_ERASMIP
+    ]
+    return SchemaDemarche(ds_prefiller.DEMARCHE_ID, "revision-test", descripteurs, time.time())
+
+
+def champ(libelle):
+    return next(c.champ_id for c in SPEC_ERASMIP if c.libelle == libelle)
+
+
+class ValiderDonneesMappeesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.validation = ds_prefiller.VALIDATION_LOCALE
+        ds_prefiller.VALIDATION_LOCALE = True
+        self.schema_precedent = ds_schema._schemas.get(ds_prefiller.DEMARCHE_ID)
+        ds_schema.definir_schema(schema_local())
+        self.donnees = ds_prefiller.MAPPING_ERASMIP({
+            "civilite": "Mme",
+            "nom": "DUPONT",
+            "prenom": "Anne",
+            "date_naissance": "2004-03-12",
+            "mobilite_apprenant": "Mobilité de stage (SMT)",
+            "statut_participant": "Apprenti",
+            "format_mobilite": "Mobilité hybride",
+            "date_depart": "15/05/2024",
+            "date_retour": "2024-06-30",
+            "pays_accueil": "Espagne",
+        })
+
+    def tearDown(self):
+        ds_prefiller.VALIDATION_LOCALE = self.validation
+        if self.schema_precedent is None:
+            ds_schema._schemas.pop(ds_prefiller.DEMARCHE_ID, None)
+        else:
+            ds_schema._schemas[ds_prefiller.DEMARCHE_ID] = self.schema_precedent
+
+    def test_donnees_valides(self):
+        self.assertEqual(ds_prefiller.valider_donnees_mappees(self.donnees), (True, None))
+
+    def test_date_invalide(self):
+        self.donnees[champ("Date de départ")] = "15/05/2024"
+        valide, erreur = ds_prefiller.valider_donnees_mappees(self.donnees)
+        self.assertFalse(valide)
+        self.assertIn("Date de départ: date AAAA-MM-JJ attendue", erreur)
+
+    def test_option_invalide(self):
+        self.donnees[champ("Mobilité apprenant")] = "Mobilité longue"
+        valide, erreur = ds_prefiller.valider_donnees_mappees(self.donnees)
+        self.assertFalse(valide)
+        self.assertIn("Mobilité apprenant: option non autorisée", erreur)
+
+    def test_booleen_invalide(self):
+        self.donnees[champ("Est apprenti")] = "Oui"
+        valide, erreur = ds_prefiller.valider_donnees_mappees(self.donnees)
+        self.assertFalse(valide)
+        self.assertIn("Est apprenti: valeur booléenne attendue", erreur)
+
+    def test_champ_obligatoire_manquant(self):
+        del self.donnees[champ("Date de naissance")]
+        valide, erreur = ds_prefiller.valider_donnees_mappees(self.donnees)
+        self.assertFalse(valide)
+        self.assertIn("Date de naissance: champ obligatoire manquant", erreur)
+
+    def test_champ_obligatoire_vide(self):
+        self.donnees[champ("Nom")] = ""
+        valide, erreur = ds_prefiller.valider_donnees_mappees(self.donnees)
+        self.assertFalse(valide)
+        self.assertIn("Nom: champ obligatoire vide", erreur)
+
+    def test_champ_absent_de_la_revision(self):
+        self.donnees["champ_inconnu"] = "x"
+        valide, erreur = ds_prefiller.valider_donnees_mappees(self.donnees)
+        self.assertFalse(valide)
+        self.assertIn("champ_inconnu: champ absent de la révision revision-test", erreur)
+
+
+if __name__ == "__main__":
+    unittest.main()